@@ -0,0 +1,94 @@
+"""
+Micro-benchmark for the rule-based comment classifier.
+
+Compares RuleEngine (one precompiled regex per rule, checked in priority
+order) against the previous implementation (one uncompiled ``re.search``
+per rule) and reports comments/sec for each. The saving is the per-call
+pattern cache lookup, so expect a modest gain (about 1.2x here), not a
+change in how many scans a comment costs.
+
+Usage (from the backend directory):
+    python benchmarks/bench_classifier.py [--comments N] [--repeat R]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_comments.settings')
+
+from comments.classifier import CommentClassifier  # noqa: E402
+
+
+SAMPLE_COMMENTS = [
+    "Great post, thanks for sharing your thoughts on this topic.",
+    "I disagree with the second point but the rest makes sense to me.",
+    "This is a scam, do not trust them",
+    "Check out https://example.com/deal?id=42 for more",
+    "Wow!!! Amazing",
+    "Call me at 5551234 for details",
+    "Well written and easy to follow. Looking forward to the next one.",
+    "ok",
+    "What the hell is this",
+    "A thoughtful comment about the article with a few more words in it.",
+]
+
+
+def legacy_classify_rules(comment_text):
+    """The rule loop as it was before RuleEngine."""
+    for pattern, reason in CommentClassifier.FLAG_PATTERNS:
+        if re.search(pattern, comment_text, re.IGNORECASE):
+            return True, reason
+    if len(comment_text.strip()) < 5:
+        return True, 'Very short comment'
+    if len(comment_text) > 1000:
+        return True, 'Very long comment'
+    return False, None
+
+
+def build_corpus(size, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        parts = rng.sample(SAMPLE_COMMENTS, k=rng.randint(1, 3))
+        corpus.append(' '.join(parts))
+    return corpus
+
+
+def measure(func, corpus, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            func(text)
+        best = min(best, time.perf_counter() - start)
+    return len(corpus) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--comments', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.comments)
+    mismatches = sum(
+        legacy_classify_rules(text) != CommentClassifier._classify_rules(text) for text in corpus
+    )
+    if mismatches:
+        print(f"WARNING: {mismatches} verdicts differ between implementations")
+
+    before = measure(legacy_classify_rules, corpus, args.repeat)
+    after = measure(CommentClassifier._classify_rules, corpus, args.repeat)
+
+    print(f"Comments: {len(corpus)}, best of {args.repeat} runs")
+    print(f"  re.search per rule : {before:12,.0f} comments/sec")
+    print(f"  RuleEngine         : {after:12,.0f} comments/sec")
+    print(f"  speedup            : {after / before:12.2f}x")
+
+
+if __name__ == '__main__':
+    main()
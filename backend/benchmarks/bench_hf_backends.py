@@ -0,0 +1,97 @@
+"""
+Benchmark the Hugging Face inference backends on CPU.
+
+For every backend that can be built here (see comments/inference.py) it
+reports load time, single-comment latency (p50/p95), batched throughput at
+HUGGINGFACE_BATCH_SIZE and top-label agreement with the PyTorch backend.
+
+Usage (from the backend directory):
+    python benchmarks/bench_hf_backends.py [--comments N] [--backends pytorch,onnx,...] [--threads T]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_comments.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from bench_classifier import build_corpus  # noqa: E402
+from comments.inference import BACKENDS, build_pipeline  # noqa: E402
+
+
+def top_labels(results):
+    return [max(scores, key=lambda s: s['score'])['label'] for scores in results]
+
+
+def bench_backend(backend, corpus, batch_size, export_dir):
+    started = time.perf_counter()
+    model = build_pipeline(settings.HUGGINGFACE_MODEL, backend, export_dir=export_dir)
+    load_time = time.perf_counter() - started
+
+    # Warm-up, not measured
+    model(corpus[:batch_size], batch_size=batch_size, truncation=True)
+
+    latencies = []
+    for text in corpus[:100]:
+        started = time.perf_counter()
+        model(text, truncation=True)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    started = time.perf_counter()
+    results = model(corpus, batch_size=batch_size, truncation=True)
+    throughput = len(corpus) / (time.perf_counter() - started)
+
+    return {
+        'load': load_time,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'throughput': throughput,
+        'labels': top_labels(results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--comments', type=int, default=500)
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads (default: library default)')
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    corpus = build_corpus(args.comments)
+    batch_size = getattr(settings, 'HUGGINGFACE_BATCH_SIZE', 32)
+    export_dir = tempfile.mkdtemp(prefix='hf-export-')
+
+    results = {}
+    for backend in args.backends.split(','):
+        try:
+            results[backend] = bench_backend(backend, corpus, batch_size, export_dir)
+        except ImportError as e:
+            print(f"Skipping {backend}: {e}")
+
+    reference = results.get('pytorch', {}).get('labels')
+    print(f"Model: {settings.HUGGINGFACE_MODEL}, comments: {len(corpus)}, batch size: {batch_size}")
+    for backend, result in results.items():
+        agreement = ''
+        if reference is not None:
+            matches = sum(a == b for a, b in zip(result['labels'], reference))
+            agreement = f", agreement {matches / len(reference):6.1%}"
+        print(f"  {backend:<13}: load {result['load']:6.1f} s, p50 {result['p50'] * 1000:6.1f} ms, "
+              f"p95 {result['p95'] * 1000:6.1f} ms, {result['throughput']:8.1f} comments/sec{agreement}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare per-comment and batched OpenAI prompts without calling the API.
+
+A stub client records every request and answers it immediately, so the
+numbers are API calls and prompt size (characters, and a rough 4 chars per
+token estimate) for classifying the same comments with OPENAI_BATCH_SIZE=1
+and with batching.
+
+Usage (from the backend directory):
+    python benchmarks/bench_openai_batching.py [--comments N] [--batch-size B]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_comments.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test.utils import override_settings  # noqa: E402
+
+from bench_classifier import build_corpus  # noqa: E402
+from comments.classifier import CommentClassifier  # noqa: E402
+
+SYSTEM_PROMPT_CHARS = len("You are a content moderation assistant. Analyze comments and determine if they need review.")
+
+
+class RecordingClient:
+    """Answers every chat request with a clean verdict and records the prompt."""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_chars = 0
+        self.max_tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, max_tokens, **kwargs):
+        self.requests += 1
+        self.prompt_chars += SYSTEM_PROMPT_CHARS + len(messages[-1]['content'])
+        self.max_tokens += max_tokens
+        numbers = re.findall(r'^(\d+)\. "', messages[-1]['content'], re.MULTILINE)
+        if numbers:
+            reply = json.dumps([{'id': int(n), 'should_flag': False, 'reason': None, 'confidence': 0.9} for n in numbers])
+        else:
+            reply = '{"should_flag": false, "reason": null, "confidence": 0.9}'
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+
+def run(corpus, batch_size):
+    client = RecordingClient()
+    CommentClassifier._openai_client = client
+    with override_settings(OPENAI_API_KEY='bench', OPENAI_BATCH_SIZE=batch_size, VERDICT_CACHE_ENABLED=False):
+        CommentClassifier.classify_many(corpus, use_ml=True, classifier_type='openai')
+    CommentClassifier._openai_client = None
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--comments', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.comments)
+    single = run(corpus, 1)
+    batched = run(corpus, args.batch_size)
+
+    print(f"Comments: {len(corpus)}")
+    for label, client in (('per comment', single), (f'batch of {args.batch_size}', batched)):
+        print(f"  {label:<13}: {client.requests:6,} requests, "
+              f"~{client.prompt_chars // 4:9,} prompt tokens, {client.max_tokens:9,} max completion tokens")
+    print(f"  comments per request : {len(corpus) / single.requests:.1f} -> {len(corpus) / batched.requests:.1f}")
+    print(f"  prompt tokens/comment: {single.prompt_chars / 4 / len(corpus):.0f} -> {batched.prompt_chars / 4 / len(corpus):.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark page-number vs keyset pagination on the comments endpoint.
+
+Creates a throwaway test database, fills it with comments and times
+``GET /api/comments/`` at increasing page depths with ``?page=N`` and with
+an equivalent ``?cursor=...``.
+
+Usage (from the backend directory):
+    python benchmarks/bench_pagination.py [--comments N] [--page-size P] [--repeat R]
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_comments.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from comments.counters import recount  # noqa: E402
+from comments.models import Comment, Post  # noqa: E402
+
+
+def populate(total):
+    post = Post.objects.create(title="Benchmark", content="Benchmark post")
+    start = timezone.now()
+    batch = []
+    for i in range(total):
+        batch.append(Comment(
+            post=post,
+            author=f"user{i % 500}",
+            content=f"Benchmark comment {i}",
+            created_at=start + timedelta(milliseconds=i)
+        ))
+        if len(batch) == 5000:
+            Comment.objects.bulk_create(batch)
+            batch = []
+    Comment.objects.bulk_create(batch)
+    recount([post.id])
+
+
+def cursor_for_offset(offset):
+    """Build the cursor pointing just past the row at offset - 1."""
+    if offset == 0:
+        return None
+    row = Comment.objects.order_by('created_at', 'id').values('id', 'created_at')[offset - 1]
+    data = {'v': row['created_at'].isoformat(), 'i': row['id']}
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def timed(client, url, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        best = min(best, time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--comments', type=int, default=200000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        populate(args.comments)
+        client = APIClient()
+        last_page = args.comments // args.page_size
+        pages = sorted({1, 10, 100, last_page // 4, last_page // 2, last_page})
+
+        print(f"Comments: {args.comments}, page size: {args.page_size}, best of {args.repeat}")
+        print(f"{'page':>8} {'?page= (ms)':>14} {'?cursor= (ms)':>15}")
+        for page in pages:
+            if page < 1:
+                continue
+            offset = (page - 1) * args.page_size
+            numbered = timed(client, f'/api/comments/?page={page}&page_size={args.page_size}', args.repeat)
+            cursor = cursor_for_offset(offset)
+            url = f'/api/comments/?pagination=cursor&page_size={args.page_size}'
+            if cursor:
+                url += f'&cursor={cursor}'
+            keyset = timed(client, url, args.repeat)
+            print(f"{page:>8} {numbered:>14.2f} {keyset:>15.2f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark indexed comment search against the ICONTAINS scan it replaces.
+
+Creates a throwaway test database (migrated, so the search index from
+comments/search.py is installed), fills it with synthetic comments and
+times a COUNT plus the first page of results for rare, medium and common
+queries, once with search.filter_comments() and once with the
+``author ILIKE '%term%' OR content ILIKE '%term%'`` filter the admin used.
+
+Usage (from the backend directory):
+    python benchmarks/bench_search.py [--comments N] [--repeat R]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from functools import reduce
+from operator import and_
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_comments.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from comments import search  # noqa: E402
+from comments.models import Comment, Post  # noqa: E402
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa', 'do', 'fi', 'gu', 'he', 'jo']
+CAMPAIGN = 'crypto giveaway'
+
+
+def build_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def populate(total, batch_size=10000, seed=0):
+    """Insert synthetic comments with a Zipf-like word distribution; 1 in 2000 mentions the campaign."""
+    rng = random.Random(seed)
+    vocabulary = build_vocabulary(5000, rng)
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    post = Post.objects.create(title="Benchmark", content="Benchmark post")
+    batch = []
+    for i in range(total):
+        words = rng.choices(vocabulary, weights, k=rng.randint(8, 20))
+        if i % 2000 == 0:
+            words.insert(rng.randint(0, len(words)), CAMPAIGN)
+        batch.append(Comment(post=post, author=f"user{rng.randint(1, 50000)}", content=' '.join(words)))
+        if len(batch) == batch_size:
+            Comment.objects.bulk_create(batch)
+            batch = []
+    Comment.objects.bulk_create(batch)
+    return vocabulary
+
+
+def icontains(queryset, query):
+    terms = search.search_terms(query)
+    return queryset.filter(reduce(and_, (Q(author__icontains=term) | Q(content__icontains=term) for term in terms)))
+
+
+def timed(queryset, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = queryset.count()
+        list(queryset.order_by('-created_at')[:100])
+        best = min(best, time.perf_counter() - start)
+    return count, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--comments', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        started = time.perf_counter()
+        vocabulary = populate(args.comments)
+        elapsed = time.perf_counter() - started
+        print(f"Comments: {args.comments:,} inserted in {elapsed:.1f} s ({args.comments / elapsed:,.0f}/s, "
+              f"index maintained on insert), backend: {search.get_backend(connection)}, best of {args.repeat}")
+
+        queries = [
+            ('rare phrase', CAMPAIGN),
+            ('medium word', vocabulary[len(vocabulary) // 50]),
+            ('common word', vocabulary[0]),
+            ('two words', f"{vocabulary[0]} {vocabulary[1]}"),
+        ]
+        print(f"{'query':<12} {'matches':>9} {'indexed (ms)':>13} {'icontains (ms)':>15}")
+        for label, query in queries:
+            count, indexed = timed(search.filter_comments(Comment.objects.all(), query), args.repeat)
+            _, scanned = timed(icontains(Comment.objects.all(), query), args.repeat)
+            print(f"{label:<12} {count:>9,} {indexed:>13.1f} {scanned:>15.1f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Load test comment creation under WSGI and ASGI with a stubbed OpenAI upstream.
+
+Starts a fake /v1/chat/completions server that answers after --latency
+seconds, then runs the app twice: gunicorn with --threads T serving
+POST /api/comments/, and uvicorn serving the async POST /api/comments/async/.
+Both classify with classifier_type=openai against the stub, so the WSGI
+server can have at most T moderation calls in flight while the ASGI one is
+only limited by the client's concurrency.
+
+Requires gunicorn and uvicorn, and writes comments to the configured database.
+
+Usage (from the backend directory):
+    python benchmarks/load_test_asgi.py [--requests N] [--concurrency C] [--latency S] [--threads T]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_comments.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+
+from comments.models import Post  # noqa: E402
+
+STUB_REPLY = json.dumps({
+    'id': 'chatcmpl-stub',
+    'object': 'chat.completion',
+    'created': 0,
+    'model': 'stub',
+    'choices': [{
+        'index': 0,
+        'message': {'role': 'assistant', 'content': '{"should_flag": false, "reason": null, "confidence": 0.9}'},
+        'finish_reason': 'stop',
+    }],
+}).encode('utf-8')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_upstream(port, latency):
+    """Serve the fake OpenAI API from an asyncio loop on a background thread."""
+    async def handle(reader, writer):
+        try:
+            headers = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in headers.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            await asyncio.sleep(latency)
+            writer.write(
+                b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                b'Content-Length: ' + str(len(STUB_REPLY)).encode() + b'\r\nConnection: close\r\n\r\n' + STUB_REPLY
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(ready):
+        server = await asyncio.start_server(handle, '127.0.0.1', port, backlog=1024)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(serve(ready)), daemon=True).start()
+    ready.wait()
+
+
+async def post_comment(port, path, body):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def run_load(port, path, post_id, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(index):
+        nonlocal errors
+        body = json.dumps({'post': post_id, 'author': f'Load {index}', 'content': f'Load test comment {index}'}).encode()
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await post_comment(port, path, body)
+            except OSError:
+                status = 0
+            latencies.append(time.perf_counter() - started)
+            if status != 201:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(index) for index in range(requests)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'throughput': requests / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'errors': errors,
+    }
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+def run_server(command, port, path, env, args, post_id):
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, process)
+        # Warm up imports and the OpenAI client before measuring
+        asyncio.run(run_load(port, path, post_id, 5, 5))
+        return asyncio.run(run_load(port, path, post_id, args.requests, args.concurrency))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.5, help='Seconds the stub upstream takes per call')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads for the WSGI run')
+    args = parser.parse_args()
+
+    for tool in ('gunicorn', 'uvicorn'):
+        if shutil.which(tool) is None:
+            sys.exit(f"{tool} is required: pip install gunicorn uvicorn")
+
+    call_command('migrate', verbosity=0)
+    post_id = Post.objects.create(title="Load test", content="Load test post").id
+
+    upstream_port = free_port()
+    start_stub_upstream(upstream_port, args.latency)
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY='stub',
+        OPENAI_BASE_URL=f'http://127.0.0.1:{upstream_port}/v1',
+        OPENAI_TIMEOUT='30',
+        VERDICT_CACHE_ENABLED='False',
+        DEBUG='False',
+    )
+    query = '?use_ml=true&classifier_type=openai'
+
+    results = {}
+    port = free_port()
+    results[f'WSGI (gunicorn, {args.threads} threads)'] = run_server(
+        ['gunicorn', 'smart_comments.wsgi:application', '-b', f'127.0.0.1:{port}', '-w', '1',
+         '--threads', str(args.threads), '--backlog', '2048'],
+        port, '/api/comments/' + query, env, args, post_id
+    )
+    port = free_port()
+    results['ASGI (uvicorn, async view)'] = run_server(
+        ['uvicorn', 'smart_comments.asgi:application', '--port', str(port), '--workers', '1',
+         '--log-level', 'warning', '--backlog', '2048'],
+        port, '/api/comments/async/' + query, env, args, post_id
+    )
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, upstream latency {args.latency}s")
+    for label, result in results.items():
+        print(f"  {label:<32}: {result['throughput']:8.1f} req/s, p50 {result['p50'] * 1000:7.0f} ms, "
+              f"p95 {result['p95'] * 1000:7.0f} ms, errors {result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,25 @@
 from django.contrib import admin
 from .models import Post, Comment, CommentSettings
+from .search import filter_comments
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ['title', 'created_at', 'updated_at']
+    list_display = ['title', 'created_at', 'updated_at', 'comment_count', 'flagged_count']
     search_fields = ['title', 'content']
 
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
-    list_display = ['author', 'post', 'created_at', 'flagged_for_review', 'flag_reason']
-    list_filter = ['flagged_for_review', 'created_at']
+    list_display = ['author', 'post', 'created_at', 'flagged_for_review', 'flag_reason', 'classification_status']
+    list_filter = ['flagged_for_review', 'classification_status', 'created_at']
     search_fields = ['author', 'content']
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of an ILIKE scan per search field
+        if not search_term.strip():
+            return queryset, False
+        return filter_comments(queryset, search_term), False
 
 
 @admin.register(CommentSettings)
@@ -1,5 +1,6 @@
 from django.apps import AppConfig
 import sys
+import threading
 
 
 class CommentsConfig(AppConfig):
@@ -7,7 +8,9 @@ class CommentsConfig(AppConfig):
     name = 'comments'
     
     def ready(self):
-        """Apply Python 3.14 compatibility patch when app is ready."""
+        """Connect signal handlers and system checks and apply Python 3.14 compatibility patch when app is ready."""
+        from . import checks, signals  # noqa: F401
+        
         if sys.version_info >= (3, 14):
             from rest_framework.settings import api_settings
             
@@ -58,3 +61,35 @@ class CommentsConfig(AppConfig):
                 import logging
                 logger = logging.getLogger(__name__)
                 logger.warning(f"Failed to apply Python 3.14 compatibility patch: {e}")
+    
+    def start_classifier_warmup(self):
+        """
+        Load the configured ML model when CLASSIFIER_WARMUP is set.
+        
+        Called from smart_comments.asgi and .wsgi (which runserver loads via
+        WSGI_APPLICATION) rather than ready(), so management commands and
+        their worker processes never load the model. 'startup' loads it before
+        returning; 'background' loads it on a daemon thread so the server
+        accepts requests right away (requests that need the model wait for the
+        load instead of starting a second one). Returns the warm-up thread in
+        background mode.
+        """
+        from django.conf import settings
+        
+        mode = getattr(settings, 'CLASSIFIER_WARMUP', 'off')
+        if mode not in ('startup', 'background'):
+            return None
+        
+        from .classifier import CommentClassifier
+        
+        def warm_up():
+            CommentClassifier.load_ml_model(
+                dummy_inference=getattr(settings, 'CLASSIFIER_WARMUP_INFERENCE', True)
+            )
+        
+        if mode == 'startup':
+            warm_up()
+            return None
+        thread = threading.Thread(target=warm_up, name='classifier-warmup', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,142 @@
+"""
+Micro-batching for model inference.
+
+Concurrent callers submit single texts and receive a Future. A background
+thread gathers submissions for up to ``max_wait_ms`` or until
+``max_batch_size`` items are waiting, runs them through the model in one
+call, and resolves each Future with its own result.
+
+Batching sits behind the verdict cache: CommentClassifier looks a text up
+in the cache before submitting it, so a batch only ever holds cache
+misses, and the verdicts it produces are cached by the caller like any
+other model verdict. Callers should wait on the Future with a timeout; if
+the worker thread dies, the next submit() starts a new one.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+
+class MicroBatcher:
+    """
+    Collects individual inference requests into batches.
+
+    Args:
+        infer: Callable taking a list of inputs and returning one result per input
+        max_batch_size: Largest number of inputs passed to ``infer`` at once
+        max_wait_ms: How long the first queued input may wait for others to join
+    """
+
+    def __init__(self, infer: Callable[[List[Any]], List[Any]], max_batch_size: int = 16, max_wait_ms: float = 10.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.infer = infer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0) / 1000.0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+        self._last_batch_size = 0
+        self._errors = 0
+
+    def submit(self, item: Any) -> Future:
+        """Queue one input for inference and return a Future for its result."""
+        future: Future = Future()
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("MicroBatcher has been shut down")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='hf-micro-batcher',
+                    daemon=True
+                )
+                self._thread.start()
+            self._queue.put((item, future))
+        return future
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker thread once the already queued inputs are processed."""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            if wait:
+                thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and batch size metrics."""
+        with self._lock:
+            batches = self._batches
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': batches,
+                'items': self._items,
+                'errors': self._errors,
+                'last_batch_size': self._last_batch_size,
+                'largest_batch_size': self._largest_batch,
+                'average_batch_size': self._items / batches if batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+            }
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # Finish this batch; the sentinel stops the loop afterwards
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # Skip inputs whose caller already gave up
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                results = self.infer([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Expected {len(batch)} results, got {len(results)}")
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._last_batch_size = len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
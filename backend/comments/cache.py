@@ -0,0 +1,203 @@
+"""
+Result cache for classifier verdicts.
+
+Verdicts are keyed on a hash of the normalized comment text plus the
+classifier type and the model name, so changing the model setting
+automatically stops old entries from being served. Lookups go to an
+in-process LRU tier first and then, if configured, to a Django cache
+backend shared between workers.
+
+Only real model verdicts are stored. When a classifier is unavailable it
+returns the rules verdict as a FallbackVerdict, which set_many() skips, so
+the model is asked again as soon as it is back.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+Verdict = Tuple[bool, Optional[str]]
+
+
+class FallbackVerdict(tuple):
+    """A (should_flag, reason) verdict from the rules, returned because the ML classifier was unavailable."""
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with a per-entry time to live."""
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Any):
+        if self.max_size <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class VerdictCache:
+    """
+    Two-tier cache for (should_flag, reason) verdicts.
+
+    Args:
+        max_size: Maximum number of verdicts held in the in-process LRU tier
+        ttl: Seconds a verdict stays in the LRU tier
+        backend_alias: Name of a Django cache in CACHES to use as a shared second tier
+        backend_ttl: Seconds a verdict stays in the Django cache tier
+    """
+
+    KEY_PREFIX = 'comments:verdict'
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = 3600,
+                 backend_alias: Optional[str] = None, backend_ttl: Optional[float] = 86400):
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self.backend_alias = backend_alias or None
+        self.backend_ttl = backend_ttl
+        self.backend_hits = 0
+        self.backend_misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self.backend_alias is None:
+            return None
+        from django.core.cache import caches
+        return caches[self.backend_alias]
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Fold Unicode compatibility forms and collapse whitespace so near-duplicate floods share a key."""
+        return _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFKC', text)).strip()
+
+    @classmethod
+    def make_key(cls, text: str, classifier: str, model: str = '') -> str:
+        digest = hashlib.sha256(cls.normalize(text).encode('utf-8')).hexdigest()
+        return f"{cls.KEY_PREFIX}:{classifier}:{model}:{digest}"
+
+    def get(self, key: str) -> Optional[Verdict]:
+        """Return the cached verdict for a key, or None."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Verdict]:
+        """Return the cached verdicts for whichever keys are present."""
+        found = {}
+        missing = []
+        for key in keys:
+            verdict = self.local.get(key)
+            if verdict is not None:
+                found[key] = verdict
+            else:
+                missing.append(key)
+
+        backend = self.backend
+        if missing and backend is not None:
+            stored = backend.get_many(missing)
+            with self._lock:
+                self.backend_hits += len(stored)
+                self.backend_misses += len(missing) - len(stored)
+            for key, value in stored.items():
+                verdict = (bool(value[0]), value[1])
+                self.local.set(key, verdict)
+                found[key] = verdict
+        return found
+
+    def set(self, key: str, verdict: Verdict):
+        self.set_many({key: verdict})
+
+    def set_many(self, verdicts: Dict[str, Verdict]):
+        """Store verdicts, skipping any FallbackVerdict."""
+        verdicts = {key: verdict for key, verdict in verdicts.items() if not isinstance(verdict, FallbackVerdict)}
+        for key, verdict in verdicts.items():
+            self.local.set(key, verdict)
+        backend = self.backend
+        if verdicts and backend is not None:
+            backend.set_many(
+                {key: [verdict[0], verdict[1]] for key, verdict in verdicts.items()},
+                timeout=self.backend_ttl
+            )
+
+    def clear(self):
+        """
+        Drop the in-process tier.
+
+        Entries in the Django cache tier are not deleted; they age out via
+        backend_ttl and stop matching once the model or rules change.
+        """
+        self.local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'local': self.local.stats(),
+            'backend': {
+                'alias': self.backend_alias,
+                'ttl': self.backend_ttl,
+                'hits': self.backend_hits,
+                'misses': self.backend_misses,
+            },
+        }
+
+
+def cached_classify(cache: VerdictCache, texts: List[str], keys: List[str], classify_many) -> List[Verdict]:
+    """
+    Resolve verdicts for texts from the cache, calling classify_many only for misses.
+
+    Duplicate texts within one call are classified once.
+    """
+    found = cache.get_many(keys)
+    pending: "OrderedDict[str, str]" = OrderedDict()
+    for text, key in zip(texts, keys):
+        if key not in found and key not in pending:
+            pending[key] = text
+
+    if pending:
+        computed = dict(zip(pending.keys(), classify_many(list(pending.values()))))
+        cache.set_many(computed)
+        found.update(computed)
+
+    return [found[key] for key in keys]
@@ -0,0 +1,26 @@
+"""
+System checks for the comments app.
+"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from . import response_cache
+
+
+@register()
+def check_response_cache_shared(app_configs, **kwargs):
+    """Warn when the response cache is turned on over a cache that other processes can't invalidate."""
+    if not getattr(settings, 'RESPONSE_CACHE_ENABLED', None) or response_cache.is_shared():
+        return []
+    return [
+        Warning(
+            "RESPONSE_CACHE_ENABLED is on but RESPONSE_CACHE_ALIAS is a per-process locmem cache.",
+            hint=(
+                "Comments changed by classify_pending_comments, reclassify_comments or "
+                "repair_post_counters (or by another worker) are served stale until "
+                "RESPONSE_CACHE_TTL expires. Point RESPONSE_CACHE_ALIAS at a shared backend "
+                "such as redis, memcached or the database cache."
+            ),
+            id='comments.W001',
+        )
+    ]
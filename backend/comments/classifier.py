@@ -2,11 +2,57 @@
 Classification service for comments.
 Supports rule-based, Hugging Face pipeline, and OpenAI API classification.
 """
+import asyncio
+import json
 import re
 import os
-from typing import Tuple, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple, Optional, Sequence
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
+from .batching import MicroBatcher
+from .cache import FallbackVerdict, VerdictCache, cached_classify
+from .inference import build_pipeline
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+_hf_batcher_lock = threading.Lock()
+_hf_model_lock = threading.Lock()
+_openai_lock = threading.Lock()
+_inference_executor_lock = threading.Lock()
+_verdict_cache_lock = threading.Lock()
+
+# Text run through the pipeline by load_ml_model(dummy_inference=True)
+WARMUP_TEXT = "Thanks for the post, this was an interesting read."
+
+# Passed on every pipeline call, single or batched, so a text gets the same verdict on every path
+HF_PIPELINE_KWARGS = {'truncation': True}
+
+
+class RuleEngine:
+    """
+    Precompiled matcher for an ordered list of (pattern, reason) rules.
+    
+    Every pattern is compiled once up front and the bound ``search`` methods
+    are kept in priority order, so matching a comment costs one scan per rule
+    at most and skips the ``re`` module's per-call pattern cache lookup. The
+    reason returned is always that of the first rule in list order that
+    matches anywhere in the text.
+    """
+    
+    def __init__(self, patterns: Sequence[Tuple[str, str]], flags: int = re.IGNORECASE):
+        self.patterns = patterns
+        self.reasons = [reason for _, reason in patterns]
+        self._searches = [re.compile(pattern, flags).search for pattern, _ in patterns]
+    
+    def match(self, text: str) -> Optional[str]:
+        """Return the reason of the first rule that matches the text, or None."""
+        for search, reason in zip(self._searches, self.reasons):
+            if search(text) is not None:
+                return reason
+        return None
+
 
 class CommentClassifier:
     """
@@ -27,10 +73,27 @@ class CommentClassifier:
         (r'[0-9]{4,}', 'Contains suspicious numbers'),
     ]
     
+    # Compiled rule engine, rebuilt lazily whenever FLAG_PATTERNS is replaced
+    _rule_engine = None
+    
     # ML model cache (optional - can be loaded if transformers is available)
     _hf_model = None
+    _hf_batcher = None
     _openai_client = None
     
+    # OpenAI resilience (see get_openai_breaker and get_openai_retry_policy)
+    _openai_breaker = None
+    _openai_retry_policy = None
+    _openai_fallbacks = 0
+    
+    # Async path (see aclassify)
+    _async_openai_client = None
+    _inference_executor = None
+    
+    # Verdict cache for the ML classifiers (see get_verdict_cache)
+    _verdict_cache = None
+    _verdict_cache_config = None
+    
     @classmethod
     def classify(cls, comment_text: str, use_ml: bool = False, classifier_type: Optional[str] = None) -> Tuple[bool, Optional[str]]:
         """
@@ -51,23 +114,119 @@ class CommentClassifier:
         classifier = classifier_type or getattr(settings, 'CLASSIFIER_TYPE', 'rules')
         
         if classifier == 'openai':
-            return cls._classify_openai(comment_text)
+            classify_one = cls._classify_openai
         elif classifier == 'huggingface':
-            return cls._classify_huggingface(comment_text)
+            classify_one = cls._classify_huggingface
         else:
             # Fallback to rules if ML is requested but type is invalid
             return cls._classify_rules(comment_text)
+        
+        # Repeated texts (e.g. spam floods) reuse the cached verdict; rules fallbacks are not stored
+        cache = cls.get_verdict_cache()
+        if cache is None:
+            return classify_one(comment_text)
+        
+        key = cls._verdict_cache_key(comment_text, classifier)
+        verdict = cache.get(key)
+        if verdict is None:
+            verdict = classify_one(comment_text)
+            cache.set(key, verdict)
+        return verdict
+    
+    @classmethod
+    def classify_many(cls, texts: Iterable[str], use_ml: bool = False, classifier_type: Optional[str] = None,
+                      use_cache: bool = True) -> List[Tuple[bool, Optional[str]]]:
+        """
+        Classify several comments at once.
+        
+        Takes the same options as classify() and returns one (should_flag, reason)
+        tuple per input text, in input order. The Hugging Face classifier runs
+        the texts through the pipeline in padded batches instead of one call
+        per comment, and the OpenAI classifier packs up to OPENAI_BATCH_SIZE
+        comments into each request. With use_cache=False the verdict cache is
+        neither read nor written. Verdicts that fell back to rules are
+        FallbackVerdict instances.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        
+        if not use_ml:
+            return cls._classify_rules_many(texts)
+        
+        classifier = classifier_type or getattr(settings, 'CLASSIFIER_TYPE', 'rules')
+        
+        if classifier == 'openai':
+            classify_batch = cls._classify_openai_many
+        elif classifier == 'huggingface':
+            classify_batch = cls._classify_huggingface_many
+        else:
+            return cls._classify_rules_many(texts)
+        
+        cache = cls.get_verdict_cache() if use_cache else None
+        if cache is None:
+            return classify_batch(texts)
+        
+        keys = [cls._verdict_cache_key(text, classifier) for text in texts]
+        return cached_classify(cache, texts, keys, classify_batch)
+    
+    @classmethod
+    def get_verdict_cache(cls) -> Optional[VerdictCache]:
+        """
+        Return the shared verdict cache for ML classifiers, or None if disabled.
+        
+        The cache is rebuilt (and therefore emptied) whenever its settings change.
+        """
+        if not getattr(settings, 'VERDICT_CACHE_ENABLED', True):
+            return None
+        config = (
+            getattr(settings, 'VERDICT_CACHE_SIZE', 10000),
+            getattr(settings, 'VERDICT_CACHE_TTL', 3600),
+            getattr(settings, 'VERDICT_CACHE_BACKEND', '') or None,
+            getattr(settings, 'VERDICT_CACHE_BACKEND_TTL', 86400),
+        )
+        if cls._verdict_cache is None or cls._verdict_cache_config != config:
+            with _verdict_cache_lock:
+                if cls._verdict_cache is None or cls._verdict_cache_config != config:
+                    size, ttl, backend_alias, backend_ttl = config
+                    cls._verdict_cache = VerdictCache(
+                        max_size=size,
+                        ttl=ttl,
+                        backend_alias=backend_alias,
+                        backend_ttl=backend_ttl
+                    )
+                    cls._verdict_cache_config = config
+        return cls._verdict_cache
+    
+    @classmethod
+    def _verdict_cache_key(cls, comment_text: str, classifier: str) -> str:
+        if classifier == 'openai':
+            model = getattr(settings, 'OPENAI_MODEL', 'gpt-3.5-turbo')
+        else:
+            model = getattr(settings, 'HUGGINGFACE_MODEL', 'j-hartmann/emotion-english-distilroberta-base')
+            backend = getattr(settings, 'HUGGINGFACE_BACKEND', 'pytorch')
+            if backend != 'pytorch':
+                # Quantized backends can score borderline comments differently
+                model = f"{model}@{backend}"
+        return VerdictCache.make_key(comment_text, classifier, model)
+    
+    @classmethod
+    def get_rule_engine(cls) -> 'RuleEngine':
+        """Return the compiled rule engine for the current FLAG_PATTERNS."""
+        engine = cls._rule_engine
+        if engine is None or engine.patterns is not cls.FLAG_PATTERNS:
+            engine = RuleEngine(cls.FLAG_PATTERNS)
+            cls._rule_engine = engine
+        return engine
     
     @classmethod
     def _classify_rules(cls, comment_text: str) -> Tuple[bool, Optional[str]]:
         """
         Rule-based classification using pattern matching.
         """
-        comment_lower = comment_text.lower()
-        
-        for pattern, reason in cls.FLAG_PATTERNS:
-            if re.search(pattern, comment_text, re.IGNORECASE):
-                return True, reason
+        reason = cls.get_rule_engine().match(comment_text)
+        if reason is not None:
+            return True, reason
         
         # Check for very short comments (potential spam)
         if len(comment_text.strip()) < 5:
@@ -79,64 +238,195 @@ class CommentClassifier:
         
         return False, None
     
+    @classmethod
+    def _classify_rules_many(cls, texts: List[str]) -> List[Tuple[bool, Optional[str]]]:
+        """Rule-based classification for a list of comments."""
+        return [cls._classify_rules(comment_text) for comment_text in texts]
+    
+    @classmethod
+    def _rules_fallback(cls, texts: List[str]) -> List[Tuple[bool, Optional[str]]]:
+        """Rules verdicts for comments an ML classifier couldn't judge, marked so they are never cached."""
+        return [FallbackVerdict(verdict) for verdict in cls._classify_rules_many(texts)]
+    
+    @classmethod
+    def _get_hf_model(cls):
+        """
+        Return the cached Hugging Face pipeline, loading it on first use.
+        
+        Loading is guarded by a lock so concurrent first requests (or a request
+        racing the startup warm-up) build the pipeline only once.
+        """
+        if cls._hf_model is None:
+            with _hf_model_lock:
+                if cls._hf_model is None:
+                    cls._hf_model = cls._build_hf_pipeline()
+        return cls._hf_model
+    
+    @staticmethod
+    def _build_hf_pipeline():
+        """Build the pipeline with the one configuration every code path relies on, on HUGGINGFACE_BACKEND."""
+        model_name = getattr(settings, 'HUGGINGFACE_MODEL', 'j-hartmann/emotion-english-distilroberta-base')
+        return build_pipeline(model_name, getattr(settings, 'HUGGINGFACE_BACKEND', 'pytorch'))
+    
+    @classmethod
+    def get_hf_batcher(cls) -> Optional[MicroBatcher]:
+        """
+        Return the shared micro-batcher for Hugging Face inference.
+        
+        Returns None unless HUGGINGFACE_MICROBATCH is enabled, in which case
+        concurrent single-comment requests are grouped into one pipeline call
+        (see MicroBatcher for how this interacts with the verdict cache).
+        """
+        if not getattr(settings, 'HUGGINGFACE_MICROBATCH', False):
+            return None
+        if cls._hf_batcher is None:
+            with _hf_batcher_lock:
+                if cls._hf_batcher is None:
+                    cls._hf_batcher = MicroBatcher(
+                        lambda texts: cls._get_hf_model()(texts, batch_size=len(texts), **HF_PIPELINE_KWARGS),
+                        max_batch_size=getattr(settings, 'HUGGINGFACE_MICROBATCH_MAX_SIZE', 16),
+                        max_wait_ms=getattr(settings, 'HUGGINGFACE_MICROBATCH_MAX_WAIT_MS', 10),
+                    )
+        return cls._hf_batcher
+    
+    @staticmethod
+    def _hf_verdict(scores) -> Tuple[bool, Optional[str]]:
+        """Turn the label scores for one comment into a (should_flag, reason) verdict."""
+        # Check for negative emotions or high toxicity scores
+        for result in scores:
+            label = result['label'].lower()
+            score = result['score']
+            
+            # Check for negative emotions
+            if label in ['anger', 'fear', 'sadness'] and score > 0.5:
+                return True, f'Detected {label} emotion (score: {score:.2f})'
+            
+            # Check for toxicity labels (common in toxicity models)
+            if label in ['toxic', 'hate', 'spam', 'offensive'] and score > 0.5:
+                return True, f'Detected {label} content (score: {score:.2f})'
+        
+        return False, None
+    
     @classmethod
     def _classify_huggingface(cls, comment_text: str) -> Tuple[bool, Optional[str]]:
         """
         ML-based classification using Hugging Face transformers pipeline.
         """
         try:
-            if cls._hf_model is None:
-                from transformers import pipeline
-                model_name = getattr(settings, 'HUGGINGFACE_MODEL', 'j-hartmann/emotion-english-distilroberta-base')
-                cls._hf_model = pipeline(
-                    "text-classification",
-                    model=model_name,
-                    return_all_scores=True
-                )
-            
             # Use ML model to detect negative emotions or toxicity
-            results = cls._hf_model(comment_text)
+            batcher = cls.get_hf_batcher()
+            if batcher is not None:
+                future = batcher.submit(comment_text)
+                try:
+                    scores = future.result(timeout=getattr(settings, 'HUGGINGFACE_MICROBATCH_TIMEOUT', 30.0))
+                except TimeoutError:
+                    # Worker stuck or dead; drop the input if it hasn't started
+                    future.cancel()
+                    raise
+                return cls._hf_verdict(scores)
             
-            # Check for negative emotions or high toxicity scores
-            for result in results[0]:
-                label = result['label'].lower()
-                score = result['score']
-                
-                # Check for negative emotions
-                if label in ['anger', 'fear', 'sadness'] and score > 0.5:
-                    return True, f'Detected {label} emotion (score: {score:.2f})'
-                
-                # Check for toxicity labels (common in toxicity models)
-                if label in ['toxic', 'hate', 'spam', 'offensive'] and score > 0.5:
-                    return True, f'Detected {label} content (score: {score:.2f})'
-            
-            return False, None
+            results = cls._get_hf_model()(comment_text, **HF_PIPELINE_KWARGS)
+            return cls._hf_verdict(results[0])
             
         except ImportError:
             # Fallback to rule-based if transformers not available
-            return cls._classify_rules(comment_text)
+            return cls._rules_fallback([comment_text])[0]
         except Exception as e:
             # Fallback to rule-based if ML fails
             print(f"Hugging Face classification error: {e}")
-            return cls._classify_rules(comment_text)
+            return cls._rules_fallback([comment_text])[0]
     
     @classmethod
-    def _classify_openai(cls, comment_text: str) -> Tuple[bool, Optional[str]]:
+    def _classify_huggingface_many(cls, texts: List[str]) -> List[Tuple[bool, Optional[str]]]:
         """
-        ML-based classification using OpenAI API.
+        Batched Hugging Face classification.
+        
+        The whole list is handed to the pipeline at once; it pads each group
+        of HUGGINGFACE_BATCH_SIZE comments and runs them in one forward pass.
         """
         try:
-            if cls._openai_client is None:
-                from openai import OpenAI
-                api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY', ''))
-                if not api_key:
-                    raise ValueError("OpenAI API key is not configured. Please set OPENAI_API_KEY in your environment variables or Django settings.")
-                cls._openai_client = OpenAI(api_key=api_key)
-            
-            model = getattr(settings, 'OPENAI_MODEL', 'gpt-3.5-turbo')
+            batch_size = getattr(settings, 'HUGGINGFACE_BATCH_SIZE', 32)
+            results = cls._get_hf_model()(texts, batch_size=batch_size, **HF_PIPELINE_KWARGS)
+            return [cls._hf_verdict(scores) for scores in results]
             
-            # Create a prompt for classification
-            prompt = f"""Analyze the following comment and determine if it should be flagged for review.
+        except ImportError:
+            # Fallback to rule-based if transformers not available
+            return cls._rules_fallback(texts)
+        except Exception as e:
+            # Fallback to rule-based if ML fails
+            print(f"Hugging Face classification error: {e}")
+            return cls._rules_fallback(texts)
+    
+    @classmethod
+    def get_openai_breaker(cls) -> CircuitBreaker:
+        """Return the shared circuit breaker guarding OpenAI calls."""
+        if cls._openai_breaker is None:
+            with _openai_lock:
+                if cls._openai_breaker is None:
+                    cls._openai_breaker = CircuitBreaker(
+                        failure_threshold=getattr(settings, 'OPENAI_BREAKER_FAILURE_THRESHOLD', 5),
+                        reset_timeout=getattr(settings, 'OPENAI_BREAKER_RESET_TIMEOUT', 30.0)
+                    )
+        return cls._openai_breaker
+    
+    @classmethod
+    def get_openai_retry_policy(cls) -> RetryPolicy:
+        """Return the shared retry policy for OpenAI calls."""
+        if cls._openai_retry_policy is None:
+            with _openai_lock:
+                if cls._openai_retry_policy is None:
+                    cls._openai_retry_policy = RetryPolicy(
+                        timeout=getattr(settings, 'OPENAI_TIMEOUT', 10.0),
+                        max_retries=getattr(settings, 'OPENAI_MAX_RETRIES', 2),
+                        budget=getattr(settings, 'OPENAI_RETRY_BUDGET', 20.0),
+                        base_delay=getattr(settings, 'OPENAI_RETRY_BASE_DELAY', 0.5),
+                        max_delay=getattr(settings, 'OPENAI_RETRY_MAX_DELAY', 4.0)
+                    )
+        return cls._openai_retry_policy
+    
+    @classmethod
+    def get_openai_stats(cls) -> dict:
+        """Return circuit breaker state plus retry and fallback counts for the OpenAI classifier."""
+        return {
+            'breaker': cls.get_openai_breaker().stats(),
+            'retries': cls.get_openai_retry_policy().retries,
+            'fallbacks': cls._openai_fallbacks,
+        }
+    
+    @classmethod
+    def _get_openai_client(cls):
+        """Return the cached OpenAI client, creating it on first use."""
+        if cls._openai_client is None:
+            from openai import OpenAI
+            api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY', ''))
+            if not api_key:
+                raise ValueError("OpenAI API key is not configured. Please set OPENAI_API_KEY in your environment variables or Django settings.")
+            with _openai_lock:
+                if cls._openai_client is None:
+                    cls._openai_client = OpenAI(
+                        api_key=api_key,
+                        base_url=getattr(settings, 'OPENAI_BASE_URL', None) or None,
+                        timeout=getattr(settings, 'OPENAI_TIMEOUT', 10.0),
+                        # Retries are handled by get_openai_retry_policy() so they share one budget
+                        max_retries=0
+                    )
+        return cls._openai_client
+    
+    @staticmethod
+    def _is_transient_openai_error(error: Exception) -> bool:
+        """Timeouts, connection failures, rate limits and 5xx responses are worth retrying."""
+        import openai
+        return isinstance(error, (
+            openai.APITimeoutError,
+            openai.APIConnectionError,
+            openai.RateLimitError,
+            openai.InternalServerError,
+        ))
+    
+    @staticmethod
+    def _openai_prompt(comment_text: str) -> str:
+        """Create a prompt for classifying one comment."""
+        return f"""Analyze the following comment and determine if it should be flagged for review.
 Consider factors like: spam, profanity, hate speech, toxicity, inappropriate content, or suspicious patterns.
 
 Comment: "{comment_text}"
@@ -147,39 +437,102 @@ Respond in JSON format with:
 - "confidence": 0.0 to 1.0
 
 Only respond with valid JSON, no additional text."""
-
-            response = cls._openai_client.chat.completions.create(
+    
+    @staticmethod
+    def _openai_messages(prompt: str) -> List[dict]:
+        return [
+            {"role": "system", "content": "You are a content moderation assistant. Analyze comments and determine if they need review."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    @classmethod
+    def _openai_chat(cls, prompt: str, max_tokens: int) -> str:
+        """
+        Send one moderation prompt and return the reply text.
+        
+        The call goes through the circuit breaker and retry policy; it raises
+        CircuitOpenError without calling the API while the breaker is open.
+        """
+        client = cls._get_openai_client()
+        model = getattr(settings, 'OPENAI_MODEL', 'gpt-3.5-turbo')
+        
+        def request(timeout):
+            return client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": "You are a content moderation assistant. Analyze comments and determine if they need review."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=cls._openai_messages(prompt),
                 temperature=0.3,
-                max_tokens=150
+                max_tokens=max_tokens,
+                timeout=timeout
             )
-            
-            # Parse the response
-            response_text = response.choices[0].message.content.strip()
-            
-            # Try to extract JSON from the response
-            import json
-            # Remove markdown code blocks if present
-            if response_text.startswith('```'):
-                response_text = response_text.split('```')[1]
-                if response_text.startswith('json'):
-                    response_text = response_text[4:]
-                response_text = response_text.strip()
-            
-            result = json.loads(response_text)
-            
-            should_flag = result.get('should_flag', False)
-            reason = result.get('reason', None)
-            confidence = result.get('confidence', 0.0)
-            
-            if should_flag:
-                return True, f"{reason} (confidence: {confidence:.2f})"
+        
+        breaker = cls.get_openai_breaker()
+        if not breaker.allow():
+            raise CircuitOpenError("OpenAI circuit breaker is open")
+        try:
+            response = cls.get_openai_retry_policy().call(request, cls._is_transient_openai_error)
+        except Exception as e:
+            if cls._is_transient_openai_error(e):
+                breaker.record_failure()
             else:
-                return False, None
+                # The API answered, so the upstream itself is healthy
+                breaker.record_success()
+            raise
+        except BaseException:
+            # Interrupted mid-call; recording it releases a half-open trial
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return str(response.choices[0].message.content or '').strip()
+    
+    @staticmethod
+    def _parse_openai_json(response_text: str):
+        """Parse a JSON reply, removing markdown code blocks if present."""
+        if response_text.startswith('```'):
+            response_text = response_text.split('```')[1]
+            if response_text.startswith('json'):
+                response_text = response_text[4:]
+            response_text = response_text.strip()
+        return json.loads(response_text)
+    
+    @staticmethod
+    def _openai_verdict(result: dict) -> Tuple[bool, Optional[str]]:
+        """Turn one parsed {"should_flag", "reason", "confidence"} object into a verdict."""
+        should_flag = result.get('should_flag', False)
+        reason = result.get('reason', None)
+        confidence = result.get('confidence', 0.0)
+        
+        if should_flag:
+            return True, f"{reason} (confidence: {confidence:.2f})"
+        else:
+            return False, None
+    
+    @classmethod
+    def _openai_unavailable(cls, error: Exception) -> bool:
+        """Whether an OpenAI error should fall back to rules rather than be reported."""
+        if not getattr(settings, 'OPENAI_FALLBACK_TO_RULES', True):
+            return False
+        return isinstance(error, CircuitOpenError) or cls._is_transient_openai_error(error)
+    
+    @classmethod
+    def _record_openai_fallback(cls, error: Exception, count: int = 1):
+        with _openai_lock:
+            cls._openai_fallbacks += count
+        print(f"OpenAI classification unavailable, using rules: {error}")
+    
+    @classmethod
+    def _classify_openai(cls, comment_text: str) -> Tuple[bool, Optional[str]]:
+        """
+        ML-based classification using OpenAI API.
+        
+        Each attempt is limited to OPENAI_TIMEOUT seconds and transient errors
+        are retried within OPENAI_RETRY_BUDGET. When the API keeps failing the
+        circuit breaker opens and comments are classified by rules instead
+        (unless OPENAI_FALLBACK_TO_RULES is off) until it recovers. Those
+        rules verdicts are FallbackVerdicts, so they are never cached.
+        """
+        try:
+            result = cls._parse_openai_json(cls._openai_chat(cls._openai_prompt(comment_text), max_tokens=150))
+            return cls._openai_verdict(result)
                 
         except ImportError:
             # Raise error if openai library is not installed
@@ -188,24 +541,251 @@ Only respond with valid JSON, no additional text."""
             # Re-raise ValueError (e.g., API key not configured) so it can be shown to user
             raise
         except Exception as e:
+            if cls._openai_unavailable(e):
+                # Fallback to rule-based while the API is unavailable
+                cls._record_openai_fallback(e)
+                return cls._rules_fallback([comment_text])[0]
             # For other errors, raise them so the user knows what went wrong
             error_msg = f"OpenAI classification error: {str(e)}"
             raise Exception(error_msg) from e
     
     @classmethod
-    def load_ml_model(cls, classifier_type: Optional[str] = None):
-        """Pre-load ML model for faster inference."""
+    def _classify_openai_many(cls, texts: List[str]) -> List[Tuple[bool, Optional[str]]]:
+        """
+        Batched OpenAI classification.
+        
+        Packs up to OPENAI_BATCH_SIZE numbered comments into each request and
+        reads back a JSON array of verdicts. Items missing from a malformed or
+        partial reply are sent again, up to OPENAI_BATCH_MAX_ATTEMPTS requests
+        per group, and any still missing after that are classified one by one.
+        """
+        batch_size = getattr(settings, 'OPENAI_BATCH_SIZE', 20)
+        if batch_size <= 1:
+            return [cls._classify_openai(text) for text in texts]
+        
+        try:
+            cls._get_openai_client()
+        except ImportError:
+            raise ImportError("OpenAI library is not installed. Please install it with: pip install openai")
+        
+        attempts = max(getattr(settings, 'OPENAI_BATCH_MAX_ATTEMPTS', 2), 1)
+        verdicts: Dict[int, Tuple[bool, Optional[str]]] = {}
+        for start in range(0, len(texts), batch_size):
+            missing = list(range(start, min(start + batch_size, len(texts))))
+            for _ in range(attempts):
+                found = cls._classify_openai_batch([texts[index] for index in missing])
+                for position, verdict in found.items():
+                    verdicts[missing[position]] = verdict
+                missing = [index for position, index in enumerate(missing) if position not in found]
+                if not missing:
+                    break
+            for index in missing:
+                verdicts[index] = cls._classify_openai(texts[index])
+        return [verdicts[index] for index in range(len(texts))]
+    
+    @classmethod
+    def _classify_openai_batch(cls, batch: List[str]) -> Dict[int, Tuple[bool, Optional[str]]]:
+        """
+        Classify a group of comments with one request.
+        
+        Returns verdicts keyed by position in the batch; positions the reply
+        left out or got wrong are absent so the caller can retry them.
+        """
+        items = '\n'.join(
+            f"{number}. {json.dumps(text, ensure_ascii=False)}" for number, text in enumerate(batch, 1)
+        )
+        prompt = f"""Analyze each of the following numbered comments and determine if it should be flagged for review.
+Consider factors like: spam, profanity, hate speech, toxicity, inappropriate content, or suspicious patterns.
+
+Comments:
+{items}
+
+Respond with a JSON array containing one object per comment, each with:
+- "id": the comment number
+- "should_flag": true/false
+- "reason": brief explanation (if should_flag is true, otherwise null)
+- "confidence": 0.0 to 1.0
+
+Only respond with valid JSON, no additional text."""
+
+        try:
+            result = cls._parse_openai_json(cls._openai_chat(prompt, max_tokens=60 * len(batch) + 50))
+        except ValueError:
+            # Unparseable reply; every item counts as missing
+            return {}
+        except Exception as e:
+            if cls._openai_unavailable(e):
+                cls._record_openai_fallback(e, count=len(batch))
+                return dict(enumerate(cls._rules_fallback(batch)))
+            raise Exception(f"OpenAI classification error: {str(e)}") from e
+        
+        if isinstance(result, dict):
+            # Tolerate the array being wrapped in an object, e.g. {"results": [...]}
+            result = next((value for value in result.values() if isinstance(value, list)), [])
+        if not isinstance(result, list):
+            return {}
+        
+        found = {}
+        for entry in result:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                position = int(entry['id']) - 1
+                if 0 <= position < len(batch) and position not in found:
+                    found[position] = cls._openai_verdict(entry)
+            except (KeyError, TypeError, ValueError):
+                continue
+        return found
+    
+    @classmethod
+    async def aclassify(cls, comment_text: str, use_ml: bool = False, classifier_type: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+        """
+        Async version of classify() for ASGI views.
+        
+        OpenAI requests are awaited on AsyncOpenAI, so a single worker can keep
+        many in flight. Hugging Face inference runs on the bounded
+        get_inference_executor() pool. Rules are cheap and run inline.
+        """
+        if not use_ml:
+            return cls._classify_rules(comment_text)
+        
+        classifier = classifier_type or getattr(settings, 'CLASSIFIER_TYPE', 'rules')
+        
+        if classifier == 'openai':
+            classify_one = cls._aclassify_openai
+        elif classifier == 'huggingface':
+            classify_one = cls._aclassify_huggingface
+        else:
+            return cls._classify_rules(comment_text)
+        
+        cache = cls.get_verdict_cache()
+        if cache is None:
+            return await classify_one(comment_text)
+        
+        key = cls._verdict_cache_key(comment_text, classifier)
+        if cache.backend_alias is None:
+            verdict = cache.get(key)
+        else:
+            # The shared tier is a network cache; keep its I/O off the event loop
+            verdict = await sync_to_async(cache.get, thread_sensitive=False)(key)
+        if verdict is None:
+            verdict = await classify_one(comment_text)
+            if cache.backend_alias is None:
+                cache.set(key, verdict)
+            else:
+                await sync_to_async(cache.set, thread_sensitive=False)(key, verdict)
+        return verdict
+    
+    @classmethod
+    def get_inference_executor(cls) -> ThreadPoolExecutor:
+        """Return the thread pool, sized by HUGGINGFACE_INFERENCE_WORKERS, that runs model inference for aclassify()."""
+        if cls._inference_executor is None:
+            with _inference_executor_lock:
+                if cls._inference_executor is None:
+                    cls._inference_executor = ThreadPoolExecutor(
+                        max_workers=getattr(settings, 'HUGGINGFACE_INFERENCE_WORKERS', 4),
+                        thread_name_prefix='hf-inference'
+                    )
+        return cls._inference_executor
+    
+    @classmethod
+    async def _aclassify_huggingface(cls, comment_text: str) -> Tuple[bool, Optional[str]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls.get_inference_executor(), cls._classify_huggingface, comment_text)
+    
+    @classmethod
+    def _get_async_openai_client(cls):
+        """
+        Return the AsyncOpenAI client for the running event loop.
+        
+        An async client's connection pool belongs to the loop it is used on,
+        so a new client is created if the loop changes.
+        """
+        loop = asyncio.get_running_loop()
+        if cls._async_openai_client is None or cls._async_openai_client[0] is not loop:
+            from openai import AsyncOpenAI
+            api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY', ''))
+            if not api_key:
+                raise ValueError("OpenAI API key is not configured. Please set OPENAI_API_KEY in your environment variables or Django settings.")
+            cls._async_openai_client = (loop, AsyncOpenAI(
+                api_key=api_key,
+                base_url=getattr(settings, 'OPENAI_BASE_URL', None) or None,
+                timeout=getattr(settings, 'OPENAI_TIMEOUT', 10.0),
+                max_retries=0
+            ))
+        return cls._async_openai_client[1]
+    
+    @classmethod
+    async def _aopenai_chat(cls, prompt: str, max_tokens: int) -> str:
+        """Async version of _openai_chat(), sharing its circuit breaker and retry policy."""
+        client = cls._get_async_openai_client()
+        model = getattr(settings, 'OPENAI_MODEL', 'gpt-3.5-turbo')
+        
+        def request(timeout):
+            return client.chat.completions.create(
+                model=model,
+                messages=cls._openai_messages(prompt),
+                temperature=0.3,
+                max_tokens=max_tokens,
+                timeout=timeout
+            )
+        
+        breaker = cls.get_openai_breaker()
+        if not breaker.allow():
+            raise CircuitOpenError("OpenAI circuit breaker is open")
+        try:
+            response = await cls.get_openai_retry_policy().acall(request, cls._is_transient_openai_error)
+        except Exception as e:
+            if cls._is_transient_openai_error(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except BaseException:
+            # Task cancelled (e.g. the client disconnected); don't leave a half-open trial running
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return str(response.choices[0].message.content or '').strip()
+    
+    @classmethod
+    async def _aclassify_openai(cls, comment_text: str) -> Tuple[bool, Optional[str]]:
+        """Async version of _classify_openai()."""
+        try:
+            result = cls._parse_openai_json(await cls._aopenai_chat(cls._openai_prompt(comment_text), max_tokens=150))
+            return cls._openai_verdict(result)
+        except ImportError:
+            raise ImportError("OpenAI library is not installed. Please install it with: pip install openai")
+        except ValueError:
+            raise
+        except Exception as e:
+            if cls._openai_unavailable(e):
+                cls._record_openai_fallback(e)
+                return cls._rules_fallback([comment_text])[0]
+            raise Exception(f"OpenAI classification error: {str(e)}") from e
+    
+    @classmethod
+    def load_ml_model(cls, classifier_type: Optional[str] = None, dummy_inference: bool = False) -> bool:
+        """
+        Pre-load ML model for faster inference.
+        
+        Builds the same pipeline or client the lazy path would, under the same
+        lock. With dummy_inference the Hugging Face pipeline also classifies a
+        short text, singly and as a batch, so the first real request doesn't
+        pay for one-off allocation and kernel setup. Returns whether a model
+        was loaded.
+        """
         classifier = classifier_type or getattr(settings, 'CLASSIFIER_TYPE', 'rules')
         
         if classifier == 'huggingface':
             try:
-                from transformers import pipeline
+                model = cls._get_hf_model()
                 model_name = getattr(settings, 'HUGGINGFACE_MODEL', 'j-hartmann/emotion-english-distilroberta-base')
-                cls._hf_model = pipeline(
-                    "text-classification",
-                    model=model_name
-                )
                 print(f"Loaded Hugging Face model: {model_name}")
+                if dummy_inference:
+                    model(WARMUP_TEXT, **HF_PIPELINE_KWARGS)
+                    model([WARMUP_TEXT] * 2, batch_size=2, **HF_PIPELINE_KWARGS)
+                return True
             except ImportError:
                 print("Transformers library not available. Using rule-based classification only.")
             except Exception as e:
@@ -213,15 +793,21 @@ Only respond with valid JSON, no additional text."""
         
         elif classifier == 'openai':
             try:
-                from openai import OpenAI
                 api_key = getattr(settings, 'OPENAI_API_KEY', os.getenv('OPENAI_API_KEY', ''))
                 if api_key:
-                    cls._openai_client = OpenAI(api_key=api_key)
+                    cls._get_openai_client()
                     model = getattr(settings, 'OPENAI_MODEL', 'gpt-3.5-turbo')
                     print(f"OpenAI client initialized with model: {model}")
+                    return True
                 else:
                     print("OpenAI API key not configured.")
             except ImportError:
                 print("OpenAI library not available. Using rule-based classification only.")
             except Exception as e:
                 print(f"Error initializing OpenAI client: {e}")
+        
+        return False
+
+
+# Compile the default rules at import time so the first request doesn't pay for it
+CommentClassifier.get_rule_engine()
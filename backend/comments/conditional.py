@@ -0,0 +1,101 @@
+"""
+Conditional GET for post and comment reads.
+
+Validators are computed with one aggregate query per table instead of
+serializing the response: row counts, flag and counter totals,
+Post.updated_at and the newest Comment.created_at, plus the post version
+from response_cache so edits that leave counts and timestamps unchanged
+(PATCH) still change the ETag. The totals cover the management commands,
+whose version bumps never reach a server on a per-process cache. A request whose If-None-Match or If-Modified-Since
+matches gets a bodyless 304.
+"""
+import hashlib
+from typing import Callable, Optional, Tuple
+
+from django.db.models import Count, Max, Q, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Post, Comment
+from . import response_cache
+
+# (ETag, Last-Modified as a Unix timestamp)
+Validators = Tuple[str, int]
+
+
+def make_validators(*parts, last_modified=None, version_of=None) -> Validators:
+    """Build validators from the given state; version_of adds that post's (or ALL_POSTS) write version."""
+    timestamps = [value.timestamp() for value in (last_modified or ()) if value is not None]
+    if version_of is not None:
+        version = response_cache.get_post_version(version_of)
+        parts += (version,)
+        timestamps.append(version / 1e9)
+    etag = quote_etag(hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16])
+    return etag, int(max(timestamps, default=0))
+
+
+def post_validators(post_id) -> Optional[Validators]:
+    """Validators for GET /api/posts/{id}/, or None if the post doesn't exist."""
+    row = (
+        Post.objects
+        .filter(pk=post_id)
+        .annotate(last_comment_at=Max('comments__created_at'))
+        .values_list('updated_at', 'comment_count', 'flagged_count', 'last_comment_at')
+        .first()
+    )
+    if row is None:
+        return None
+    updated_at, comment_count, flagged_count, last_comment_at = row
+    return make_validators(
+        'post', post_id, updated_at, comment_count, flagged_count, last_comment_at,
+        last_modified=(updated_at, last_comment_at), version_of=int(post_id)
+    )
+
+
+def post_list_validators() -> Validators:
+    """Validators for GET /api/posts/: any post or comment write changes them."""
+    posts = Post.objects.aggregate(
+        count=Count('id'), updated_at=Max('updated_at'),
+        comment_count=Sum('comment_count'), flagged_count=Sum('flagged_count'),
+    )
+    comments = Comment.objects.aggregate(count=Count('id'), created_at=Max('created_at'))
+    return make_validators(
+        'posts', posts['count'], posts['updated_at'], posts['comment_count'], posts['flagged_count'],
+        comments['count'], comments['created_at'],
+        last_modified=(posts['updated_at'], comments['created_at']), version_of=response_cache.ALL_POSTS
+    )
+
+
+def comment_list_validators(queryset, post_id=None) -> Validators:
+    """Validators for a filtered comment list; per-post lists only change with that post."""
+    state = queryset.order_by().aggregate(
+        count=Count('id'), created_at=Max('created_at'),
+        flagged=Count('id', filter=Q(flagged_for_review=True)),
+        pending=Count('id', filter=Q(classification_status=Comment.CLASSIFICATION_PENDING)),
+    )
+    return make_validators(
+        'comments', state['count'], state['created_at'], state['flagged'], state['pending'],
+        last_modified=(state['created_at'],),
+        version_of=int(post_id) if post_id is not None else response_cache.ALL_POSTS
+    )
+
+
+def set_validators(response, validators: Validators):
+    etag, last_modified = validators
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Clients may store the body but must revalidate before reusing it
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def conditional_response(request, validators: Optional[Validators], build: Callable):
+    """Answer 304 (or 412) when the request's preconditions say so, otherwise build the response."""
+    if validators is None:
+        return build()
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return set_validators(response, validators) if response.status_code == 304 else response
+    response = build()
+    return set_validators(response, validators) if response.status_code == 200 else response
@@ -0,0 +1,95 @@
+"""
+Denormalized comment counters on Post.
+
+Post.comment_count and Post.flagged_count are adjusted with F() expressions,
+so concurrent writers add to the stored value instead of overwriting each
+other. Comment save() and delete() are covered by the signals in
+signals.py; queryset update(), bulk_create() and bulk_update() send no
+signals, so those callers apply their own deltas with apply_deltas().
+
+Anything that bypasses both (raw SQL, a crash between the comment write and
+the counter update) causes drift, which the repair_post_counters command
+finds with find_drift() and fixes with recount().
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Post, Comment
+
+# post_id -> (comment delta, flagged delta)
+Deltas = Dict[int, Tuple[int, int]]
+
+
+def adjust(post_id, comments: int = 0, flagged: int = 0):
+    apply_deltas({post_id: (comments, flagged)})
+
+
+def apply_deltas(deltas: Deltas):
+    """Add the deltas to each post's counters, one UPDATE per distinct delta."""
+    posts_by_delta: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for post_id, delta in deltas.items():
+        if post_id is not None and any(delta):
+            posts_by_delta[delta].append(post_id)
+    for (comments, flagged), post_ids in posts_by_delta.items():
+        Post.objects.filter(pk__in=post_ids).update(
+            comment_count=F('comment_count') + comments,
+            flagged_count=F('flagged_count') + flagged,
+        )
+
+
+def creation_deltas(comments: Iterable[Comment]) -> Deltas:
+    """Deltas for newly inserted comments."""
+    deltas: Dict[int, Tuple[int, int]] = defaultdict(lambda: (0, 0))
+    for comment in comments:
+        count, flagged = deltas[comment.post_id]
+        deltas[comment.post_id] = (count + 1, flagged + int(bool(comment.flagged_for_review)))
+    return dict(deltas)
+
+
+def flag_deltas(changes: Iterable[Tuple[int, bool, bool]]) -> Deltas:
+    """Deltas for (post_id, was_flagged, is_flagged) verdict changes."""
+    deltas: Dict[int, int] = defaultdict(int)
+    for post_id, was_flagged, is_flagged in changes:
+        deltas[post_id] += int(bool(is_flagged)) - int(bool(was_flagged))
+    return {post_id: (0, flagged) for post_id, flagged in deltas.items()}
+
+
+def actual_counts() -> Dict[str, Coalesce]:
+    """Correlated subqueries counting a post's comments, for annotate() or update()."""
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post')
+
+    def count(queryset):
+        return Coalesce(
+            Subquery(queryset.annotate(n=Count('id')).values('n'), output_field=IntegerField()),
+            Value(0),
+        )
+
+    return {
+        'comment_count': count(comments),
+        'flagged_count': count(comments.filter(flagged_for_review=True)),
+    }
+
+
+def find_drift(queryset=None):
+    """Posts whose stored counters differ from their comments, annotated with the actual values."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    counts = actual_counts()
+    return (
+        queryset
+        .annotate(actual_comment_count=counts['comment_count'], actual_flagged_count=counts['flagged_count'])
+        .filter(~Q(comment_count=F('actual_comment_count')) | ~Q(flagged_count=F('actual_flagged_count')))
+        .order_by('pk')
+    )
+
+
+def recount(post_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute the counters from the comments table in one UPDATE; all posts when post_ids is None."""
+    queryset = Post.objects.all()
+    if post_ids is not None:
+        queryset = queryset.filter(pk__in=list(post_ids))
+    updated: int = queryset.update(**actual_counts())
+    return updated
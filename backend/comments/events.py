@@ -0,0 +1,250 @@
+"""
+Comment events for the Server-Sent Events stream.
+
+Comment writes publish 'comment.created' and 'comment.flagged' events,
+carrying the comment as CommentSerializer renders it, once their transaction
+commits. They go through the broker named by EVENTS_BROKER. The default
+InProcessBroker keeps the last EVENTS_BUFFER_SIZE events in memory and only
+sees writes made in its own process, so either serve the whole app from one
+ASGI process or point EVENTS_BROKER at a shared EventBroker implementation.
+
+Event ids are '<broker epoch>-<sequence>'. A Last-Event-ID from another
+epoch (the process restarted) or older than the buffer can't be resumed;
+the stream sends a 'reset' event instead so the client refetches.
+"""
+import asyncio
+import json
+import secrets
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, NamedTuple, Optional, Protocol, Set, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import Comment
+from .serializers import CommentSerializer
+
+CREATED = 'comment.created'
+FLAGGED = 'comment.flagged'
+RESET = 'reset'
+
+_broker_lock = threading.Lock()
+_broker: Optional['EventBroker'] = None
+_broker_config: Optional[Tuple[str, int]] = None
+
+
+class Event(NamedTuple):
+    id: str
+    type: str
+    data: Dict[str, Any]
+
+
+class Subscription(Protocol):
+    """What EventBroker.listen() returns: an async iterator of events whose aclose() stops listening."""
+
+    def __aiter__(self) -> 'Subscription':
+        ...
+
+    async def __anext__(self) -> Optional[Event]:
+        ...
+
+    async def aclose(self) -> None:
+        ...
+
+
+class EventBroker(ABC):
+    """Interface for event backends; a subclass missing a method fails when it is built."""
+
+    @abstractmethod
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Event:
+        """Store the event and wake every listener. Called from sync code in any thread."""
+
+    @abstractmethod
+    def listen(self, last_event_id: Optional[str] = None, idle_timeout: Optional[float] = None) -> Subscription:
+        """
+        Return an async iterator of the events after last_event_id, then new
+        events as they arrive. The starting point is fixed when listen() is
+        called, not on first iteration, and the iterator's aclose() stops
+        listening.
+
+        Starts with new events only when last_event_id is None, and yields a
+        RESET event first when last_event_id can't be resumed. Yields None
+        after idle_timeout seconds without an event so callers can send
+        keep-alives.
+        """
+
+
+class InProcessBroker(EventBroker):
+    """Ring buffer of recent events; async listeners are woken through their own event loop."""
+
+    def __init__(self, buffer_size: Optional[int] = None):
+        if buffer_size is None:
+            buffer_size = getattr(settings, 'EVENTS_BUFFER_SIZE', 1000)
+        self.epoch = secrets.token_hex(4)
+        self._events: Deque[Tuple[int, Event]] = deque(maxlen=buffer_size)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._listeners: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Event:
+        with self._lock:
+            self._sequence += 1
+            event = Event(f"{self.epoch}-{self._sequence}", event_type, data)
+            self._events.append((self._sequence, event))
+            listeners = list(self._listeners)
+        for loop, wakeup in listeners:
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # The listener's loop has closed; it is removed when its generator exits
+                pass
+        return event
+
+    def _resume_position(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Sequence to resume after, or None if last_event_id can't be resumed. Call with the lock held."""
+        if last_event_id is None:
+            return self._sequence
+        epoch, _, digits = last_event_id.partition('-')
+        if epoch != self.epoch or not digits.isdigit():
+            return None
+        sequence = int(digits)
+        oldest = self._events[0][0] if self._events else self._sequence + 1
+        if sequence > self._sequence or sequence < oldest - 1:
+            return None
+        return sequence
+
+    def _after(self, position: int) -> List[Tuple[int, Event]]:
+        with self._lock:
+            return [entry for entry in self._events if entry[0] > position]
+
+    def listen(self, last_event_id: Optional[str] = None, idle_timeout: Optional[float] = None) -> '_Subscription':
+        listener = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._listeners.add(listener)
+            position = self._resume_position(last_event_id)
+            if position is None:
+                position = self._sequence
+                reset = Event(f"{self.epoch}-{position}", RESET, {})
+            else:
+                reset = None
+        return _Subscription(self, listener, position, reset, idle_timeout)
+
+    def _unsubscribe(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'epoch': self.epoch,
+                'last_event_id': f"{self.epoch}-{self._sequence}",
+                'buffered': len(self._events),
+                'listeners': len(self._listeners),
+            }
+
+
+class _Subscription:
+    """Async iterator over one InProcessBroker listener; aclose() unregisters it even if never iterated."""
+
+    def __init__(self, broker: InProcessBroker, listener: Tuple[asyncio.AbstractEventLoop, asyncio.Event],
+                 position: int, reset: Optional[Event], idle_timeout: Optional[float]):
+        self.broker = broker
+        self.listener = listener
+        self.position = position
+        self.idle_timeout = idle_timeout
+        self.pending: Deque[Tuple[int, Event]] = deque([(position, reset)] if reset is not None else [])
+
+    def __aiter__(self) -> '_Subscription':
+        return self
+
+    async def __anext__(self) -> Optional[Event]:
+        _, wakeup = self.listener
+        while not self.pending:
+            # Clear before reading so a publish in between still wakes us
+            wakeup.clear()
+            self.pending.extend(self.broker._after(self.position))
+            if self.pending:
+                break
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                return None
+        self.position, event = self.pending.popleft()
+        return event
+
+    async def aclose(self) -> None:
+        self.broker._unsubscribe(self.listener)
+
+
+def get_broker() -> EventBroker:
+    """Return the shared broker, rebuilt whenever EVENTS_BROKER or EVENTS_BUFFER_SIZE change."""
+    global _broker, _broker_config
+    config = (
+        getattr(settings, 'EVENTS_BROKER', 'comments.events.InProcessBroker'),
+        getattr(settings, 'EVENTS_BUFFER_SIZE', 1000),
+    )
+    broker = _broker
+    if broker is None or _broker_config != config:
+        with _broker_lock:
+            broker = _broker
+            if broker is None or _broker_config != config:
+                broker = import_string(config[0])()
+                _broker, _broker_config = broker, config
+    return broker
+
+
+def publish_comments(event_type: str, comments: Iterable[Any]):
+    """
+    Publish an event per comment once the current transaction commits.
+
+    Accepts Comment instances or ids; ids are loaded in one query at commit time.
+    """
+    comments = list(comments)
+    if not comments:
+        return
+
+    def publish():
+        instances = [comment for comment in comments if isinstance(comment, Comment)]
+        ids = [comment for comment in comments if not isinstance(comment, Comment)]
+        if ids:
+            instances += list(Comment.objects.filter(pk__in=ids).order_by('pk'))
+        broker = get_broker()
+        for data in CommentSerializer(instances, many=True).data:
+            broker.publish(event_type, data)
+
+    transaction.on_commit(publish)
+
+
+def matches(event: Event, post_id: Optional[int] = None, flagged_only: bool = False) -> bool:
+    """Whether a stream filtered by post and/or flagged status should send this event."""
+    if event.type == RESET:
+        return True
+    if post_id is not None and event.data.get('post') != post_id:
+        return False
+    if flagged_only and not event.data.get('flagged_for_review'):
+        return False
+    return True
+
+
+def format_event(event: Event) -> str:
+    return f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def stream(last_event_id: Optional[str] = None, post_id: Optional[int] = None, flagged_only: bool = False):
+    """Yield the text/event-stream body: matching events plus keep-alive comments while idle."""
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+    events = get_broker().listen(last_event_id, idle_timeout=heartbeat)
+    try:
+        yield f"retry: {getattr(settings, 'EVENTS_RETRY_MS', 3000)}\n\n"
+        async for event in events:
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif matches(event, post_id, flagged_only):
+                yield format_event(event)
+    finally:
+        # Unregister the listener as soon as the client goes away, not when the generator is collected
+        await events.aclose()
@@ -0,0 +1,86 @@
+"""
+Inference backends for the Hugging Face classifier.
+
+Every backend returns a transformers text-classification pipeline built with
+the same options, so callers get the same output shape whichever one is
+configured with HUGGINGFACE_BACKEND:
+
+- 'pytorch': the published model in PyTorch eager mode
+- 'pytorch-int8': PyTorch with the Linear layers dynamically quantized to int8
+- 'onnx': the model exported to ONNX and run by ONNX Runtime
+- 'onnx-int8': the ONNX export with dynamic int8 quantization
+
+The ONNX backends need ``optimum[onnxruntime]``. Exports are written once to
+HUGGINGFACE_EXPORT_DIR and reused on later startups.
+"""
+import os
+from typing import Optional
+
+BACKENDS = ('pytorch', 'pytorch-int8', 'onnx', 'onnx-int8')
+
+# All label scores per input; CommentClassifier._hf_verdict expects a list of {label, score}
+PIPELINE_OPTIONS = {'return_all_scores': True}
+
+ONNX_FILE = 'model.onnx'
+ONNX_QUANTIZED_FILE = 'model_quantized.onnx'
+
+
+def build_pipeline(model_name: str, backend: str = 'pytorch', export_dir: Optional[str] = None):
+    """Build the text-classification pipeline for model_name on the given backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown Hugging Face backend '{backend}'. Options: {', '.join(BACKENDS)}")
+
+    from transformers import pipeline
+
+    if backend == 'pytorch':
+        return pipeline("text-classification", model=model_name, **PIPELINE_OPTIONS)
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == 'pytorch-int8':
+        model = load_quantized_torch_model(model_name)
+    else:
+        model = load_onnx_model(model_name, quantize=backend == 'onnx-int8', export_dir=export_dir)
+    return pipeline("text-classification", model=model, tokenizer=tokenizer, **PIPELINE_OPTIONS)
+
+
+def load_quantized_torch_model(model_name: str):
+    """Load the model and swap its Linear layers for dynamically quantized int8 ones."""
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def get_export_path(model_name: str, export_dir: Optional[str] = None) -> str:
+    if export_dir is None:
+        from django.conf import settings
+        export_dir = getattr(settings, 'HUGGINGFACE_EXPORT_DIR', 'model_exports')
+    return os.path.join(export_dir, model_name.replace('/', '--'))
+
+
+def load_onnx_model(model_name: str, quantize: bool = False, export_dir: Optional[str] = None):
+    """Load the ONNX Runtime model, exporting (and quantizing) it first if there's no saved copy."""
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    path = get_export_path(model_name, export_dir)
+    if not os.path.exists(os.path.join(path, ONNX_FILE)):
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        model.save_pretrained(path)
+    if not quantize:
+        return ORTModelForSequenceClassification.from_pretrained(path, file_name=ONNX_FILE)
+
+    quantized_path = f"{path}-int8"
+    if not os.path.exists(os.path.join(quantized_path, ONNX_QUANTIZED_FILE)):
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        quantizer = ORTQuantizer.from_pretrained(path, file_name=ONNX_FILE)
+        # Dynamic quantization needs no calibration data; avx2 kernels run on any modern x86 CPU
+        quantizer.quantize(
+            save_dir=quantized_path,
+            quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        )
+    return ORTModelForSequenceClassification.from_pretrained(quantized_path, file_name=ONNX_QUANTIZED_FILE)
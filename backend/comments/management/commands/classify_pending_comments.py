@@ -0,0 +1,98 @@
+"""
+Classify comments that were saved with a pending classification.
+
+Each comment is classified with the classifier stored when it was submitted
+(Comment.classifier); --use-ml and --classifier-type only apply to comments
+saved without one.
+"""
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from comments.classifier import CommentClassifier
+from comments.counters import apply_deltas, flag_deltas
+from comments.events import FLAGGED, publish_comments
+from comments.models import Comment
+from comments.response_cache import bump_post_versions
+from comments.tasks import classifier_options, classify_comment
+
+
+class Command(BaseCommand):
+    help = "Classify comments left in the pending classification state"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of comments classified per batch')
+        parser.add_argument('--use-ml', action='store_true',
+                            help='Use the ML classifier for comments saved without a stored classifier')
+        parser.add_argument('--classifier-type', default=None,
+                            help="Override CLASSIFIER_TYPE for comments saved without a stored classifier")
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new pending comments instead of exiting')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = self.process_batch(
+                options['batch_size'],
+                options['use_ml'],
+                options['classifier_type']
+            )
+            total += processed
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Classified {total} pending comments"))
+
+    def process_batch(self, batch_size, use_ml, classifier_type):
+        pending = list(
+            Comment.objects
+            .filter(classification_status=Comment.CLASSIFICATION_PENDING)
+            .order_by('id')
+            .values_list('id', 'content', 'post_id', 'classifier')[:batch_size]
+        )
+        if not pending:
+            return 0
+
+        # One classify_many() call per stored classifier
+        groups = defaultdict(list)
+        for comment_id, content, post_id, classifier in pending:
+            groups[classifier_options(classifier, use_ml, classifier_type)].append((comment_id, content, post_id))
+
+        verdicts = []
+        for (group_use_ml, group_classifier_type), comments in groups.items():
+            try:
+                verdicts.extend(zip(comments, CommentClassifier.classify_many(
+                    [content for _, content, _ in comments],
+                    use_ml=group_use_ml,
+                    classifier_type=group_classifier_type
+                )))
+            except Exception:
+                # Classify one by one so a single failure is recorded on its own comment
+                for comment_id, _, _ in comments:
+                    classify_comment(comment_id, use_ml=use_ml, classifier_type=classifier_type)
+
+        with transaction.atomic():
+            newly_flagged = []
+            for (comment_id, _, post_id), (should_flag, reason) in verdicts:
+                updated = Comment.objects.filter(
+                    pk=comment_id,
+                    classification_status=Comment.CLASSIFICATION_PENDING
+                ).update(
+                    flagged_for_review=should_flag,
+                    flag_reason=reason,
+                    classification_status=Comment.CLASSIFICATION_DONE,
+                )
+                if updated and should_flag:
+                    newly_flagged.append((comment_id, post_id))
+            apply_deltas(flag_deltas((post_id, False, True) for _, post_id in newly_flagged))
+            publish_comments(FLAGGED, [comment_id for comment_id, _ in newly_flagged])
+            bump_post_versions({post_id for _, _, post_id, _ in pending})
+        return len(pending)
@@ -0,0 +1,62 @@
+"""
+Export comments and their verdicts as NDJSON or CSV.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from comments.export import EXPORT_FORMATS, filter_comments, iter_export, parse_timestamp
+
+
+class Command(BaseCommand):
+    help = "Stream comments with flagged_for_review and flag_reason to a file or stdout"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-',
+                            help="File to write to, '-' for stdout")
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson', dest='export_format',
+                            help='Output format')
+        parser.add_argument('--post', type=int, default=None,
+                            help='Only export comments on this post')
+        parser.add_argument('--since', default=None,
+                            help='Only comments created at or after this ISO date/datetime')
+        parser.add_argument('--until', default=None,
+                            help='Only comments created at or before this ISO date/datetime')
+        flagged = parser.add_mutually_exclusive_group()
+        flagged.add_argument('--flagged', action='store_const', const=True, dest='flagged',
+                             help='Only flagged comments')
+        flagged.add_argument('--not-flagged', action='store_const', const=False, dest='flagged',
+                             help='Only comments that were not flagged')
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'EXPORT_CHUNK_SIZE', 2000),
+                            help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        queryset = filter_comments(
+            post=options['post'],
+            since=self.parse(options['since'], '--since'),
+            until=self.parse(options['until'], '--until', end_of_day=True),
+            flagged=options['flagged'],
+        )
+        lines = iter_export(queryset, options['export_format'], chunk_size=options['chunk_size'])
+
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+            for line in lines:
+                out.write(line)
+                count += 1
+        if options['export_format'] == 'csv':
+            count -= 1  # Header row
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} comments to {options['output']}"))
+
+    @staticmethod
+    def parse(value, option, end_of_day=False):
+        if value is None:
+            return None
+        parsed = parse_timestamp(value, end_of_day=end_of_day)
+        if parsed is None:
+            raise CommandError(f"{option} must be an ISO 8601 date or datetime")
+        return parsed
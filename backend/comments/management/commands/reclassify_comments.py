@@ -0,0 +1,190 @@
+"""
+Re-run the classifier over stored comments after FLAG_PATTERNS or the model changes.
+
+ML classification bypasses the verdict cache, and the run stops before
+writing a chunk if the classifier fell back to rules for any comment in it
+(model missing or failing, OpenAI breaker open), so an outage can't
+overwrite stored verdicts with rule verdicts.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from comments.cache import FallbackVerdict
+from comments.classifier import CommentClassifier
+from comments.counters import apply_deltas, flag_deltas
+from comments.events import FLAGGED, publish_comments
+from comments.models import Comment
+from comments.response_cache import bump_post_versions
+
+VERDICT_FIELDS = ['flagged_for_review', 'flag_reason', 'classification_status']
+
+
+def _init_worker():
+    # Needed under the spawn start method; a no-op when the worker was forked
+    import django
+    django.setup()
+
+
+def _classify_rules_chunk(texts):
+    return CommentClassifier.classify_many(texts)
+
+
+class Command(BaseCommand):
+    help = "Reclassify stored comments and update the verdicts that changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Comments read and written per chunk')
+        parser.add_argument('--use-ml', action='store_true',
+                            help='Use the ML classifier instead of rules')
+        parser.add_argument('--classifier-type', default=None,
+                            help="Override CLASSIFIER_TYPE ('rules', 'huggingface', 'openai')")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes used for rule-based classification (1 runs in-process)')
+        parser.add_argument('--start-after', type=int, default=None,
+                            help='Resume after this comment id')
+        parser.add_argument('--checkpoint', default=None,
+                            help='File recording the last processed id; resumed from if present, removed when done')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report how many verdicts would change without writing anything')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        use_ml = options['use_ml']
+        classifier_type = options['classifier_type']
+        dry_run = options['dry_run']
+        checkpoint = options['checkpoint']
+        verbose = options['verbosity'] >= 2
+
+        last_id = options['start_after']
+        if last_id is None and checkpoint:
+            last_id = self.read_checkpoint(checkpoint)
+        last_id = last_id or 0
+        if last_id:
+            self.stdout.write(f"Resuming after comment {last_id}")
+
+        pool = None
+        if not self.uses_ml(use_ml, classifier_type) and options['workers'] > 1:
+            pool = ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker)
+
+        totals = {'processed': 0, 'changed': 0, 'newly_flagged': 0, 'unflagged': 0, 'reason_changed': 0}
+        try:
+            while True:
+                rows = list(
+                    Comment.objects
+                    .filter(id__gt=last_id)
+                    .exclude(classification_status=Comment.CLASSIFICATION_PENDING)
+                    .order_by('id')
+                    .values_list('id', 'content', 'flagged_for_review', 'flag_reason', 'classification_status', 'post_id')
+                    [:chunk_size]
+                )
+                if not rows:
+                    break
+
+                try:
+                    verdicts = self.classify([row[1] for row in rows], use_ml, classifier_type, pool, options['workers'])
+                except Exception as e:
+                    raise CommandError(f"Classification failed after comment {last_id}: {e}")
+                fallbacks = sum(isinstance(verdict, FallbackVerdict) for verdict in verdicts)
+                if fallbacks:
+                    raise CommandError(
+                        f"The ML classifier was unavailable for {fallbacks} of the comments after {last_id} "
+                        f"and fell back to rules; nothing was written for them. Rerun with --start-after {last_id} "
+                        f"once it is back."
+                    )
+
+                changed = []
+                changed_posts = set()
+                flag_changes = []
+                newly_flagged = []
+                for (comment_id, content, flagged, reason, status, post_id), (should_flag, new_reason) in zip(rows, verdicts):
+                    if (flagged, reason, status) == (should_flag, new_reason, Comment.CLASSIFICATION_DONE):
+                        continue
+                    if should_flag != flagged:
+                        totals['newly_flagged' if should_flag else 'unflagged'] += 1
+                    elif reason != new_reason:
+                        totals['reason_changed'] += 1
+                    if dry_run and verbose:
+                        self.stdout.write(f"  #{comment_id}: {flagged}/{reason} -> {should_flag}/{new_reason}")
+                    changed_posts.add(post_id)
+                    flag_changes.append((post_id, flagged, should_flag))
+                    if should_flag and not flagged:
+                        newly_flagged.append(comment_id)
+                    changed.append(Comment(
+                        id=comment_id,
+                        flagged_for_review=should_flag,
+                        flag_reason=new_reason,
+                        classification_status=Comment.CLASSIFICATION_DONE,
+                    ))
+
+                if changed and not dry_run:
+                    with transaction.atomic():
+                        Comment.objects.bulk_update(changed, VERDICT_FIELDS, batch_size=chunk_size)
+                        apply_deltas(flag_deltas(flag_changes))
+                        publish_comments(FLAGGED, newly_flagged)
+                        bump_post_versions(changed_posts)
+
+                last_id = rows[-1][0]
+                totals['processed'] += len(rows)
+                totals['changed'] += len(changed)
+                if checkpoint and not dry_run:
+                    self.write_checkpoint(checkpoint, last_id)
+                if verbose:
+                    self.stdout.write(f"Processed up to comment {last_id} ({totals['processed']} so far)")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        if checkpoint and not dry_run and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        verb = 'would change' if dry_run else 'changed'
+        self.stdout.write(self.style.SUCCESS(
+            f"Reclassified {totals['processed']} comments: {totals['changed']} {verb} "
+            f"({totals['newly_flagged']} newly flagged, {totals['unflagged']} unflagged, "
+            f"{totals['reason_changed']} with a different reason)"
+        ))
+
+    @staticmethod
+    def uses_ml(use_ml, classifier_type):
+        if not use_ml:
+            return False
+        from django.conf import settings
+        return (classifier_type or getattr(settings, 'CLASSIFIER_TYPE', 'rules')) in ('huggingface', 'openai')
+
+    @staticmethod
+    def classify(texts, use_ml, classifier_type, pool, workers):
+        if pool is None:
+            # ML classifiers batch the whole chunk themselves; cached verdicts may predate the change being applied
+            return CommentClassifier.classify_many(
+                texts, use_ml=use_ml, classifier_type=classifier_type, use_cache=False
+            )
+        size = -(-len(texts) // workers)
+        slices = [texts[start:start + size] for start in range(0, len(texts), size)]
+        verdicts = []
+        for result in pool.map(_classify_rules_chunk, slices):
+            verdicts.extend(result)
+        return verdicts
+
+    @staticmethod
+    def read_checkpoint(path):
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            value = f.read().strip()
+        if not value.isdigit():
+            raise CommandError(f"Checkpoint file {path} does not contain a comment id")
+        return int(value)
+
+    @staticmethod
+    def write_checkpoint(path, last_id):
+        # Write then rename so an interrupted run never leaves a truncated file
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(str(last_id))
+        os.replace(tmp, path)
@@ -0,0 +1,56 @@
+"""
+Recompute Post.comment_count and Post.flagged_count and repair drift.
+"""
+from django.core.management.base import BaseCommand
+
+from comments.counters import find_drift, recount
+from comments.models import Post
+from comments.response_cache import bump_post_versions
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized comment counters on posts and fix any that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--post', type=int, action='append', default=None,
+                            help='Only check this post (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of posts checked per query')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without writing')
+
+    def handle(self, *args, **options):
+        verbose = options['verbosity'] >= 2
+        dry_run = options['dry_run']
+        chunk_size = options['chunk_size']
+        posts = Post.objects.order_by('pk')
+        if options['post']:
+            posts = posts.filter(pk__in=options['post'])
+
+        checked = drifted = 0
+        last_id = 0
+        while True:
+            ids = list(posts.filter(pk__gt=last_id).values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            rows = list(
+                find_drift(Post.objects.filter(pk__in=ids))
+                .values_list('pk', 'comment_count', 'actual_comment_count', 'flagged_count', 'actual_flagged_count')
+            )
+            if dry_run or verbose:
+                for post_id, comments, actual_comments, flagged, actual_flagged in rows:
+                    self.stdout.write(
+                        f"  post {post_id}: comments {comments} -> {actual_comments}, flagged {flagged} -> {actual_flagged}"
+                    )
+            if rows and not dry_run:
+                # Recounted in the UPDATE itself, so writes since the check above aren't lost
+                repaired = [row[0] for row in rows]
+                recount(repaired)
+                bump_post_versions(repaired)
+
+            checked += len(ids)
+            drifted += len(rows)
+            last_id = ids[-1]
+
+        verb = 'would repair' if dry_run else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} posts: {drifted} {verb}"))
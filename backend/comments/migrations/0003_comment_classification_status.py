@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0002_commentsettings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='classification_status',
+            field=models.CharField(choices=[('pending', 'Pending classification'), ('classified', 'Classified'), ('failed', 'Classification failed')], default='classified', max_length=20),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:18
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('comments', 'Post')
+    Comment = apps.get_model('comments', 'Comment')
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post')
+
+    def count(queryset):
+        return Coalesce(
+            Subquery(queryset.annotate(n=Count('id')).values('n'), output_field=IntegerField()),
+            Value(0),
+        )
+
+    Post.objects.update(
+        comment_count=count(comments),
+        flagged_count=count(comments.filter(flagged_for_review=True)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0004_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='flagged_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-comment_count', '-created_at'], name='post_comment_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-flagged_count', '-created_at'], name='post_flagged_count_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
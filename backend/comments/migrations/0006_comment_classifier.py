@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0005_post_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='classifier',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
@@ -1,30 +1,92 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+# Process-local copy of the CommentSettings row: [instance, expiry]
+_settings_cache = [None, 0.0]
+_settings_cache_lock = threading.Lock()
+
 
 class Post(models.Model):
+    # Only changed with F() updates in counters.py; save() leaves them alone
+    COUNTER_FIELDS = ('comment_count', 'flagged_count')
+
     title = models.CharField(max_length=200)
     content = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized from the comments table; kept in step by counters.py
+    comment_count = models.IntegerField(default=0, editable=False)
+    flagged_count = models.IntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Post list sorted by activity (PostViewSet ?ordering=)
+            models.Index(fields=['-comment_count', '-created_at'], name='post_comment_count_idx'),
+            models.Index(fields=['-flagged_count', '-created_at'], name='post_flagged_count_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """
+        Save the post without writing the comment counters.
+
+        The instance's counter values may be stale (loaded before a comment was
+        added, or edited in the admin or API), so an update writes every field
+        except COUNTER_FIELDS unless update_fields names them explicitly.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
+    CLASSIFICATION_PENDING = 'pending'
+    CLASSIFICATION_DONE = 'classified'
+    CLASSIFICATION_FAILED = 'failed'
+    CLASSIFICATION_STATUS_CHOICES = [
+        (CLASSIFICATION_PENDING, 'Pending classification'),
+        (CLASSIFICATION_DONE, 'Classified'),
+        (CLASSIFICATION_FAILED, 'Classification failed'),
+    ]
+
     post = models.ForeignKey(Post, related_name='comments', on_delete=models.CASCADE)
     author = models.CharField(max_length=100)
     content = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     flagged_for_review = models.BooleanField(default=False)
     flag_reason = models.CharField(max_length=255, blank=True, null=True)
+    classification_status = models.CharField(
+        max_length=20,
+        choices=CLASSIFICATION_STATUS_CHOICES,
+        default=CLASSIFICATION_DONE,
+    )
+    # Classifier chosen when a pending comment was submitted ('rules', 'huggingface', 'openai');
+    # background workers and classify_pending_comments use it instead of their own options
+    classifier = models.CharField(max_length=20, blank=True, default='')
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Comments of one post in display order (CommentViewSet ?post= filter)
+            models.Index(fields=['post', 'created_at'], name='comment_post_created_idx'),
+            # Moderation queue; partial where the backend supports it (PostgreSQL, SQLite)
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(flagged_for_review=True),
+                name='comment_flagged_created_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.author}: {self.content[:50]}"
@@ -51,6 +113,28 @@ class CommentSettings(models.Model):
     
     @classmethod
     def load(cls):
-        """Get or create the singleton instance."""
+        """
+        Get or create the singleton instance.
+        
+        The row is cached per process for COMMENT_SETTINGS_CACHE_TTL seconds and
+        dropped whenever the settings are saved or deleted (see signals.py), so
+        a change made in another worker is seen within the TTL.
+        """
+        now = time.monotonic()
+        with _settings_cache_lock:
+            cached, expires = _settings_cache
+            if cached is not None and expires > now:
+                return copy.copy(cached)
+        
         obj, created = cls.objects.get_or_create(pk=1)
+        ttl = getattr(settings, 'COMMENT_SETTINGS_CACHE_TTL', 5)
+        if ttl > 0:
+            with _settings_cache_lock:
+                _settings_cache[:] = [copy.copy(obj), now + ttl]
         return obj
+    
+    @classmethod
+    def clear_cache(cls):
+        """Drop the process-local cached copy."""
+        with _settings_cache_lock:
+            _settings_cache[:] = [None, 0.0]
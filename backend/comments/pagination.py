@@ -0,0 +1,206 @@
+"""
+Pagination classes for the comments API.
+
+The default PageNumberPagination runs a COUNT(*) per page and an OFFSET that
+gets slower the deeper the page. KeysetPagination seeks directly to the
+next row on a (timestamp, id) key instead, so every page costs the same.
+It is opt-in per request through OptionalCursorPagination so existing
+page-number clients keep working.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a composite (timestamp, id) key.
+
+    Unlike DRF's CursorPagination, which positions on the first ordering field
+    and falls back to an offset for ties, the cursor here holds both values so
+    rows sharing a timestamp never need an OFFSET.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Timestamp field, prefixed with '-' for newest first; 'id' breaks ties
+    ordering_field = 'created_at'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering_field(request)
+
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor['reverse']
+
+        # Walking backwards flips the sort order; results are flipped back below
+        walk_descending = descending != reverse
+        if walk_descending:
+            queryset = queryset.order_by(f'-{field}', '-id')
+        else:
+            queryset = queryset.order_by(field, 'id')
+
+        if cursor is not None:
+            lookup = 'lt' if walk_descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': cursor['value']})
+                | Q(**{field: cursor['value'], f'id__{lookup}': cursor['id']})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_ordering_field(self, request):
+        return self.ordering_field
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            value = parse_datetime(data['v'])
+            if value is None:
+                raise ValueError(data['v'])
+            return {'value': value, 'id': int(data['i']), 'reverse': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse=False):
+        field = self.ordering.lstrip('-')
+        data = {'v': getattr(obj, field).isoformat(), 'i': obj.pk}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class OptionalCursorPagination(BasePagination):
+    """
+    Page-number pagination by default; keyset pagination on request.
+
+    Clients opt in with ``?pagination=cursor`` and then follow the returned
+    ``next``/``previous`` links, which carry a ``cursor`` parameter.
+    """
+    page_number_class = PageNumberPagination
+    keyset_class = KeysetPagination
+    mode_query_param = 'pagination'
+
+    def wants_cursor(self, request):
+        params = request.query_params
+        return (
+            params.get(self.mode_query_param) == 'cursor'
+            or self.keyset_class.cursor_query_param in params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.wants_cursor(request):
+            self.delegate = self.keyset_class()
+        else:
+            self.delegate = self.page_number_class()
+        return self.delegate.paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number_class().get_paginated_response_schema(schema)
+
+
+class CommentKeysetPagination(KeysetPagination):
+    ordering_field = 'created_at'
+
+
+class PostKeysetPagination(KeysetPagination):
+    ordering_field = '-created_at'
+
+
+class FlaggedCommentPagination(KeysetPagination):
+    """Keyset pagination for the moderation queue with ?ordering=created_at or -created_at."""
+    ordering_field = '-created_at'
+    ordering_query_param = 'ordering'
+    allowed_orderings = ('created_at', '-created_at')
+
+    def get_ordering_field(self, request):
+        ordering = request.query_params.get(self.ordering_query_param, self.ordering_field)
+        if ordering not in self.allowed_orderings:
+            raise ValidationError({
+                self.ordering_query_param: f"Must be one of: {', '.join(self.allowed_orderings)}"
+            })
+        return ordering
+
+
+class CommentPagination(OptionalCursorPagination):
+    keyset_class = CommentKeysetPagination
+
+
+class PostPagination(OptionalCursorPagination):
+    keyset_class = PostKeysetPagination
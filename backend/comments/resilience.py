@@ -0,0 +1,182 @@
+"""
+Retry and circuit breaker helpers for calls to external classifiers.
+
+RetryPolicy retries transient failures with jittered exponential backoff,
+never spending more than its total budget across attempts and sleeps.
+CircuitBreaker stops calling an upstream that keeps failing so callers can
+fall back immediately instead of waiting out a timeout on every request.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+class RetryPolicy:
+    """
+    Retry a call on transient errors within a time budget.
+
+    Args:
+        timeout: Longest a single attempt may take, in seconds
+        max_retries: Retries after the first attempt
+        budget: Total seconds for all attempts and backoff sleeps
+        base_delay: Backoff before the first retry; doubles on each retry
+        max_delay: Upper bound on a single backoff
+    """
+
+    def __init__(self, timeout: float = 10.0, max_retries: int = 2, budget: float = 20.0,
+                 base_delay: float = 0.5, max_delay: float = 4.0,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.clock = clock
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def call(self, func: Callable[[float], Any], is_retryable: Callable[[Exception], bool]) -> Any:
+        """
+        Call func(timeout) until it succeeds, fails permanently, or the budget runs out.
+
+        Each attempt gets the per-call timeout or whatever is left of the budget,
+        whichever is smaller. The last error is re-raised.
+        """
+        deadline = self.clock() + self.budget
+        attempt = 0
+        while True:
+            remaining = deadline - self.clock()
+            try:
+                return func(max(min(self.timeout, remaining), 0.001))
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                # Full jitter keeps many workers from retrying in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if self.clock() + delay >= deadline:
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                self.sleep(delay)
+
+    async def acall(self, func: Callable[[float], Awaitable[Any]], is_retryable: Callable[[Exception], bool]) -> Any:
+        """Async version of call(); func(timeout) is awaited and backoff uses asyncio.sleep."""
+        deadline = self.clock() + self.budget
+        attempt = 0
+        while True:
+            remaining = deadline - self.clock()
+            try:
+                return await func(max(min(self.timeout, remaining), 0.001))
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if self.clock() + delay >= deadline:
+                    raise
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    allow() returns False for ``reset_timeout`` seconds. It then lets a single
+    trial call through (half-open): success closes it again, failure re-opens it.
+
+    Callers must end every allowed call with record_success() or
+    record_failure(), including when it is cancelled. As a backstop, a trial
+    that hasn't reported back within ``reset_timeout`` is presumed lost and
+    another one is let through.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._trial_started = 0.0
+
+        # Metrics
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_running = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Return whether a call may go to the upstream now."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and (
+                not self._trial_running or self.clock() - self._trial_started >= self.reset_timeout
+            ):
+                self._trial_running = True
+                self._trial_started = self.clock()
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self._state = self.CLOSED
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+                self._trial_running = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'successes': self.successes,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened,
+            }
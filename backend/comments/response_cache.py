@@ -0,0 +1,159 @@
+"""
+Response cache for per-post reads.
+
+``GET /api/posts/{id}/`` and ``GET /api/comments/?post={id}`` are cached
+under a key that includes a version counter for the post. Anything that
+changes what those endpoints return bumps the counter: comment create,
+update and delete, Post save and delete (via signals), and the bulk and
+queryset-update paths that bypass signals (via bump_post_versions). Old
+entries are never deleted; they stop being read and expire after
+RESPONSE_CACHE_TTL.
+
+Versions are nanosecond timestamps of the last write, and every bump also
+bumps the ALL_POSTS version, so conditional.py can use them as validators
+for edits that leave row counts and creation times unchanged.
+
+Works with any Django cache backend (file, database, memcached, redis)
+named by RESPONSE_CACHE_ALIAS. The management commands that write comments
+bump versions from their own process, so a locmem cache never sees those
+bumps; unless RESPONSE_CACHE_ENABLED is set, the cache is only used when the
+alias is shared between processes.
+"""
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+VERSION_PREFIX = 'comments:post-version'
+RESPONSE_PREFIX = 'comments:response'
+# Version covering every post: post and unfiltered comment lists
+ALL_POSTS = 'all'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'bypassed': 0}
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def is_shared() -> bool:
+    """Whether versions bumped in another process (a management command) reach this one."""
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def is_enabled(request=None) -> bool:
+    """Whether the cache should be used; clients can bypass it with Cache-Control: no-cache."""
+    enabled = getattr(settings, 'RESPONSE_CACHE_ENABLED', None)
+    if not (is_shared() if enabled is None else enabled):
+        return False
+    if request is not None and 'no-cache' in request.headers.get('Cache-Control', ''):
+        record('bypassed')
+        return False
+    return True
+
+
+def _version_key(post_id) -> str:
+    return f"{VERSION_PREFIX}:{post_id}"
+
+
+def _new_version() -> int:
+    # Time-based so a version evicted from the cache never restarts at a value already used
+    return time.time_ns()
+
+
+def get_post_version(post_id) -> int:
+    version: int = get_cache().get_or_set(_version_key(post_id), _new_version, timeout=None)
+    return version
+
+
+def bump_post_versions(post_ids: Iterable[Any]):
+    """
+    Invalidate cached responses for these posts.
+
+    Bumps immediately and again when the surrounding transaction commits, so
+    a reader can't cache pre-commit data under the new version.
+    """
+    post_ids = {post_id for post_id in post_ids if post_id is not None}
+    if not post_ids:
+        return
+    post_ids.add(ALL_POSTS)
+
+    def bump():
+        cache = get_cache()
+        for post_id in post_ids:
+            # Strictly increasing even when the clock is too coarse to move between two bumps
+            current = cache.get(_version_key(post_id)) or 0
+            cache.set(_version_key(post_id), max(_new_version(), current + 1), timeout=None)
+
+    bump()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump)
+
+
+def get_version_time(post_id) -> float:
+    """Unix time of the last recorded write to this post (or ALL_POSTS)."""
+    return get_post_version(post_id) / 1e9
+
+
+def bump_post_version(post_id):
+    bump_post_versions([post_id])
+
+
+def make_key(view_name: str, post_id, request) -> str:
+    """Key a response by view, post version and the full URL (pagination links include the host)."""
+    digest = hashlib.sha1(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f"{RESPONSE_PREFIX}:{view_name}:{post_id}:{get_post_version(post_id)}:{digest}"
+
+
+def cached_response(request, view_name: str, post_id, build: Callable[[], Response]) -> Response:
+    """
+    Return the cached response data for this request, or build and cache it.
+
+    Only 200 responses are stored. The X-Cache header says whether the
+    response was a HIT, a MISS or BYPASS.
+    """
+    if not is_enabled(request):
+        response = build()
+        response['X-Cache'] = 'BYPASS'
+        return response
+
+    key = make_key(view_name, post_id, request)
+    cache = get_cache()
+    data = cache.get(key)
+    if data is not None:
+        record('hits')
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    record('misses')
+    response = build()
+    if response.status_code == 200:
+        cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TTL', 300))
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+def record(counter: str):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def stats() -> Dict[str, Any]:
+    """Return this process's hit, miss and bypass counts and the hit rate."""
+    with _stats_lock:
+        lookups = _stats['hits'] + _stats['misses']
+        return dict(_stats, hit_rate=_stats['hits'] / lookups if lookups else 0.0)
+
+
+def reset_stats():
+    with _stats_lock:
+        for counter in _stats:
+            _stats[counter] = 0
@@ -0,0 +1,118 @@
+"""
+Full-text search over comment author and content.
+
+filter_comments() is the single entry point for the API and the admin. The
+index behind it depends on the database:
+
+- PostgreSQL: a GIN expression index on to_tsvector(author || ' ' || content),
+  matched with plainto_tsquery
+- SQLite: an FTS5 table with porter stemming, kept in sync by triggers on
+  insert, update and delete
+- anything else (or SQLite built without FTS5): icontains per word, unindexed
+
+Every backend matches comments containing all words of the query.
+
+install_search_index() runs after every migrate (see signals.py) rather than
+in a migration, because SQLite applies most schema changes by copying the
+table to a new one, which drops its triggers. It is idempotent.
+"""
+import re
+from functools import reduce
+from operator import and_
+from typing import List
+
+from django.db import OperationalError, connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Comment
+
+SEARCH_CONFIG = 'english'
+INDEX_NAME = 'comment_search_idx'
+FTS_TABLE = 'comments_comment_fts'
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def search_terms(query: str) -> List[str]:
+    return _WORD_RE.findall(query or '')
+
+
+def get_backend(connection) -> str:
+    """'postgresql', 'fts5' or 'like'."""
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            if cursor.fetchone():
+                return 'fts5'
+    return 'like'
+
+
+def _tsvector_sql(table: str) -> str:
+    # Must stay identical to the indexed expression for PostgreSQL to use the index
+    return f"to_tsvector('{SEARCH_CONFIG}', \"{table}\".\"author\" || ' ' || \"{table}\".\"content\")"
+
+
+def filter_comments(queryset, query: str):
+    """Narrow a Comment queryset to comments matching every word of query."""
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    backend = get_backend(connections[queryset.db])
+    table = Comment._meta.db_table
+
+    if backend == 'postgresql':
+        return queryset.filter(RawSQL(
+            f"{_tsvector_sql(table)} @@ plainto_tsquery('{SEARCH_CONFIG}', %s)",
+            (' '.join(terms),),
+            output_field=BooleanField()
+        ))
+    if backend == 'fts5':
+        # Quoted terms are plain strings to FTS5, so query syntax in user input is inert
+        match = ' '.join(f'"{term}"' for term in terms)
+        return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,)))
+    return queryset.filter(reduce(and_, (Q(author__icontains=term) | Q(content__icontains=term) for term in terms)))
+
+
+def install_search_index(connection) -> bool:
+    """Create the search index for this database if missing. Returns False if the database has no full-text support."""
+    table = Comment._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON \"{table}\" "
+                f"USING GIN (to_tsvector('{SEARCH_CONFIG}', author || ' ' || content))"
+            )
+            return True
+        if connection.vendor != 'sqlite':
+            return False
+
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        created = cursor.fetchone() is None
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"author, content, content='{table}', content_rowid='id', tokenize='porter unicode61')"
+            )
+        except OperationalError:
+            # SQLite compiled without FTS5
+            return False
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON \"{table}\" BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, author, content) VALUES (new.id, new.author, new.content); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON \"{table}\" BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, author, content) VALUES ('delete', old.id, old.author, old.content); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF author, content ON \"{table}\" BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, author, content) VALUES ('delete', old.id, old.author, old.content); "
+            f"INSERT INTO {FTS_TABLE}(rowid, author, content) VALUES (new.id, new.author, new.content); END"
+        )
+        if created:
+            # Index the comments that already exist
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        return True
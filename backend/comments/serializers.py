@@ -1,3 +1,5 @@
+from typing import Optional
+
 from rest_framework import serializers
 from .models import Post, Comment
 
@@ -5,15 +7,61 @@ from .models import Post, Comment
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'author', 'content', 'created_at', 'flagged_for_review', 'flag_reason']
-        read_only_fields = ['id', 'created_at', 'flagged_for_review', 'flag_reason']
+        fields = ['id', 'post', 'author', 'content', 'created_at', 'flagged_for_review', 'flag_reason', 'classification_status']
+        read_only_fields = ['id', 'created_at', 'flagged_for_review', 'flag_reason', 'classification_status']
+
+
+class PostLookupField(serializers.PrimaryKeyRelatedField):
+    """Post primary key field resolved from a dict of posts preloaded into the serializer context."""
+    
+    def to_internal_value(self, data):
+        posts = self.context.get('posts')
+        if posts is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            post = posts.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if post is None:
+            self.fail('does_not_exist', pk_value=data)
+        return post
+
+
+class BulkCommentSerializer(CommentSerializer):
+    """CommentSerializer for bulk ingestion; posts are looked up once per request instead of once per item."""
+    post = PostLookupField(queryset=Post.objects.all())
+    
+    class Meta(CommentSerializer.Meta):
+        pass
+
+
+class PostSummarySerializer(serializers.ModelSerializer):
+    """Post list representation without the embedded comments."""
+    EXCERPT_LENGTH = 150
+    
+    excerpt = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Post
+        fields = ['id', 'title', 'excerpt', 'created_at', 'updated_at', 'comment_count', 'flagged_count']
+        read_only_fields = fields
+    
+    def get_excerpt(self, obj) -> str:
+        # PostViewSet annotates a truncated copy so the full content isn't loaded
+        text: Optional[str] = getattr(obj, 'excerpt_source', None)
+        if text is None:
+            text = obj.content
+        if len(text) > self.EXCERPT_LENGTH:
+            return text[:self.EXCERPT_LENGTH] + '...'
+        return text
 
 
 class PostSerializer(serializers.ModelSerializer):
     comments = CommentSerializer(many=True, read_only=True)
-    comment_count = serializers.IntegerField(source='comments.count', read_only=True)
     
     class Meta:
         model = Post
-        fields = ['id', 'title', 'content', 'created_at', 'updated_at', 'comments', 'comment_count']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'content', 'created_at', 'updated_at', 'comments', 'comment_count', 'flagged_count']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'comment_count', 'flagged_count']
@@ -0,0 +1,78 @@
+"""
+Signal handlers for the comments app.
+"""
+from django.db import connections
+from django.db.models.signals import post_delete, post_init, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import counters, events, response_cache, search
+from .models import Comment, CommentSettings, Post
+
+
+@receiver(post_save, sender=CommentSettings)
+@receiver(post_delete, sender=CommentSettings)
+def invalidate_comment_settings_cache(sender, **kwargs):
+    """Drop the cached settings whenever they change, from the admin or from code."""
+    CommentSettings.clear_cache()
+
+
+@receiver(post_init, sender=Comment)
+def remember_counted_state(sender, instance, **kwargs):
+    """Record the post and flag the counters last saw, so a later save can apply the difference."""
+    # __dict__ so a deferred field isn't loaded just for this
+    instance._counted_state = (instance.__dict__.get('post_id'), instance.__dict__.get('flagged_for_review'))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_responses(sender, instance, origin=None, **kwargs):
+    """Stop serving cached post and comment-list responses that include this comment."""
+    if isinstance(origin, Post) or getattr(origin, 'model', None) is Post:
+        # Cascade from deleting the post; invalidate_post_responses bumps it once
+        return
+    # A comment moved to another post leaves the old post's responses stale too; registered
+    # before track_saved_comment, which moves _counted_state on to the new post
+    old_post_id = getattr(instance, '_counted_state', (None, None))[0]
+    response_cache.bump_post_versions([instance.post_id, old_post_id])
+
+
+@receiver(post_save, sender=Comment)
+def track_saved_comment(sender, instance, created, raw=False, **kwargs):
+    """Keep Post.comment_count and Post.flagged_count in step with comment saves and publish stream events."""
+    if raw:
+        # Fixtures carry their own counter values
+        return
+    post_id, flagged = instance.post_id, bool(instance.flagged_for_review)
+    old_post_id, old_flagged = getattr(instance, '_counted_state', (None, None))
+    if created:
+        counters.adjust(post_id, 1, int(flagged))
+        events.publish_comments(events.CREATED, [instance])
+    elif old_post_id is not None and old_post_id != post_id:
+        counters.apply_deltas({old_post_id: (-1, -int(bool(old_flagged))), post_id: (1, int(flagged))})
+    elif old_flagged is not None and bool(old_flagged) != flagged:
+        counters.adjust(post_id, 0, 1 if flagged else -1)
+    if flagged and not created and old_flagged is not None and not old_flagged:
+        events.publish_comments(events.FLAGGED, [instance])
+    instance._counted_state = (post_id, flagged)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Post) or getattr(origin, 'model', None) is Post:
+        # Cascade from deleting the post itself; nothing left to count
+        return
+    post_id, flagged = getattr(instance, '_counted_state', (None, None))
+    counters.adjust(post_id or instance.post_id, -1, -int(bool(flagged)))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_responses(sender, instance, **kwargs):
+    response_cache.bump_post_version(instance.pk)
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using='default', **kwargs):
+    """Create (or restore) the full-text search index after migrations."""
+    if sender.name == 'comments':
+        search.install_search_index(connections[using])
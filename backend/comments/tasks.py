@@ -0,0 +1,134 @@
+"""
+Background classification of comments.
+
+With CLASSIFICATION_MODE = 'async' new comments are saved as pending and
+classified on an in-process thread pool once the creating transaction
+commits. Comments left pending (e.g. by a restart before the pool drained)
+are picked up by the ``classify_pending_comments`` management command.
+
+The classifier the request asked for is stored on the comment
+(Comment.classifier), so whichever worker picks it up judges it with the
+same backend the submitter would have got in sync mode.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import counters, events
+from .classifier import CommentClassifier
+from .models import Comment
+from .response_cache import bump_post_version
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared classification thread pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CLASSIFICATION_WORKERS', 4),
+                    thread_name_prefix='comment-classifier',
+                )
+    return _executor
+
+
+def is_async_mode() -> bool:
+    """Whether new comments should be classified in the background."""
+    return getattr(settings, 'CLASSIFICATION_MODE', 'sync') == 'async'
+
+
+def resolve_classifier(use_ml: bool = False, classifier_type: Optional[str] = None) -> str:
+    """Name of the classifier CommentClassifier.classify() would use for these options."""
+    if not use_ml:
+        return 'rules'
+    classifier = classifier_type or getattr(settings, 'CLASSIFIER_TYPE', 'rules')
+    return classifier if classifier in ('huggingface', 'openai') else 'rules'
+
+
+def classifier_options(classifier: str, use_ml: bool = False,
+                       classifier_type: Optional[str] = None) -> Tuple[bool, Optional[str]]:
+    """
+    (use_ml, classifier_type) for a comment's stored classifier.
+
+    Comments saved before the classifier was stored have none; they use the
+    options passed in.
+    """
+    if not classifier:
+        return use_ml, classifier_type
+    return classifier != 'rules', classifier
+
+
+def enqueue_classification(comment_id: int):
+    """Schedule a pending comment for classification after the current transaction commits."""
+    transaction.on_commit(lambda: get_executor().submit(_run_classification, comment_id))
+
+
+def _run_classification(comment_id: int):
+    """Thread pool entry point; makes sure the worker's DB connection is cleaned up."""
+    close_old_connections()
+    try:
+        classify_comment(comment_id)
+    except Exception:
+        logger.exception("Background classification of comment %s failed", comment_id)
+    finally:
+        close_old_connections()
+
+
+def classify_comment(comment_id: int, use_ml: bool = False, classifier_type: Optional[str] = None) -> bool:
+    """
+    Classify a pending comment and store the verdict.
+
+    The comment's stored classifier is used; use_ml and classifier_type only
+    apply to comments saved without one. If the classifier raises, the comment is flagged for review with the error
+    as reason so it is not published unchecked.
+
+    Returns:
+        True if the comment was still pending and has been updated
+    """
+    pending = (
+        Comment.objects
+        .filter(pk=comment_id, classification_status=Comment.CLASSIFICATION_PENDING)
+        .values_list('content', 'post_id', 'classifier')
+        .first()
+    )
+    if pending is None:
+        return False
+    content, post_id, classifier = pending
+    use_ml, classifier_type = classifier_options(classifier, use_ml, classifier_type)
+
+    try:
+        should_flag, reason = CommentClassifier.classify(
+            content,
+            use_ml=use_ml,
+            classifier_type=classifier_type
+        )
+        status = Comment.CLASSIFICATION_DONE
+    except Exception as e:
+        should_flag, reason = True, f"Classification failed: {str(e)}"[:255]
+        status = Comment.CLASSIFICATION_FAILED
+
+    updated = Comment.objects.filter(
+        pk=comment_id,
+        classification_status=Comment.CLASSIFICATION_PENDING
+    ).update(
+        flagged_for_review=should_flag,
+        flag_reason=reason,
+        classification_status=status,
+    )
+    if updated:
+        # update() sends no post_save signal; pending comments are saved unflagged
+        if should_flag:
+            counters.adjust(post_id, 0, 1)
+            events.publish_comments(events.FLAGGED, [comment_id])
+        bump_post_version(post_id)
+    return bool(updated)
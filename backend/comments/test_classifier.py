@@ -1,8 +1,25 @@
 """
 Additional classifier tests.
 """
-from django.test import TestCase
-from .classifier import CommentClassifier
+import asyncio
+import importlib.util
+import json
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+from django.apps import apps
+from django.test import TestCase, override_settings
+from .batching import MicroBatcher
+from .cache import LRUCache, VerdictCache
+from .classifier import CommentClassifier, RuleEngine
+from .inference import build_pipeline
+from .resilience import CircuitBreaker, RetryPolicy
 
 
 class CommentClassifierAdvancedTest(TestCase):
@@ -53,3 +70,957 @@ class CommentClassifierAdvancedTest(TestCase):
             classifier_type='rules'
         )
         self.assertTrue(should_flag)
+
+
+class RuleEngineTest(TestCase):
+    """Tests for the precompiled rule engine."""
+    
+    def test_first_rule_in_priority_order_wins(self):
+        """Test that the earliest rule wins even when a later rule matches first in the text."""
+        engine = RuleEngine([(r'b+', 'B rule'), (r'a+', 'A rule')])
+        self.assertEqual(engine.match("aaa then bbb"), 'B rule')
+        self.assertEqual(engine.match("aaa only"), 'A rule')
+        self.assertIsNone(engine.match("nothing here"))
+    
+    def test_matches_uncompiled_search(self):
+        """Test that verdicts are identical to running re.search for each pattern in turn."""
+        samples = [
+            "http://spam.example.com",
+            "1234 is a scam",
+            "Wow!!! what the hell",
+            "Plain text without problems",
+        ]
+        for text in samples:
+            expected = next(
+                (reason for pattern, reason in CommentClassifier.FLAG_PATTERNS
+                 if re.search(pattern, text, re.IGNORECASE)),
+                None
+            )
+            self.assertEqual(CommentClassifier.get_rule_engine().match(text), expected)
+    
+    def test_engine_rebuilt_when_patterns_change(self):
+        """Test that replacing FLAG_PATTERNS recompiles the engine."""
+        class CustomClassifier(CommentClassifier):
+            FLAG_PATTERNS = [(r'\bbanana\b', 'Contains fruit')]
+        
+        should_flag, reason = CustomClassifier.classify("I like banana bread", use_ml=False)
+        self.assertTrue(should_flag)
+        self.assertEqual(reason, 'Contains fruit')
+        self.assertIsNot(CustomClassifier.get_rule_engine(), CommentClassifier.get_rule_engine())
+
+
+class ClassifyManyTest(TestCase):
+    """Tests for CommentClassifier.classify_many."""
+    
+    def setUp(self):
+        CommentClassifier._verdict_cache = None
+    
+    def tearDown(self):
+        CommentClassifier._hf_model = None
+    
+    def test_rules_match_single_classification(self):
+        """Test that batch rule verdicts match classify() for each text."""
+        texts = ["This is spam", "Hi", "A perfectly calm remark.", "Wow!!!"]
+        self.assertEqual(
+            CommentClassifier.classify_many(texts),
+            [CommentClassifier.classify(text) for text in texts]
+        )
+    
+    def test_empty_input(self):
+        """Test that an empty batch returns an empty list."""
+        self.assertEqual(CommentClassifier.classify_many([]), [])
+    
+    def test_huggingface_uses_one_pipeline_call(self):
+        """Test that the Hugging Face path sends the whole batch through the pipeline once."""
+        calls = []
+        
+        def fake_pipeline(inputs, **kwargs):
+            calls.append((inputs, kwargs))
+            return [
+                [{'label': 'anger', 'score': 0.9 if 'angry' in text else 0.1},
+                 {'label': 'joy', 'score': 0.5}]
+                for text in inputs
+            ]
+        
+        CommentClassifier._hf_model = fake_pipeline
+        verdicts = CommentClassifier.classify_many(
+            ["I am angry", "I am happy"],
+            use_ml=True,
+            classifier_type='huggingface'
+        )
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][0], ["I am angry", "I am happy"])
+        self.assertIn('batch_size', calls[0][1])
+        self.assertTrue(verdicts[0][0])
+        self.assertIn('anger', verdicts[0][1])
+        self.assertEqual(verdicts[1], (False, None))
+
+
+class MicroBatcherTest(TestCase):
+    """Tests for the inference micro-batcher."""
+    
+    def test_concurrent_submissions_share_a_batch(self):
+        """Test that requests queued within the wait window run as one batch."""
+        calls = []
+        
+        def infer(texts):
+            calls.append(list(texts))
+            return [text.upper() for text in texts]
+        
+        batcher = MicroBatcher(infer, max_batch_size=8, max_wait_ms=200)
+        futures = [batcher.submit(f"text {i}") for i in range(5)]
+        results = [future.result(timeout=5) for future in futures]
+        batcher.shutdown()
+        
+        self.assertEqual(results, [f"TEXT {i}" for i in range(5)])
+        self.assertEqual(len(calls), 1)
+        stats = batcher.stats()
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['largest_batch_size'], 5)
+        self.assertEqual(stats['queue_depth'], 0)
+    
+    def test_batch_size_is_capped(self):
+        """Test that no batch exceeds max_batch_size."""
+        sizes = []
+        
+        def infer(texts):
+            sizes.append(len(texts))
+            return texts
+        
+        batcher = MicroBatcher(infer, max_batch_size=3, max_wait_ms=50)
+        futures = [batcher.submit(i) for i in range(7)]
+        self.assertEqual([future.result(timeout=5) for future in futures], list(range(7)))
+        batcher.shutdown()
+        
+        self.assertTrue(all(size <= 3 for size in sizes))
+        self.assertEqual(sum(sizes), 7)
+    
+    def test_inference_error_reaches_every_caller(self):
+        """Test that a failing batch raises in each waiting caller."""
+        def infer(texts):
+            raise RuntimeError("model exploded")
+        
+        batcher = MicroBatcher(infer, max_batch_size=4, max_wait_ms=50)
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        batcher.shutdown()
+        self.assertGreaterEqual(batcher.stats()['errors'], 1)
+    
+    def test_dead_worker_is_restarted(self):
+        """Test that submit() starts a new worker if the previous one died."""
+        batcher = MicroBatcher(lambda items: items, max_batch_size=4, max_wait_ms=1)
+        self.assertEqual(batcher.submit(1).result(timeout=5), 1)
+        batcher._queue.put(None)
+        batcher._thread.join(timeout=5)
+        
+        self.assertEqual(batcher.submit(2).result(timeout=5), 2)
+        batcher.shutdown()
+    
+    @override_settings(HUGGINGFACE_MICROBATCH=True, HUGGINGFACE_MICROBATCH_MAX_WAIT_MS=1,
+                       HUGGINGFACE_MICROBATCH_TIMEOUT=0.05)
+    def test_hung_batcher_falls_back_without_caching(self):
+        """Test that a caller gives up on a stuck batch and the rules verdict is not cached."""
+        release = threading.Event()
+        
+        def hung_pipeline(inputs, **kwargs):
+            release.wait(5)
+            return [[{'label': 'fear', 'score': 0.8}] for _ in inputs]
+        
+        CommentClassifier._hf_model = hung_pipeline
+        CommentClassifier._verdict_cache = None
+        try:
+            self.assertEqual(
+                CommentClassifier.classify("A calm remark", use_ml=True, classifier_type='huggingface'),
+                (False, None)
+            )
+            self.assertEqual(len(CommentClassifier.get_verdict_cache().local), 0)
+        finally:
+            release.set()
+            CommentClassifier._hf_batcher.shutdown()
+            CommentClassifier._hf_batcher = None
+            CommentClassifier._hf_model = None
+            CommentClassifier._verdict_cache = None
+    
+    @override_settings(HUGGINGFACE_MICROBATCH=True, HUGGINGFACE_MICROBATCH_MAX_WAIT_MS=1)
+    def test_huggingface_classification_goes_through_batcher(self):
+        """Test that _classify_huggingface uses the batcher when enabled."""
+        def fake_pipeline(inputs, **kwargs):
+            return [[{'label': 'fear', 'score': 0.8}] for _ in inputs]
+        
+        CommentClassifier._hf_model = fake_pipeline
+        CommentClassifier._verdict_cache = None
+        try:
+            should_flag, reason = CommentClassifier.classify(
+                "Something scary", use_ml=True, classifier_type='huggingface'
+            )
+            self.assertTrue(should_flag)
+            self.assertIn('fear', reason)
+            self.assertEqual(CommentClassifier.get_hf_batcher().stats()['items'], 1)
+        finally:
+            CommentClassifier._hf_batcher.shutdown()
+            CommentClassifier._hf_batcher = None
+            CommentClassifier._hf_model = None
+
+
+class VerdictCacheTest(TestCase):
+    """Tests for the classifier verdict cache."""
+    
+    def setUp(self):
+        CommentClassifier._verdict_cache = None
+        self.calls = []
+        
+        def fake_pipeline(inputs, **kwargs):
+            batch = [inputs] if isinstance(inputs, str) else inputs
+            self.calls.append(list(batch))
+            return [[{'label': 'anger', 'score': 0.9}] for _ in batch]
+        
+        CommentClassifier._hf_model = fake_pipeline
+    
+    def tearDown(self):
+        CommentClassifier._hf_model = None
+        CommentClassifier._verdict_cache = None
+    
+    def test_repeated_text_is_classified_once(self):
+        """Test that near-identical texts reuse the cached verdict."""
+        first = CommentClassifier.classify("Buy   now", use_ml=True, classifier_type='huggingface')
+        second = CommentClassifier.classify(" Buy now\n", use_ml=True, classifier_type='huggingface')
+        
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.calls), 1)
+        stats = CommentClassifier.get_verdict_cache().stats()['local']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+    
+    def test_classify_many_only_computes_misses(self):
+        """Test that batch classification sends only uncached, distinct texts to the model."""
+        CommentClassifier.classify("cached text", use_ml=True, classifier_type='huggingface')
+        verdicts = CommentClassifier.classify_many(
+            ["cached text", "new text", "new text"],
+            use_ml=True,
+            classifier_type='huggingface'
+        )
+        
+        self.assertEqual(len(verdicts), 3)
+        self.assertEqual(self.calls[-1], ["new text"])
+    
+    def test_model_change_invalidates(self):
+        """Test that changing the model setting bypasses old entries."""
+        CommentClassifier.classify("same text", use_ml=True, classifier_type='huggingface')
+        with override_settings(HUGGINGFACE_MODEL='another/model'):
+            CommentClassifier.classify("same text", use_ml=True, classifier_type='huggingface')
+        self.assertEqual(len(self.calls), 2)
+    
+    def test_fallback_verdict_is_not_cached(self):
+        """Test that a rules verdict returned while the model fails is not served once it recovers."""
+        working = CommentClassifier._hf_model
+        
+        def broken_pipeline(inputs, **kwargs):
+            raise RuntimeError("model unavailable")
+        
+        CommentClassifier._hf_model = broken_pipeline
+        self.assertEqual(
+            CommentClassifier.classify("calm words here", use_ml=True, classifier_type='huggingface'),
+            (False, None)
+        )
+        self.assertEqual(
+            CommentClassifier.classify_many(["other calm words"], use_ml=True, classifier_type='huggingface'),
+            [(False, None)]
+        )
+        self.assertEqual(len(CommentClassifier.get_verdict_cache().local), 0)
+        
+        CommentClassifier._hf_model = working
+        should_flag, reason = CommentClassifier.classify("calm words here", use_ml=True, classifier_type='huggingface')
+        self.assertTrue(should_flag)
+        self.assertIn('anger', reason)
+        self.assertTrue(CommentClassifier.classify_many(
+            ["other calm words"], use_ml=True, classifier_type='huggingface'
+        )[0][0])
+        self.assertEqual(len(self.calls), 2)
+    
+    async def test_async_fallback_verdict_is_not_cached(self):
+        """Test that aclassify() does not cache a rules fallback either."""
+        def broken_pipeline(inputs, **kwargs):
+            raise RuntimeError("model unavailable")
+        
+        working = CommentClassifier._hf_model
+        CommentClassifier._hf_model = broken_pipeline
+        self.assertEqual(
+            await CommentClassifier.aclassify("calm words here", use_ml=True, classifier_type='huggingface'),
+            (False, None)
+        )
+        CommentClassifier._hf_model = working
+        verdict = await CommentClassifier.aclassify("calm words here", use_ml=True, classifier_type='huggingface')
+        self.assertTrue(verdict[0])
+    
+    @override_settings(VERDICT_CACHE_ENABLED=False)
+    def test_disabled(self):
+        """Test that the cache can be switched off."""
+        CommentClassifier.classify("text", use_ml=True, classifier_type='huggingface')
+        CommentClassifier.classify("text", use_ml=True, classifier_type='huggingface')
+        self.assertEqual(len(self.calls), 2)
+    
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'verdicts': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'verdicts'},
+    })
+    def test_backend_tier_shared_between_instances(self):
+        """Test that a verdict stored in the Django cache tier is found by another process-local cache."""
+        writer = VerdictCache(backend_alias='verdicts')
+        reader = VerdictCache(backend_alias='verdicts')
+        key = VerdictCache.make_key("text", 'openai', 'gpt')
+        writer.set(key, (True, 'Spam'))
+        
+        self.assertEqual(reader.get(key), (True, 'Spam'))
+        self.assertEqual(reader.stats()['backend']['hits'], 1)
+    
+    def test_lru_eviction_and_ttl(self):
+        """Test that the LRU tier evicts the oldest entry and honours the TTL."""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        
+        expired = LRUCache(max_size=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertIsNone(expired.get('a'))
+
+
+class RetryPolicyTest(TestCase):
+    """Test retries with backoff inside a time budget."""
+    
+    def setUp(self):
+        self.now = 0.0
+        self.sleeps = []
+    
+    def clock(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+    
+    def policy(self, **kwargs):
+        options = {'timeout': 5.0, 'max_retries': 2, 'budget': 20.0, 'base_delay': 1.0, 'max_delay': 4.0}
+        options.update(kwargs)
+        return RetryPolicy(sleep=self.sleep, clock=self.clock, **options)
+    
+    def test_retries_transient_errors(self):
+        calls = []
+        
+        def flaky(timeout):
+            calls.append(timeout)
+            if len(calls) < 3:
+                raise TimeoutError()
+            return 'ok'
+        
+        policy = self.policy()
+        self.assertEqual(policy.call(flaky, lambda e: isinstance(e, TimeoutError)), 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(policy.retries, 2)
+        self.assertTrue(all(0 <= delay <= 4.0 for delay in self.sleeps))
+    
+    def test_permanent_error_is_not_retried(self):
+        def broken(timeout):
+            raise KeyError('bad request')
+        
+        policy = self.policy()
+        with self.assertRaises(KeyError):
+            policy.call(broken, lambda e: isinstance(e, TimeoutError))
+        self.assertEqual(self.sleeps, [])
+    
+    def test_budget_limits_attempt_timeout(self):
+        """Test that attempts never run past the overall budget."""
+        timeouts = []
+        
+        def slow(timeout):
+            timeouts.append(timeout)
+            self.now += timeout
+            raise TimeoutError()
+        
+        policy = self.policy(timeout=3.0, max_retries=10, budget=5.0, base_delay=0.0)
+        with self.assertRaises(TimeoutError):
+            policy.call(slow, lambda e: isinstance(e, TimeoutError))
+        self.assertEqual(timeouts[0], 3.0)
+        self.assertLessEqual(self.now, 5.0)
+
+
+class CircuitBreakerTest(TestCase):
+    """Test circuit breaker state transitions."""
+    
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0, clock=lambda: self.now)
+    
+    def test_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+    
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_half_open_trial(self):
+        """Test that one trial call is let through after the reset timeout."""
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 10.0
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        
+        # A failed trial re-opens the breaker
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.stats()['times_opened'], 2)
+        
+        self.now += 10.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_lost_trial_is_replaced(self):
+        """Test that a trial which never reports back doesn't keep the breaker shut for good."""
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 10.0
+        self.assertTrue(self.breaker.allow())
+        self.now += 5.0
+        self.assertFalse(self.breaker.allow())
+        self.now += 5.0
+        self.assertTrue(self.breaker.allow())
+
+
+class FakeOpenAIServer:
+    """
+    Local HTTP server answering /v1/chat/completions like the OpenAI API.
+    
+    Each request pops the next scripted reply: ('ok', content), ('error', status)
+    or ('sleep', seconds). Once the script is used up every request gets a clean verdict.
+    """
+    
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                server.requests += 1
+                kind, value = server.script.pop(0) if server.script else ('ok', '{"should_flag": false, "reason": null}')
+                if kind == 'sleep':
+                    time.sleep(value)
+                    kind, value = 'ok', '{"should_flag": false, "reason": null}'
+                if kind == 'error':
+                    self.reply(value, {'error': {'message': 'upstream error', 'type': 'server_error'}})
+                    return
+                self.reply(200, {
+                    'id': 'chatcmpl-test',
+                    'object': 'chat.completion',
+                    'created': 0,
+                    'model': 'gpt-test',
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': value},
+                        'finish_reason': 'stop',
+                    }],
+                })
+            
+            def reply(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            
+            def log_message(self, *args):
+                pass
+        
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+    
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+    
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@skipUnless(importlib.util.find_spec('openai'), "openai is not installed")
+class OpenAIResilienceTest(TestCase):
+    """Test OpenAI timeouts, retries and the circuit breaker against a local fake server."""
+    
+    def setUp(self):
+        self.server = FakeOpenAIServer()
+        self.reset()
+        self.settings = override_settings(
+            OPENAI_API_KEY='test-key',
+            OPENAI_BASE_URL=self.server.base_url,
+            OPENAI_TIMEOUT=0.3,
+            OPENAI_MAX_RETRIES=1,
+            OPENAI_RETRY_BUDGET=2.0,
+            OPENAI_RETRY_BASE_DELAY=0.01,
+            OPENAI_RETRY_MAX_DELAY=0.02,
+            OPENAI_BREAKER_FAILURE_THRESHOLD=2,
+            OPENAI_BREAKER_RESET_TIMEOUT=60,
+            OPENAI_FALLBACK_TO_RULES=True,
+            VERDICT_CACHE_ENABLED=False,
+        )
+        self.settings.enable()
+    
+    def tearDown(self):
+        self.settings.disable()
+        self.reset()
+        self.server.close()
+    
+    def reset(self):
+        CommentClassifier._openai_client = None
+        CommentClassifier._openai_breaker = None
+        CommentClassifier._openai_retry_policy = None
+        CommentClassifier._openai_fallbacks = 0
+    
+    def classify(self, text):
+        return CommentClassifier.classify(text, use_ml=True, classifier_type='openai')
+    
+    def test_success(self):
+        self.server.script = [('ok', '{"should_flag": true, "reason": "Toxic", "confidence": 0.9}')]
+        self.assertEqual(self.classify("You are awful"), (True, "Toxic (confidence: 0.90)"))
+        self.assertEqual(CommentClassifier.get_openai_stats()['breaker']['successes'], 1)
+    
+    def test_retries_server_error(self):
+        """Test that a 5xx response is retried and the second answer is used."""
+        self.server.script = [('error', 500), ('ok', '{"should_flag": true, "reason": "Spam", "confidence": 0.5}')]
+        self.assertEqual(self.classify("Buy followers"), (True, "Spam (confidence: 0.50)"))
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(CommentClassifier.get_openai_stats()['retries'], 1)
+    
+    def test_timeout_falls_back_to_rules(self):
+        """Test that a stalled upstream is abandoned within the retry budget."""
+        self.server.script = [('sleep', 1.0), ('sleep', 1.0)]
+        started = time.monotonic()
+        verdict = self.classify("This is a scam")
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(verdict, (True, 'Contains suspicious keywords'))
+        self.assertEqual(CommentClassifier.get_openai_stats()['fallbacks'], 1)
+    
+    def test_breaker_opens_and_skips_upstream(self):
+        """Test that once the breaker is open, comments are classified without calling the API."""
+        self.server.script = [('error', 503)] * 4
+        self.classify("first")
+        self.classify("second")
+        self.assertEqual(CommentClassifier.get_openai_breaker().state, 'open')
+        
+        requests = self.server.requests
+        self.assertEqual(self.classify("A normal comment here"), (False, None))
+        self.assertEqual(self.server.requests, requests)
+        
+        stats = CommentClassifier.get_openai_stats()
+        self.assertEqual(stats['breaker']['rejected'], 1)
+        self.assertEqual(stats['fallbacks'], 3)
+    
+    def test_client_errors_do_not_trip_breaker(self):
+        """Test that a 400 is reported, not retried, and leaves the breaker closed."""
+        self.server.script = [('error', 400)]
+        with self.assertRaises(Exception):
+            self.classify("Hello there")
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(CommentClassifier.get_openai_breaker().state, 'closed')
+    
+    @override_settings(VERDICT_CACHE_ENABLED=True)
+    def test_fallback_is_not_cached(self):
+        """Test that after a fallback and the upstream's recovery, the same text reaches the API."""
+        CommentClassifier._verdict_cache = None
+        self.server.script = [('sleep', 1.0), ('sleep', 1.0)]
+        self.assertEqual(self.classify("A normal comment here"), (False, None))
+        self.assertEqual(CommentClassifier.get_openai_stats()['fallbacks'], 1)
+        
+        requests = self.server.requests
+        self.server.script = [('ok', '{"should_flag": true, "reason": "Sarcastic", "confidence": 0.6}')]
+        self.assertEqual(self.classify("A normal comment here"), (True, "Sarcastic (confidence: 0.60)"))
+        self.assertEqual(self.server.requests, requests + 1)
+        
+        # The real verdict is cached
+        self.assertEqual(self.classify("A normal comment here"), (True, "Sarcastic (confidence: 0.60)"))
+        self.assertEqual(self.server.requests, requests + 1)
+        CommentClassifier._verdict_cache = None
+    
+    @override_settings(VERDICT_CACHE_ENABLED=True, OPENAI_BATCH_SIZE=5)
+    def test_batch_fallback_is_not_cached(self):
+        CommentClassifier._verdict_cache = None
+        self.server.script = [('error', 503), ('error', 503)]
+        texts = ["first calm comment", "second calm comment"]
+        self.assertEqual(
+            CommentClassifier.classify_many(texts, use_ml=True, classifier_type='openai'),
+            [(False, None), (False, None)]
+        )
+        
+        requests = self.server.requests
+        self.server.script = [('ok', json.dumps([
+            {'id': 1, 'should_flag': True, 'reason': 'Spam', 'confidence': 0.8},
+            {'id': 2, 'should_flag': False, 'reason': None, 'confidence': 0.9},
+        ]))]
+        self.assertEqual(
+            CommentClassifier.classify_many(texts, use_ml=True, classifier_type='openai'),
+            [(True, 'Spam (confidence: 0.80)'), (False, None)]
+        )
+        self.assertEqual(self.server.requests, requests + 1)
+        CommentClassifier._verdict_cache = None
+    
+    @override_settings(OPENAI_FALLBACK_TO_RULES=False)
+    def test_fallback_disabled(self):
+        self.server.script = [('error', 500), ('error', 500)]
+        with self.assertRaises(Exception):
+            self.classify("Hello there")
+
+
+class StubOpenAIClient:
+    """Stands in for openai.OpenAI, answering chat requests from a script."""
+    
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+    
+    def create(self, messages, **kwargs):
+        self.prompts.append(messages[-1]['content'])
+        reply = self.replies.pop(0)
+        if callable(reply):
+            reply = reply(messages[-1]['content'])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+
+def answer_all(prompt):
+    """Flag every numbered comment in a batch prompt that mentions 'bad'."""
+    items = re.findall(r'^(\d+)\. (".*")$', prompt, re.MULTILINE)
+    return json.dumps([
+        {'id': int(number), 'should_flag': 'bad' in text, 'reason': 'Bad' if 'bad' in text else None, 'confidence': 0.8}
+        for number, text in items
+    ])
+
+
+@override_settings(OPENAI_BATCH_SIZE=4, OPENAI_BATCH_MAX_ATTEMPTS=2, VERDICT_CACHE_ENABLED=False)
+class OpenAIBatchTest(TestCase):
+    """Test batched multi-comment OpenAI prompts."""
+    
+    def setUp(self):
+        CommentClassifier._openai_breaker = None
+        CommentClassifier._openai_retry_policy = None
+    
+    def tearDown(self):
+        CommentClassifier._openai_client = None
+        CommentClassifier._openai_breaker = None
+        CommentClassifier._openai_retry_policy = None
+    
+    def classify_many(self, texts, replies):
+        client = StubOpenAIClient(replies)
+        CommentClassifier._openai_client = client
+        return CommentClassifier.classify_many(texts, use_ml=True, classifier_type='openai'), client
+    
+    def test_one_request_per_batch(self):
+        """Test that comments are packed into one request per OPENAI_BATCH_SIZE."""
+        texts = [f"comment {i} is {'bad' if i % 3 == 0 else 'fine'}" for i in range(10)]
+        verdicts, client = self.classify_many(texts, [answer_all] * 3)
+        
+        self.assertEqual(len(client.prompts), 3)
+        self.assertEqual(verdicts[0], (True, 'Bad (confidence: 0.80)'))
+        self.assertEqual(verdicts[1], (False, None))
+        self.assertEqual(verdicts[9], (True, 'Bad (confidence: 0.80)'))
+    
+    def test_retries_only_missing_items(self):
+        """Test that items left out of a partial reply are asked for again on their own."""
+        partial = json.dumps([
+            {'id': 2, 'should_flag': True, 'reason': 'Spam', 'confidence': 0.9},
+            {'id': 3, 'should_flag': False, 'reason': None, 'confidence': 0.1},
+        ])
+        verdicts, client = self.classify_many(["a", "b", "c"], [partial, answer_all])
+        
+        self.assertEqual(verdicts[1], (True, 'Spam (confidence: 0.90)'))
+        self.assertEqual(verdicts[2], (False, None))
+        self.assertEqual(verdicts[0], (False, None))
+        self.assertEqual(len(client.prompts), 2)
+        self.assertIn('1. "a"', client.prompts[1])
+        self.assertNotIn('"b"', client.prompts[1])
+    
+    def test_malformed_reply_falls_back_to_single_requests(self):
+        """Test that items still missing after every batch attempt are classified one by one."""
+        single = '{"should_flag": true, "reason": "Odd", "confidence": 0.5}'
+        verdicts, client = self.classify_many(["x", "y"], ['not json', '[{"id": "?"}]', single, single])
+        
+        self.assertEqual(verdicts, [(True, 'Odd (confidence: 0.50)')] * 2)
+        self.assertEqual(len(client.prompts), 4)
+    
+    def test_wrapped_array_and_code_fence(self):
+        reply = '```json\n{"results": [{"id": 1, "should_flag": false, "reason": null, "confidence": 0.2}]}\n```'
+        verdicts, client = self.classify_many(["hello"], [reply])
+        self.assertEqual(verdicts, [(False, None)])
+    
+    @override_settings(OPENAI_BATCH_SIZE=1)
+    def test_batching_disabled(self):
+        single = '{"should_flag": false, "reason": null, "confidence": 0.1}'
+        verdicts, client = self.classify_many(["a", "b"], [single, single])
+        self.assertEqual(len(client.prompts), 2)
+
+
+class AsyncStubOpenAIClient(StubOpenAIClient):
+    """StubOpenAIClient with an awaitable create(), like AsyncOpenAI."""
+    
+    def __init__(self, replies):
+        super().__init__(replies)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate))
+    
+    async def acreate(self, messages, **kwargs):
+        return self.create(messages, **kwargs)
+
+
+@override_settings(VERDICT_CACHE_ENABLED=False)
+class AsyncClassifyTest(TestCase):
+    """Test the async classification path."""
+    
+    def tearDown(self):
+        CommentClassifier._openai_breaker = None
+        CommentClassifier._openai_retry_policy = None
+    
+    async def test_rules(self):
+        self.assertEqual(
+            await CommentClassifier.aclassify("This is a scam"),
+            CommentClassifier.classify("This is a scam")
+        )
+    
+    async def test_openai(self):
+        client = AsyncStubOpenAIClient(['{"should_flag": true, "reason": "Rude", "confidence": 0.7}'])
+        with patch.object(CommentClassifier, '_get_async_openai_client', return_value=client):
+            verdict = await CommentClassifier.aclassify("You are rude", use_ml=True, classifier_type='openai')
+        self.assertEqual(verdict, (True, 'Rude (confidence: 0.70)'))
+        self.assertIn('You are rude', client.prompts[0])
+    
+    async def test_cancelled_trial_releases_breaker(self):
+        """Test that cancelling the half-open trial call doesn't leave the breaker closed to every later call."""
+        started = asyncio.Event()
+        
+        async def hang(messages, **kwargs):
+            started.set()
+            await asyncio.sleep(60)
+        
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=hang)))
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=lambda: now[0])
+        CommentClassifier._openai_breaker = breaker
+        breaker.record_failure()
+        now[0] += 10.0
+        
+        with patch.object(CommentClassifier, '_get_async_openai_client', return_value=client):
+            task = asyncio.ensure_future(
+                CommentClassifier.aclassify("Hello there", use_ml=True, classifier_type='openai')
+            )
+            await started.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        
+        # Counted as a failed trial: re-opened, and the next trial goes through after the reset timeout
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        now[0] += 10.0
+        self.assertTrue(breaker.allow())
+    
+    async def test_huggingface_runs_on_inference_executor(self):
+        """Test that Hugging Face inference is offloaded from the event loop thread."""
+        threads = []
+        
+        def fake_classify(text):
+            threads.append(threading.current_thread().name)
+            return False, None
+        
+        with patch.object(CommentClassifier, '_classify_huggingface', side_effect=fake_classify):
+            verdict = await CommentClassifier.aclassify("hello", use_ml=True, classifier_type='huggingface')
+        self.assertEqual(verdict, (False, None))
+        self.assertTrue(threads[0].startswith('hf-inference'))
+
+
+class FakePipeline:
+    """Records calls and returns all-scores output like the real pipeline."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def __call__(self, inputs, **kwargs):
+        self.calls.append((inputs, kwargs))
+        texts = inputs if isinstance(inputs, list) else [inputs]
+        return [[{'label': 'joy', 'score': 0.9}, {'label': 'anger', 'score': 0.1}] for _ in texts]
+
+
+class ModelWarmUpTest(TestCase):
+    """Test thread-safe model loading and startup warm-up."""
+    
+    def setUp(self):
+        CommentClassifier._hf_model = None
+    
+    def tearDown(self):
+        CommentClassifier._hf_model = None
+    
+    def test_concurrent_first_requests_load_once(self):
+        """Test that racing threads build the pipeline only once."""
+        builds = []
+        
+        def slow_build():
+            builds.append(1)
+            time.sleep(0.05)
+            return FakePipeline()
+        
+        with patch.object(CommentClassifier, '_build_hf_pipeline', side_effect=slow_build):
+            threads = [threading.Thread(target=CommentClassifier._get_hf_model) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(builds), 1)
+    
+    def test_load_ml_model_uses_canonical_pipeline(self):
+        """Test that pre-loading builds the pipeline with return_all_scores like the lazy path."""
+        pipeline_calls = []
+        
+        def pipeline(*args, **kwargs):
+            pipeline_calls.append((args, kwargs))
+            return FakePipeline()
+        
+        with patch.dict(sys.modules, {'transformers': SimpleNamespace(pipeline=pipeline)}):
+            self.assertTrue(CommentClassifier.load_ml_model('huggingface'))
+        self.assertEqual(len(pipeline_calls), 1)
+        self.assertTrue(pipeline_calls[0][1]['return_all_scores'])
+        self.assertEqual(CommentClassifier._classify_huggingface("hello"), (False, None))
+    
+    def test_dummy_inference(self):
+        model = FakePipeline()
+        with patch.object(CommentClassifier, '_build_hf_pipeline', return_value=model):
+            CommentClassifier.load_ml_model('huggingface', dummy_inference=True)
+        self.assertEqual(len(model.calls), 2)
+        self.assertIsInstance(model.calls[1][0], list)
+    
+    def test_single_and_batch_paths_truncate_alike(self):
+        """Test that a single classify() and classify_many() call the pipeline with the same options."""
+        model = FakePipeline()
+        CommentClassifier._hf_model = model
+        CommentClassifier._verdict_cache = None
+        with override_settings(VERDICT_CACHE_ENABLED=False):
+            CommentClassifier.classify("x" * 5000, use_ml=True, classifier_type='huggingface')
+            CommentClassifier.classify_many(["x" * 5000], use_ml=True, classifier_type='huggingface')
+        single, batch = (kwargs for _, kwargs in model.calls)
+        self.assertTrue(single['truncation'])
+        self.assertEqual(single, {key: value for key, value in batch.items() if key != 'batch_size'})
+    
+    def test_rules_need_no_warm_up(self):
+        self.assertFalse(CommentClassifier.load_ml_model('rules'))
+    
+    @override_settings(CLASSIFIER_TYPE='huggingface', CLASSIFIER_WARMUP='background', CLASSIFIER_WARMUP_INFERENCE=False)
+    def test_app_ready_warm_up(self):
+        """Test that the app config loads the configured model in the background."""
+        model = FakePipeline()
+        with patch.object(CommentClassifier, '_build_hf_pipeline', return_value=model):
+            thread = apps.get_app_config('comments').start_classifier_warmup()
+            thread.join()
+        self.assertIs(CommentClassifier._hf_model, model)
+        self.assertEqual(model.calls, [])
+    
+    def test_warm_up_off_by_default(self):
+        self.assertIsNone(apps.get_app_config('comments').start_classifier_warmup())
+    
+    @override_settings(CLASSIFIER_TYPE='huggingface', CLASSIFIER_WARMUP='startup')
+    def test_app_ready_never_warms_up(self):
+        """Test that management commands, which only run ready(), don't load the model."""
+        with patch.object(CommentClassifier, 'load_ml_model') as load:
+            apps.get_app_config('comments').ready()
+        load.assert_not_called()
+
+
+class InferenceBackendTest(TestCase):
+    """Test HUGGINGFACE_BACKEND selection."""
+    
+    def tearDown(self):
+        CommentClassifier._hf_model = None
+    
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            build_pipeline('some/model', 'tensorrt')
+    
+    @override_settings(HUGGINGFACE_MODEL='some/model', HUGGINGFACE_BACKEND='onnx-int8')
+    def test_backend_setting_is_used(self):
+        with patch('comments.classifier.build_pipeline', return_value=FakePipeline()) as build:
+            CommentClassifier._get_hf_model()
+        build.assert_called_once_with('some/model', 'onnx-int8')
+    
+    def test_backend_is_part_of_verdict_cache_key(self):
+        with override_settings(HUGGINGFACE_BACKEND='pytorch'):
+            pytorch_key = CommentClassifier._verdict_cache_key("text", 'huggingface')
+        with override_settings(HUGGINGFACE_BACKEND='onnx'):
+            onnx_key = CommentClassifier._verdict_cache_key("text", 'huggingface')
+        self.assertNotEqual(pytorch_key, onnx_key)
+
+
+AGREEMENT_COMMENTS = [
+    "Thanks for sharing, this was really helpful!",
+    "I am so angry about this, it's outrageous.",
+    "This makes me really sad to read.",
+    "I'm scared of what happens next.",
+    "What a pleasant surprise, great work.",
+    "Disgusting behaviour from everyone involved.",
+    "Not sure how I feel about this one.",
+    "You people are idiots and I hate this site.",
+]
+
+
+@skipUnless(
+    importlib.util.find_spec('transformers') and importlib.util.find_spec('torch'),
+    "transformers and torch are not installed"
+)
+class InferenceBackendAgreementTest(TestCase):
+    """Test that the optimized backends agree with PyTorch on the top label."""
+    
+    MODEL = 'j-hartmann/emotion-english-distilroberta-base'
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reference = cls.top_labels(build_pipeline(cls.MODEL, 'pytorch'))
+    
+    @staticmethod
+    def top_labels(model):
+        return [max(scores, key=lambda s: s['score'])['label'] for scores in model(AGREEMENT_COMMENTS)]
+    
+    def assertAgrees(self, backend, minimum):
+        labels = self.top_labels(build_pipeline(self.MODEL, backend, export_dir=tempfile.mkdtemp()))
+        agreement = sum(a == b for a, b in zip(labels, self.reference)) / len(labels)
+        self.assertGreaterEqual(agreement, minimum, f"{backend}: {labels} vs {self.reference}")
+    
+    def test_pytorch_int8(self):
+        self.assertAgrees('pytorch-int8', 0.85)
+    
+    @skipUnless(importlib.util.find_spec('optimum') and importlib.util.find_spec('onnxruntime'), "optimum[onnxruntime] is not installed")
+    def test_onnx(self):
+        self.assertAgrees('onnx', 1.0)
+    
+    @skipUnless(importlib.util.find_spec('optimum') and importlib.util.find_spec('onnxruntime'), "optimum[onnxruntime] is not installed")
+    def test_onnx_int8(self):
+        self.assertAgrees('onnx-int8', 0.85)
@@ -1,10 +1,28 @@
 """
 Additional view tests for the comments app.
 """
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
+from . import counters, events, response_cache, search
+from .checks import check_response_cache_shared
+from .classifier import CommentClassifier
 from .models import Post, Comment, CommentSettings
+from .serializers import PostSummarySerializer
+from .tasks import classify_comment
 
 
 class CommentViewSetTest(TestCase):
@@ -68,3 +86,1206 @@ class CommentViewSetTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('comments_enabled', response.data)
         self.assertIsInstance(response.data['comments_enabled'], bool)
+
+
+class InlineExecutor:
+    """Executor stand-in that runs submitted work immediately."""
+    
+    def submit(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+
+
+@override_settings(CLASSIFICATION_MODE='async')
+class AsyncClassificationTest(TestCase):
+    """Test background classification of new comments."""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+    
+    def test_comment_saved_as_pending(self):
+        """Test that the response returns before classification runs."""
+        with patch('comments.tasks.get_executor') as get_executor:
+            response = self.client.post('/api/comments/', {
+                'post': self.post.id,
+                'author': 'Test User',
+                'content': 'This is a spam message'
+            }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['classification_status'], Comment.CLASSIFICATION_PENDING)
+        self.assertFalse(response.data['flagged_for_review'])
+        get_executor.assert_not_called()
+    
+    def test_worker_fills_in_verdict(self):
+        """Test that the queued job stores the verdict after commit."""
+        with patch('comments.tasks.get_executor', return_value=InlineExecutor()):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/comments/', {
+                    'post': self.post.id,
+                    'author': 'Test User',
+                    'content': 'This is a spam message'
+                }, format='json')
+        
+        comment = Comment.objects.get(id=response.data['id'])
+        self.assertEqual(comment.classification_status, Comment.CLASSIFICATION_DONE)
+        self.assertTrue(comment.flagged_for_review)
+        self.assertIn("suspicious keywords", comment.flag_reason)
+    
+    def test_failed_classification_flags_comment(self):
+        """Test that a classifier error flags the comment instead of dropping it."""
+        comment = Comment.objects.create(
+            post=self.post,
+            author="Test User",
+            content="Harmless text",
+            classification_status=Comment.CLASSIFICATION_PENDING
+        )
+        with patch('comments.tasks.CommentClassifier.classify', side_effect=ValueError("no key")):
+            self.assertTrue(classify_comment(comment.id, use_ml=True, classifier_type='openai'))
+        
+        comment.refresh_from_db()
+        self.assertEqual(comment.classification_status, Comment.CLASSIFICATION_FAILED)
+        self.assertTrue(comment.flagged_for_review)
+        self.assertIn("no key", comment.flag_reason)
+    
+    def test_drain_command_classifies_pending(self):
+        """Test that the management command classifies leftover pending comments."""
+        Comment.objects.create(
+            post=self.post,
+            author="User 1",
+            content="This is a scam",
+            classification_status=Comment.CLASSIFICATION_PENDING
+        )
+        Comment.objects.create(
+            post=self.post,
+            author="User 2",
+            content="A calm and sensible remark.",
+            classification_status=Comment.CLASSIFICATION_PENDING
+        )
+        
+        call_command('classify_pending_comments', stdout=StringIO())
+        
+        self.assertFalse(
+            Comment.objects.filter(classification_status=Comment.CLASSIFICATION_PENDING).exists()
+        )
+        self.assertEqual(Comment.objects.filter(flagged_for_review=True).count(), 1)
+    
+    def test_submitted_classifier_is_stored_and_used(self):
+        """Test that pending comments are classified with the classifier requested at submit time."""
+        with patch('comments.tasks.get_executor'):
+            response = self.client.post('/api/comments/?use_ml=true&classifier_type=openai', {
+                'post': self.post.id,
+                'author': 'Test User',
+                'content': 'A calm and sensible remark.'
+            }, format='json')
+        comment = Comment.objects.get(id=response.data['id'])
+        self.assertEqual(comment.classifier, 'openai')
+        
+        # The drain runs with default flags, but the stored choice wins
+        with patch('comments.management.commands.classify_pending_comments.CommentClassifier.classify_many',
+                   return_value=[(True, 'Flagged by OpenAI')]) as classify_many:
+            call_command('classify_pending_comments', stdout=StringIO())
+        classify_many.assert_called_once_with([comment.content], use_ml=True, classifier_type='openai')
+        comment.refresh_from_db()
+        self.assertEqual(comment.flag_reason, 'Flagged by OpenAI')
+
+
+class PostQueryCountTest(TestCase):
+    """Test that post endpoints run a fixed number of queries."""
+    
+    def setUp(self):
+        self.client = APIClient()
+    
+    def create_posts(self, count, comments_per_post=3):
+        for i in range(count):
+            post = Post.objects.create(title=f"Post {i}", content="Content")
+            Comment.objects.bulk_create([
+                Comment(post=post, author=f"User {j}", content=f"Comment {j}")
+                for j in range(comments_per_post)
+            ])
+        # bulk_create bypasses the counter signals
+        counters.recount()
+    
+    def assert_list_queries(self, post_count):
+        self.create_posts(post_count)
+        # Two validator aggregates, pagination COUNT, the posts page and one prefetch for their comments
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/posts/?include=comments')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), post_count)
+        for post in response.data['results']:
+            self.assertEqual(post['comment_count'], 3)
+            self.assertEqual(len(post['comments']), 3)
+    
+    def test_list_one_post(self):
+        self.assert_list_queries(1)
+    
+    def test_list_ten_posts(self):
+        self.assert_list_queries(10)
+    
+    def test_list_hundred_posts(self):
+        self.assert_list_queries(100)
+    
+    def test_summary_list_skips_comments(self):
+        self.create_posts(10)
+        # Two validator aggregates, pagination COUNT and the posts page; no comment fetch at all
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/posts/')
+        post = response.data['results'][0]
+        self.assertNotIn('comments', post)
+        self.assertNotIn('content', post)
+        self.assertEqual(post['comment_count'], 3)
+        self.assertEqual(post['excerpt'], "Content")
+    
+    def test_summary_empty_excerpt_skips_content(self):
+        """Test that an empty excerpt doesn't fall back to loading the deferred content."""
+        for i in range(3):
+            Post.objects.create(title=f"Empty {i}", content="")
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/posts/')
+        self.assertEqual([post['excerpt'] for post in response.data['results']], ["", "", ""])
+    
+    def test_summary_excerpt_truncated(self):
+        Post.objects.create(title="Long", content="x" * 500)
+        response = self.client.get('/api/posts/')
+        excerpt = response.data['results'][0]['excerpt']
+        self.assertEqual(excerpt, "x" * PostSummarySerializer.EXCERPT_LENGTH + '...')
+    
+    def test_retrieve_post(self):
+        self.create_posts(1)
+        post = Post.objects.get()
+        # Validators, the post and its comments
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/posts/{post.id}/')
+        self.assertEqual(response.data['comment_count'], 3)
+
+
+class CursorPaginationTest(TestCase):
+    """Test opt-in keyset pagination."""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        # Several comments share a timestamp to exercise the id tie-breaker
+        now = timezone.now()
+        self.comments = Comment.objects.bulk_create([
+            Comment(
+                post=self.post,
+                author=f"User {i}",
+                content=f"Comment {i}",
+                created_at=now + timedelta(seconds=i // 3)
+            )
+            for i in range(10)
+        ])
+    
+    def collect(self, url):
+        ids = []
+        pages = 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+    
+    def test_walks_every_comment_once_in_order(self):
+        """Test that following next links returns each comment exactly once."""
+        ids, pages = self.collect('/api/comments/?pagination=cursor&page_size=4')
+        expected = list(
+            Comment.objects.order_by('created_at', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+    
+    def test_previous_link_returns_prior_page(self):
+        """Test that the previous link goes back to the page before."""
+        first = self.client.get('/api/comments/?pagination=cursor&page_size=4')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in back.data['results']],
+            [item['id'] for item in first.data['results']]
+        )
+    
+    def test_posts_newest_first(self):
+        """Test that post keyset pagination keeps newest-first ordering."""
+        for i in range(3):
+            Post.objects.create(title=f"Post {i}", content="Content")
+        ids, _ = self.collect('/api/posts/?pagination=cursor&page_size=2')
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+    
+    def test_page_number_pagination_is_default(self):
+        """Test that existing clients still get page-number responses."""
+        response = self.client.get('/api/comments/')
+        self.assertEqual(response.data['count'], 10)
+    
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected."""
+        response = self.client.get('/api/comments/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FlaggedCommentsEndpointTest(TestCase):
+    """Test the paginated, filterable flagged comments endpoint."""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        self.other_post = Post.objects.create(title="Other Post", content="Other content")
+        now = timezone.now()
+        self.old = Comment.objects.create(
+            post=self.post, author="A", content="Old spam",
+            created_at=now - timedelta(days=10),
+            flagged_for_review=True, flag_reason="Contains suspicious keywords"
+        )
+        self.recent = Comment.objects.create(
+            post=self.post, author="B", content="Recent link",
+            created_at=now - timedelta(hours=1),
+            flagged_for_review=True, flag_reason="Contains URL"
+        )
+        self.elsewhere = Comment.objects.create(
+            post=self.other_post, author="C", content="Other spam",
+            created_at=now,
+            flagged_for_review=True, flag_reason="Contains suspicious keywords"
+        )
+        Comment.objects.create(post=self.post, author="D", content="Fine comment")
+    
+    def ids(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+    
+    def test_newest_first_by_default(self):
+        response = self.client.get('/api/comments/flagged/')
+        self.assertEqual(self.ids(response), [self.elsewhere.id, self.recent.id, self.old.id])
+        self.assertEqual(response.data['count'], 3)
+    
+    def test_ordering(self):
+        response = self.client.get('/api/comments/flagged/?ordering=created_at')
+        self.assertEqual(self.ids(response), [self.old.id, self.recent.id, self.elsewhere.id])
+        response = self.client.get('/api/comments/flagged/?ordering=author')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_filters(self):
+        response = self.client.get(f'/api/comments/flagged/?post={self.post.id}')
+        self.assertEqual(set(self.ids(response)), {self.old.id, self.recent.id})
+        
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.client.get(f'/api/comments/flagged/?since={since}')
+        self.assertEqual(set(self.ids(response)), {self.recent.id, self.elsewhere.id})
+        
+        response = self.client.get('/api/comments/flagged/?reason=keywords')
+        self.assertEqual(set(self.ids(response)), {self.old.id, self.elsewhere.id})
+        self.assertEqual(response.data['count'], 2)
+        
+        response = self.client.get('/api/comments/flagged/?since=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_cursor_pages(self):
+        first = self.client.get('/api/comments/flagged/?page_size=2')
+        self.assertEqual(len(first.data['results']), 2)
+        second = self.client.get(first.data['next'])
+        self.assertEqual(self.ids(second), [self.old.id])
+        self.assertIsNone(second.data['next'])
+    
+    def test_count_is_cached(self):
+        self.client.get('/api/comments/flagged/')
+        Comment.objects.create(
+            post=self.post, author="E", content="Late spam",
+            flagged_for_review=True, flag_reason="Contains suspicious keywords"
+        )
+        # Pagination query only; the total comes from the cache
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/comments/flagged/')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 4)
+
+
+class CommentCreateWritesTest(TestCase):
+    """Test that creating a comment costs a single write."""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        CommentSettings.load()
+    
+    def create(self, content, url='/api/comments/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {
+                'post': self.post.id,
+                'author': 'Test User',
+                'content': content
+            }, format='json')
+        # Comment rows only; the post's counters get their own UPDATE
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].lstrip().upper().startswith(('INSERT', 'UPDATE'))
+            and Comment._meta.db_table in query['sql']
+        ]
+        return response, writes
+    
+    def test_flagged_comment_single_insert(self):
+        """Test that a flagged comment is inserted with its verdict and never updated."""
+        response, writes = self.create('This is a spam message')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].upper().startswith('INSERT'))
+        self.assertTrue(response.data['flagged_for_review'])
+        self.assertTrue(Comment.objects.get().flagged_for_review)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.comment_count, self.post.flagged_count), (1, 1))
+    
+    def test_clean_comment_single_insert(self):
+        """Test that an unflagged comment is a single INSERT as well."""
+        response, writes = self.create('A calm and sensible remark.')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(writes), 1)
+    
+    def test_failed_classification_leaves_no_row(self):
+        """Test that a classifier error rejects the comment without saving it."""
+        with patch('comments.views.CommentClassifier.classify', side_effect=ValueError("no key")):
+            response, writes = self.create('Anything', url='/api/comments/?use_ml=true&classifier_type=openai')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(writes, [])
+        self.assertFalse(Comment.objects.exists())
+
+
+class BulkCommentCreateTest(TestCase):
+    """Test the bulk comment ingestion endpoint."""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        self.other_post = Post.objects.create(title="Other Post", content="Other content")
+        CommentSettings.clear_cache()
+    
+    def items(self, count):
+        return [
+            {'post': self.post.id if i % 2 else self.other_post.id, 'author': f'User {i}', 'content': f'Comment number {i}'}
+            for i in range(count)
+        ]
+    
+    def test_json_array(self):
+        """Test that a JSON array is validated, classified and inserted."""
+        items = self.items(4)
+        items.append({'post': self.post.id, 'author': 'Spammer', 'content': 'This is a scam'})
+        response = self.client.post('/api/comments/bulk/', items, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(Comment.objects.count(), 5)
+        flagged = response.data['results'][4]
+        self.assertTrue(flagged['flagged_for_review'])
+        self.assertEqual(Comment.objects.get(id=flagged['id']).flag_reason, flagged['flag_reason'])
+    
+    def test_ndjson(self):
+        """Test that newline-delimited JSON is accepted."""
+        body = '\n'.join(json.dumps(item) for item in self.items(3)) + '\n'
+        response = self.client.post('/api/comments/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Comment.objects.count(), 3)
+    
+    def test_constant_queries(self):
+        """Test that the number of queries doesn't grow with the batch size."""
+        CommentSettings.load()
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/comments/bulk/', self.items(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post('/api/comments/bulk/', self.items(50), format='json')
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+    
+    def test_invalid_item_rejects_batch(self):
+        """Test that by default one invalid item means nothing is saved."""
+        items = self.items(2) + [{'post': 999999, 'author': 'Nobody', 'content': 'Missing post'}]
+        response = self.client.post('/api/comments/bulk/', items, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(response.data['results'][2]['status'], 'error')
+        self.assertIn('post', response.data['results'][2]['errors'])
+        self.assertEqual(response.data['results'][0]['status'], 'skipped')
+    
+    def test_partial_mode(self):
+        """Test that ?partial=true saves the valid items and reports the rest."""
+        items = self.items(2) + [{'post': self.post.id, 'author': 'No content'}]
+        response = self.client.post('/api/comments/bulk/?partial=true', items, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(response.data['results'][2]['status'], 'error')
+    
+    def test_requires_list(self):
+        response = self.client.post('/api/comments/bulk/', {'post': self.post.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_disabled(self):
+        """Test that the kill switch applies to bulk ingestion."""
+        settings = CommentSettings.load()
+        settings.comments_enabled = False
+        settings.save()
+        response = self.client.post('/api/comments/bulk/', self.items(1), format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CommentExportTest(TestCase):
+    """Test the streaming comment export."""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        self.other_post = Post.objects.create(title="Other Post", content="Other content")
+        now = timezone.now()
+        self.old = Comment.objects.create(
+            post=self.post, author="Old", content="An old comment", created_at=now - timedelta(days=10)
+        )
+        self.flagged = Comment.objects.create(
+            post=self.post, author="Spammer", content="Buy now", flagged_for_review=True, flag_reason="Spam"
+        )
+        self.other = Comment.objects.create(post=self.other_post, author="Other", content="Elsewhere")
+    
+    def export(self, query=''):
+        response = self.client.get('/api/comments/export/' + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+    
+    def test_ndjson(self):
+        """Test that every comment is exported as one JSON object per line."""
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.old.id, self.flagged.id, self.other.id])
+        self.assertEqual(rows[1]['flag_reason'], 'Spam')
+        self.assertTrue(rows[1]['flagged_for_review'])
+        self.assertEqual(rows[1]['post_id'], self.post.id)
+    
+    def test_csv(self):
+        """Test that ?output=csv writes a header and one row per comment."""
+        response, body = self.export('?output=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = body.splitlines()
+        self.assertTrue(lines[0].startswith('id,post_id,author,content'))
+        self.assertEqual(len(lines), 4)
+    
+    def test_filters(self):
+        """Test the post, flagged and date range filters."""
+        _, body = self.export(f'?post={self.post.id}&flagged=false')
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [self.old.id])
+        
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        _, body = self.export(f'?since={since}')
+        self.assertEqual(len(body.splitlines()), 2)
+        
+        until = (timezone.now() - timedelta(days=5)).date().isoformat()
+        _, body = self.export(f'?until={until}')
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [self.old.id])
+    
+    def test_invalid_params(self):
+        for query in ('?output=xml', '?since=yesterday', '?flagged=maybe', '?post=abc'):
+            response = self.client.get('/api/comments/export/' + query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+    
+    def test_single_streamed_query(self):
+        """Test that the export streams one query in chunks instead of paging with OFFSET."""
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=f"User {i}", content=f"Comment {i}") for i in range(10)
+        ])
+        with override_settings(EXPORT_CHUNK_SIZE=4):
+            with CaptureQueriesContext(connection) as queries:
+                _, body = self.export()
+        self.assertEqual(len(body.splitlines()), 13)
+        self.assertEqual(len(queries.captured_queries), 1)
+    
+    def test_management_command(self):
+        """Test that export_comments writes the same rows with the same filters."""
+        out = StringIO()
+        call_command('export_comments', '--flagged', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.flagged.id])
+
+
+class ReclassifyCommentsCommandTest(TestCase):
+    """Test the reclassify_comments management command."""
+    
+    def setUp(self):
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        # Stored verdicts as an older rule set would have left them
+        self.spam = Comment.objects.create(post=self.post, author="A", content="This is spam")
+        self.cleared = Comment.objects.create(
+            post=self.post, author="B", content="A perfectly normal comment",
+            flagged_for_review=True, flag_reason="Old rule"
+        )
+        self.unchanged = Comment.objects.create(post=self.post, author="C", content="Another normal comment")
+        self.pending = Comment.objects.create(
+            post=self.post, author="D", content="Pending spam", classification_status=Comment.CLASSIFICATION_PENDING
+        )
+    
+    def reclassify(self, *args):
+        out = StringIO()
+        call_command('reclassify_comments', '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_dry_run(self):
+        """Test that --dry-run reports the flips without writing them."""
+        output = self.reclassify('--dry-run')
+        self.assertIn('2 would change (1 newly flagged, 1 unflagged', output)
+        self.spam.refresh_from_db()
+        self.assertFalse(self.spam.flagged_for_review)
+    
+    def test_updates_changed_verdicts(self):
+        """Test that changed verdicts are written and pending comments are left alone."""
+        self.reclassify('--chunk-size', '2')
+        
+        self.spam.refresh_from_db()
+        self.cleared.refresh_from_db()
+        self.pending.refresh_from_db()
+        self.assertTrue(self.spam.flagged_for_review)
+        self.assertFalse(self.cleared.flagged_for_review)
+        self.assertIsNone(self.cleared.flag_reason)
+        self.assertFalse(self.pending.flagged_for_review)
+        self.assertFalse(counters.find_drift().exists())
+    
+    def test_resume_from_checkpoint(self):
+        """Test that a run resumes after the id stored in the checkpoint file and removes it when done."""
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'reclassify.checkpoint')
+        with open(checkpoint, 'w') as f:
+            f.write(str(self.spam.id))
+        
+        self.reclassify('--checkpoint', checkpoint)
+        
+        self.spam.refresh_from_db()
+        self.cleared.refresh_from_db()
+        self.assertFalse(self.spam.flagged_for_review)
+        self.assertFalse(self.cleared.flagged_for_review)
+        self.assertFalse(os.path.exists(checkpoint))
+    
+    def test_ml_fallback_aborts_without_writing(self):
+        """Test that a chunk the ML classifier couldn't judge is not overwritten with rule verdicts."""
+        def broken_pipeline(inputs, **kwargs):
+            raise RuntimeError("model unavailable")
+        
+        with patch.object(CommentClassifier, '_hf_model', broken_pipeline):
+            with self.assertRaisesMessage(CommandError, '--start-after 0'):
+                self.reclassify('--use-ml', '--classifier-type', 'huggingface')
+        
+        self.spam.refresh_from_db()
+        self.cleared.refresh_from_db()
+        self.assertFalse(self.spam.flagged_for_review)
+        self.assertEqual(self.cleared.flag_reason, "Old rule")
+    
+    def test_ml_ignores_verdict_cache(self):
+        """Test that --use-ml asks the model again instead of reading cached verdicts."""
+        calls = []
+        
+        def pipeline(inputs, **kwargs):
+            calls.append(list(inputs))
+            return [[{'label': 'anger', 'score': 0.9}] for _ in inputs]
+        
+        verdict_cache = CommentClassifier.get_verdict_cache()
+        verdict_cache.set(CommentClassifier._verdict_cache_key(self.spam.content, 'huggingface'), (False, None))
+        with patch.object(CommentClassifier, '_hf_model', pipeline):
+            self.reclassify('--use-ml', '--classifier-type', 'huggingface')
+        
+        self.assertEqual(len(calls), 1)
+        self.spam.refresh_from_db()
+        self.assertIn('anger', self.spam.flag_reason)
+        verdict_cache.clear()
+    
+    def test_process_pool(self):
+        """Test that rule classification across worker processes gives the same verdicts."""
+        out = StringIO()
+        call_command('reclassify_comments', '--workers', '2', stdout=out)
+        self.spam.refresh_from_db()
+        self.assertTrue(self.spam.flagged_for_review)
+        self.assertIn('Reclassified 3 comments: 2 changed', out.getvalue())
+
+
+class ClassifierStatsEndpointTest(TestCase):
+    """Test the classifier metrics endpoint."""
+    
+    def test_reports_breaker_state(self):
+        response = APIClient().get('/api/comments/classifier-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(response.data['openai']['breaker']['state'], ('closed', 'open', 'half_open'))
+        self.assertIn('fallbacks', response.data['openai'])
+        self.assertIsNone(response.data['hf_batcher'])
+
+
+class AsyncCommentCreateTest(TestCase):
+    """Test the async comment creation view."""
+    
+    def setUp(self):
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        CommentSettings.clear_cache()
+    
+    def tearDown(self):
+        CommentSettings.clear_cache()
+    
+    async def create(self, data, query=''):
+        return await self.async_client.post(
+            '/api/comments/async/' + query, json.dumps(data), content_type='application/json'
+        )
+    
+    async def test_create_classifies_and_saves(self):
+        response = await self.create({'post': self.post.id, 'author': 'Spammer', 'content': 'This is a scam'})
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertTrue(data['flagged_for_review'])
+        comment = await Comment.objects.aget(id=data['id'])
+        self.assertEqual(comment.flag_reason, data['flag_reason'])
+    
+    async def test_invalid_data(self):
+        response = await self.create({'post': self.post.id, 'author': 'No content'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('content', response.json())
+        self.assertFalse(await Comment.objects.aexists())
+    
+    async def test_disabled(self):
+        settings = await CommentSettings.objects.acreate(comments_enabled=False)
+        response = await self.create({'post': self.post.id, 'author': 'A', 'content': 'Hello there'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        await settings.adelete()
+    
+    async def test_requests_overlap_while_classifying(self):
+        """Test that slow classifier calls overlap instead of queueing behind each other."""
+        async def slow_classify(text):
+            await asyncio.sleep(0.3)
+            return False, None
+        
+        data = {'post': self.post.id, 'author': 'A', 'content': 'A normal comment'}
+        with patch.object(CommentClassifier, '_aclassify_openai', side_effect=slow_classify), \
+                override_settings(VERDICT_CACHE_ENABLED=False):
+            started = time.monotonic()
+            responses = await asyncio.gather(*[
+                self.create(dict(data, author=f'User {i}'), '?use_ml=true&classifier_type=openai') for i in range(10)
+            ])
+            elapsed = time.monotonic() - started
+        
+        self.assertTrue(all(response.status_code == status.HTTP_201_CREATED for response in responses))
+        self.assertEqual(await Comment.objects.acount(), 10)
+        self.assertLess(elapsed, 1.5)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTest(TestCase):
+    """Test the versioned response cache for per-post reads."""
+    
+    def setUp(self):
+        cache.clear()
+        response_cache.reset_stats()
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        self.comment = Comment.objects.create(post=self.post, author="User", content="First comment")
+        self.detail_url = f'/api/posts/{self.post.id}/'
+        self.list_url = f'/api/comments/?post={self.post.id}'
+    
+    def test_post_detail_is_cached(self):
+        """Test that a repeated read is served from the cache with only the validator query."""
+        self.assertEqual(self.client.get(self.detail_url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.data['comments']), 1)
+    
+    def test_comment_create_invalidates(self):
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        self.client.post('/api/comments/', {'post': self.post.id, 'author': 'B', 'content': 'Second comment'}, format='json')
+        
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.client.get(self.detail_url).data['comment_count'], 2)
+    
+    def test_comment_update_and_delete_invalidate(self):
+        self.client.get(self.list_url)
+        self.client.patch(f'/api/comments/{self.comment.id}/', {'content': 'Edited comment'}, format='json')
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['content'], 'Edited comment')
+        
+        self.client.delete(f'/api/comments/{self.comment.id}/')
+        self.assertEqual(self.client.get(self.list_url).data['count'], 0)
+    
+    def test_post_save_invalidates(self):
+        self.client.get(self.detail_url)
+        self.post.title = "Renamed"
+        self.post.save()
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['title'], "Renamed")
+    
+    def test_comment_move_invalidates_both_posts(self):
+        other = Post.objects.create(title="Other", content="Other content")
+        other_url = f'/api/comments/?post={other.id}'
+        self.client.get(self.list_url)
+        self.client.get(other_url)
+        self.client.patch(f'/api/comments/{self.comment.id}/', {'post': other.id}, format='json')
+        
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+        self.assertEqual(self.client.get(other_url).data['count'], 1)
+    
+    def test_post_delete_bumps_once(self):
+        """Test that cascaded comment deletes leave the bump to the post's own signal."""
+        Comment.objects.create(post=self.post, author="B", content="Second comment")
+        post_id = self.post.id
+        with patch.object(response_cache, 'bump_post_versions') as bump:
+            self.post.delete()
+        bump.assert_called_once_with([post_id])
+    
+    def test_other_posts_stay_cached(self):
+        other = Post.objects.create(title="Other", content="Other content")
+        self.client.get(self.detail_url)
+        Comment.objects.create(post=other, author="C", content="Elsewhere")
+        self.assertEqual(self.client.get(self.detail_url)['X-Cache'], 'HIT')
+    
+    def test_signal_free_writes_invalidate(self):
+        """Test that bulk ingestion and background classification bump the version too."""
+        self.client.get(self.list_url)
+        self.client.post('/api/comments/bulk/', [{'post': self.post.id, 'author': 'D', 'content': 'Bulk comment'}], format='json')
+        self.assertEqual(self.client.get(self.list_url).data['count'], 2)
+        
+        pending = Comment.objects.create(
+            post=self.post, author="E", content="This is spam", classification_status=Comment.CLASSIFICATION_PENDING
+        )
+        self.client.get(self.list_url)
+        classify_comment(pending.id)
+        results = self.client.get(self.list_url).data['results']
+        self.assertTrue(next(r for r in results if r['id'] == pending.id)['flagged_for_review'])
+    
+    def test_bypass(self):
+        self.client.get(self.detail_url)
+        response = self.client.get(self.detail_url, HTTP_CACHE_CONTROL='no-cache')
+        self.assertEqual(response['X-Cache'], 'BYPASS')
+        with override_settings(RESPONSE_CACHE_ENABLED=False):
+            self.assertEqual(self.client.get(self.detail_url)['X-Cache'], 'BYPASS')
+    
+    def test_unfiltered_list_not_cached(self):
+        self.assertNotIn('X-Cache', self.client.get('/api/comments/'))
+    
+    @override_settings(RESPONSE_CACHE_ENABLED=None)
+    def test_off_by_default_on_locmem(self):
+        """Test that an unset RESPONSE_CACHE_ENABLED follows whether the cache is shared between processes."""
+        self.assertEqual(self.client.get(self.detail_url)['X-Cache'], 'BYPASS')
+        with patch.object(response_cache, 'is_shared', return_value=True):
+            self.assertEqual(self.client.get(self.detail_url)['X-Cache'], 'MISS')
+    
+    def test_locmem_check_warning(self):
+        self.assertEqual([warning.id for warning in check_response_cache_shared(None)], ['comments.W001'])
+        with override_settings(RESPONSE_CACHE_ENABLED=None):
+            self.assertEqual(check_response_cache_shared(None), [])
+    
+    def test_hit_rate_metric(self):
+        for _ in range(4):
+            self.client.get(self.detail_url)
+        stats = self.client.get('/api/comments/cache-stats/').data
+        self.assertEqual(stats['hits'], 3)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.75)
+        self.assertTrue(stats['enabled'])
+
+
+class ConditionalGetTest(TestCase):
+    """Test ETag / Last-Modified revalidation of post and comment reads."""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        self.comment = Comment.objects.create(post=self.post, author="User", content="First comment")
+        self.detail_url = f'/api/posts/{self.post.id}/'
+        self.list_url = f'/api/comments/?post={self.post.id}'
+    
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    
+    def test_validators_sent(self):
+        for url in (self.detail_url, self.list_url, '/api/posts/', '/api/comments/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response['ETag'].startswith('"'))
+            self.assertIn('Last-Modified', response)
+            self.assertIn('no-cache', response['Cache-Control'])
+    
+    def test_if_none_match_returns_304_without_body(self):
+        for url in (self.detail_url, self.list_url, '/api/posts/', '/api/comments/?flagged=true'):
+            first = self.client.get(url)
+            # Only the validator queries run; nothing is serialized
+            with self.assertNumQueries(2 if url == '/api/posts/' else 1):
+                response = self.revalidate(url, first)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(response['ETag'], first['ETag'])
+    
+    def test_if_modified_since(self):
+        first = self.client.get(self.detail_url)
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2001 00:00:00 GMT')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_new_comment_changes_etag(self):
+        detail, comments, posts = (self.client.get(url) for url in (self.detail_url, self.list_url, '/api/posts/'))
+        Comment.objects.create(post=self.post, author="B", content="Second comment")
+        for url, first in ((self.detail_url, detail), (self.list_url, comments), ('/api/posts/', posts)):
+            response = self.revalidate(url, first)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], first['ETag'])
+    
+    def test_edit_and_moderation_change_etag(self):
+        """Test that writes which keep counts and created_at still invalidate."""
+        first = self.client.get(self.list_url)
+        self.client.patch(f'/api/comments/{self.comment.id}/', {'content': 'Edited comment'}, format='json')
+        second = self.revalidate(self.list_url, first)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        
+        Comment.objects.filter(pk=self.comment.pk).update(flagged_for_review=True)
+        response_cache.bump_post_version(self.post.id)
+        self.assertEqual(self.revalidate(self.list_url, second).status_code, status.HTTP_200_OK)
+    
+    def test_out_of_process_moderation_changes_etag(self):
+        """Test that a command's reclassification changes the ETag even if its version bump never arrives."""
+        first = self.client.get(self.list_url)
+        Comment.objects.filter(pk=self.comment.pk).update(flagged_for_review=True)
+        self.assertEqual(self.revalidate(self.list_url, first).status_code, status.HTTP_200_OK)
+    
+    def test_other_post_keeps_etag(self):
+        first = self.client.get(self.detail_url)
+        other = Post.objects.create(title="Other", content="Other content")
+        Comment.objects.create(post=other, author="C", content="Elsewhere")
+        self.assertEqual(self.revalidate(self.detail_url, first).status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_missing_post(self):
+        response = self.client.get('/api/posts/999999/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PostCounterTest(TestCase):
+    """Test the denormalized comment_count and flagged_count columns on Post."""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+        self.other = Post.objects.create(title="Other Post", content="Other content")
+    
+    def assertCounts(self, post, comments, flagged):
+        post.refresh_from_db()
+        self.assertEqual((post.comment_count, post.flagged_count), (comments, flagged))
+    
+    def test_create_and_delete(self):
+        self.client.post('/api/comments/', {'post': self.post.id, 'author': 'A', 'content': 'This is spam'}, format='json')
+        self.client.post('/api/comments/', {'post': self.post.id, 'author': 'B', 'content': 'A calm remark'}, format='json')
+        self.assertCounts(self.post, 2, 1)
+        
+        flagged = Comment.objects.get(flagged_for_review=True)
+        self.client.delete(f'/api/comments/{flagged.id}/')
+        self.assertCounts(self.post, 1, 0)
+    
+    def test_flag_change_and_move(self):
+        comment = Comment.objects.create(post=self.post, author="A", content="Fine")
+        comment.flagged_for_review = True
+        comment.save()
+        self.assertCounts(self.post, 1, 1)
+        
+        comment.post = self.other
+        comment.save()
+        self.assertCounts(self.post, 0, 0)
+        self.assertCounts(self.other, 1, 1)
+    
+    def test_bulk_and_background_paths(self):
+        self.client.post('/api/comments/bulk/', [
+            {'post': self.post.id, 'author': 'A', 'content': 'This is spam'},
+            {'post': self.other.id, 'author': 'B', 'content': 'A calm remark'},
+        ], format='json')
+        self.assertCounts(self.post, 1, 1)
+        self.assertCounts(self.other, 1, 0)
+        
+        pending = Comment.objects.create(
+            post=self.other, author="C", content="Buy now spam", classification_status=Comment.CLASSIFICATION_PENDING
+        )
+        classify_comment(pending.id)
+        self.assertCounts(self.other, 2, 1)
+    
+    def test_saving_stale_post_keeps_counters(self):
+        """Test that saving an instance loaded before a comment was added doesn't reset the counters."""
+        stale = Post.objects.get(pk=self.post.pk)
+        Comment.objects.create(post=self.post, author="A", content="Flagged", flagged_for_review=True)
+        stale.title = "Renamed"
+        stale.save()
+        self.assertCounts(self.post, 1, 1)
+        self.assertEqual(self.post.title, "Renamed")
+        
+        response = self.client.put(f'/api/posts/{self.post.id}/', {
+            'title': 'Renamed again', 'content': 'Test content', 'comment_count': 0
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCounts(self.post, 1, 1)
+        
+        # Named explicitly, the counters are written
+        stale.comment_count = 7
+        stale.save(update_fields=['comment_count'])
+        self.assertCounts(self.post, 7, 1)
+    
+    def test_deleting_post_skips_counter_updates(self):
+        Comment.objects.create(post=self.post, author="A", content="Fine")
+        with CaptureQueriesContext(connection) as queries:
+            self.post.delete()
+        self.assertFalse(any(q['sql'].startswith('UPDATE') for q in queries.captured_queries))
+    
+    def test_api_and_ordering(self):
+        Comment.objects.create(post=self.other, author="A", content="Fine")
+        Comment.objects.create(post=self.other, author="B", content="Flagged", flagged_for_review=True)
+        data = self.client.get(f'/api/posts/{self.other.id}/').data
+        self.assertEqual((data['comment_count'], data['flagged_count']), (2, 1))
+        
+        for ordering in ('-comment_count', '-flagged_count'):
+            results = self.client.get(f'/api/posts/?ordering={ordering}').data['results']
+            self.assertEqual([post['id'] for post in results], [self.other.id, self.post.id])
+        self.assertEqual(self.client.get('/api/posts/?ordering=title').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/posts/?ordering=-comment_count&pagination=cursor')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_repair_command(self):
+        Comment.objects.bulk_create([Comment(post=self.post, author="A", content="Fine", flagged_for_review=True)])
+        Post.objects.filter(pk=self.other.pk).update(comment_count=5)
+        
+        out = StringIO()
+        call_command('repair_post_counters', '--dry-run', stdout=out)
+        self.assertIn('2 would repair', out.getvalue())
+        self.assertIn(f'post {self.post.id}: comments 0 -> 1, flagged 0 -> 1', out.getvalue())
+        self.assertCounts(self.post, 0, 0)
+        
+        out = StringIO()
+        call_command('repair_post_counters', '--chunk-size', '1', stdout=out)
+        self.assertIn('Checked 2 posts: 2 repaired', out.getvalue())
+        self.assertCounts(self.post, 1, 1)
+        self.assertCounts(self.other, 0, 0)
+
+
+class PublishOnlyBroker(events.EventBroker):
+    """An EVENTS_BROKER that forgot to implement listen()."""
+    
+    def publish(self, event_type, data):
+        return events.Event('1', event_type, data)
+
+
+class EventBrokerTest(TestCase):
+    """Test the in-process event broker behind the comment stream."""
+    
+    def test_incomplete_broker_fails_when_built(self):
+        events._broker = None
+        with override_settings(EVENTS_BROKER='comments.test_views.PublishOnlyBroker'):
+            with self.assertRaises(TypeError):
+                events.get_broker()
+        self.assertIsInstance(events.get_broker(), events.InProcessBroker)
+    
+    async def test_resume_after_last_event_id(self):
+        broker = events.InProcessBroker(buffer_size=3)
+        first = broker.publish(events.CREATED, {'id': 1})
+        for i in range(2, 4):
+            broker.publish(events.CREATED, {'id': i})
+        
+        subscription = broker.listen(first.id)
+        self.assertEqual([(await anext(subscription)).data['id'] for _ in range(2)], [2, 3])
+        await subscription.aclose()
+        self.assertEqual(broker.stats()['listeners'], 0)
+    
+    async def test_unresumable_id_sends_reset(self):
+        broker = events.InProcessBroker(buffer_size=2)
+        first = broker.publish(events.CREATED, {'id': 1})
+        for i in range(2, 5):
+            broker.publish(events.CREATED, {'id': i})
+        
+        for last_event_id in (first.id, 'restarted-1', f'{broker.epoch}-99'):
+            subscription = broker.listen(last_event_id)
+            reset = await anext(subscription)
+            self.assertEqual(reset.type, events.RESET)
+            self.assertEqual(reset.id, f'{broker.epoch}-4')
+            await subscription.aclose()
+    
+    async def test_idle_timeout_and_wakeup(self):
+        broker = events.InProcessBroker()
+        subscription = broker.listen(idle_timeout=0.05)
+        self.assertIsNone(await anext(subscription))
+        
+        waiting = asyncio.ensure_future(anext(subscription))
+        await asyncio.sleep(0.01)
+        # Publishers run in other threads (sync views, the classification pool)
+        await asyncio.to_thread(broker.publish, events.FLAGGED, {'id': 7})
+        self.assertEqual((await asyncio.wait_for(waiting, 1)).data, {'id': 7})
+        await subscription.aclose()
+
+
+class CommentEventTest(TestCase):
+    """Test that comment writes publish stream events once committed."""
+    
+    def setUp(self):
+        events._broker = None
+        self.client = APIClient()
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+    
+    def published(self):
+        return [(event.type, event.data['id']) for _, event in events.get_broker()._after(0)]
+    
+    def test_create_publishes_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/comments/', {'post': self.post.id, 'author': 'A', 'content': 'Hello'}, format='json')
+            self.assertEqual(self.published(), [])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.published(), [(events.CREATED, response.data['id'])])
+    
+    def test_flag_transitions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = Comment.objects.create(post=self.post, author="A", content="Fine")
+            comment.content = "Still fine"
+            comment.save()
+            comment.flagged_for_review = True
+            comment.save()
+            pending = Comment.objects.create(
+                post=self.post, author="B", content="This is spam", classification_status=Comment.CLASSIFICATION_PENDING
+            )
+            classify_comment(pending.id)
+        self.assertEqual(self.published(), [
+            (events.CREATED, comment.id), (events.FLAGGED, comment.id),
+            (events.CREATED, pending.id), (events.FLAGGED, pending.id),
+        ])
+        self.assertTrue(events.get_broker()._after(0)[-1][1].data['flagged_for_review'])
+    
+    def test_bulk_create_publishes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/comments/bulk/', [
+                {'post': self.post.id, 'author': 'A', 'content': 'One'},
+                {'post': self.post.id, 'author': 'B', 'content': 'Two'},
+            ], format='json')
+        ids = [result['id'] for result in response.data['results']]
+        self.assertEqual(self.published(), [(events.CREATED, comment_id) for comment_id in ids])
+
+
+class CommentStreamViewTest(TestCase):
+    """Test the Server-Sent Events endpoint."""
+    
+    def setUp(self):
+        events._broker = None
+        self.post = Post.objects.create(title="Test Post", content="Test content")
+    
+    async def open_stream(self, query='', **headers):
+        response = await self.async_client.get('/api/comments/stream/' + query, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+        self.assertTrue((await anext(content)).startswith(b'retry:'))
+        return content
+    
+    async def next_event(self, content):
+        chunk = (await asyncio.wait_for(anext(content), 1)).decode()
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        return fields['event'], fields['id'], json.loads(fields['data'])
+    
+    def publish(self, event_type, comment_id, post=None, flagged=False):
+        return events.get_broker().publish(
+            event_type, {'id': comment_id, 'post': post or self.post.id, 'flagged_for_review': flagged}
+        )
+    
+    async def test_filters_by_post_and_flag(self):
+        content = await self.open_stream(f'?post={self.post.id}&flagged=true')
+        self.publish(events.CREATED, 1)
+        self.publish(events.FLAGGED, 2, post=self.post.id + 1, flagged=True)
+        expected = self.publish(events.FLAGGED, 3, flagged=True)
+        
+        event_type, event_id, data = await self.next_event(content)
+        self.assertEqual((event_type, event_id, data['id']), (events.FLAGGED, expected.id, 3))
+        await content.aclose()
+    
+    async def test_resume_with_last_event_id(self):
+        first = self.publish(events.CREATED, 1)
+        self.publish(events.CREATED, 2)
+        content = await self.open_stream(**{'Last-Event-ID': first.id})
+        self.assertEqual((await self.next_event(content))[2]['id'], 2)
+        await content.aclose()
+        
+        content = await self.open_stream('?last_event_id=stale-1')
+        self.assertEqual((await self.next_event(content))[0], events.RESET)
+        await content.aclose()
+    
+    @override_settings(EVENTS_HEARTBEAT=0.05)
+    async def test_keep_alive(self):
+        content = await self.open_stream()
+        self.assertEqual(await asyncio.wait_for(anext(content), 1), b': keep-alive\n\n')
+        await content.aclose()
+    
+    def test_requires_asgi(self):
+        self.assertEqual(self.client.get('/api/comments/stream/').status_code, status.HTTP_501_NOT_IMPLEMENTED)
+    
+    async def test_invalid_post(self):
+        response = await self.async_client.get('/api/comments/stream/?post=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CommentSearchTest(TestCase):
+    """Test ?q= full-text search over comment author and content."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        # Normally installed by post_migrate; a reused test database may predate it
+        search.install_search_index(connection)
+        cls.post = Post.objects.create(title="Test Post", content="Test content")
+        cls.other = Post.objects.create(title="Other Post", content="Other content")
+        Comment.objects.create(post=cls.post, author="Campaigner", content="Buy cheap watches today")
+        Comment.objects.create(post=cls.other, author="Visitor", content="Cheap watches again, what a campaign")
+        Comment.objects.bulk_create([Comment(post=cls.post, author="Reader", content="Watching this thread closely")])
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+    
+    def search(self, query, **params):
+        response = self.client.get('/api/comments/', {'q': query, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(comment['author'] for comment in response.data['results'])
+    
+    def test_matches_every_word(self):
+        self.assertEqual(self.search('cheap watches'), ['Campaigner', 'Visitor'])
+        self.assertEqual(self.search('cheap again'), ['Visitor'])
+        self.assertEqual(self.search('visitor'), ['Visitor'])
+    
+    def test_stemming_and_bulk_inserted_rows(self):
+        self.assertEqual(self.search('watch'), ['Campaigner', 'Reader', 'Visitor'])
+    
+    def test_combines_with_filters(self):
+        self.assertEqual(self.search('cheap', post=self.post.id), ['Campaigner'])
+    
+    def test_index_follows_updates_and_deletes(self):
+        comment = Comment.objects.get(author="Reader")
+        comment.content = "Nothing to see"
+        comment.save()
+        Comment.objects.filter(author="Visitor").delete()
+        self.assertEqual(self.search('watch'), ['Campaigner'])
+        self.assertEqual(self.search('nothing'), ['Reader'])
+    
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"cheap" OR *'), [])
+        self.assertEqual(self.search('!!!'), [])
+    
+    def test_uses_index(self):
+        plan = search.filter_comments(Comment.objects.all(), 'cheap').explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn(search.FTS_TABLE, plan)
+        elif connection.vendor == 'postgresql':
+            self.assertIn(search.INDEX_NAME, plan)
+    
+    def test_admin_search(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get('/admin/comments/comment/', {'q': 'cheap watches'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context['cl'].result_count, 2)
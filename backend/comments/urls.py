@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet
+from .views import PostViewSet, CommentViewSet, comment_stream, create_comment_async
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet, basename='post')
 router.register(r'comments', CommentViewSet, basename='comment')
 
 urlpatterns = [
+    path('comments/async/', create_comment_async, name='comment-create-async'),
+    path('comments/stream/', comment_stream, name='comment-stream'),
     path('', include(router.urls)),
 ]
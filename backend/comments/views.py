@@ -1,20 +1,92 @@
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings as django_settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import Left
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.parsers import JSONParser
+from .export import CONTENT_TYPES, EXPORT_FORMATS, filter_comments, iter_export, parse_timestamp
 from .models import Post, Comment, CommentSettings
-from .serializers import PostSerializer, CommentSerializer
+from .pagination import CommentPagination, FlaggedCommentPagination, PostPagination
+from .parsers import NDJSONParser
+from .serializers import PostSerializer, PostSummarySerializer, CommentSerializer, BulkCommentSerializer
 from .classifier import CommentClassifier
+from .tasks import enqueue_classification, is_async_mode, resolve_classifier
+from . import conditional, counters, events, response_cache, search
 
 
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
+    pagination_class = PostPagination
+    # ?ordering= values for the post list; ties go to the newest post
+    orderings = ('-created_at', 'created_at', '-comment_count', '-flagged_count')
+    
+    def use_summary(self):
+        """List requests get the summary form unless ?include=comments is given."""
+        if self.action != 'list':
+            return False
+        include = self.request.query_params.get('include', '')
+        return 'comments' not in include.split(',')
+    
+    def get_serializer_class(self):
+        if self.use_summary():
+            return PostSummarySerializer
+        return PostSerializer
+    
+    def get_ordering(self):
+        ordering = self.request.query_params.get('ordering', self.orderings[0])
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': f"Must be one of: {', '.join(self.orderings)}"})
+        if ordering != self.orderings[0] and self.paginator.wants_cursor(self.request):
+            raise ValidationError({'ordering': 'Cursor pagination only supports the default ordering.'})
+        return [ordering] if ordering.endswith('created_at') else [ordering, '-created_at']
+    
+    def get_queryset(self):
+        # Counts are stored on the post; comments are prefetched when needed so a page costs a fixed number of queries
+        queryset = Post.objects.all()
+        if self.action == 'list':
+            queryset = queryset.order_by(*self.get_ordering())
+        if self.use_summary():
+            return queryset.defer('content').annotate(
+                excerpt_source=Left('content', PostSummarySerializer.EXCERPT_LENGTH + 1)
+            )
+        return queryset.prefetch_related('comments')
+    
+    def list(self, request, *args, **kwargs):
+        return conditional.conditional_response(
+            request, conditional.post_list_validators(),
+            lambda: super(PostViewSet, self).list(request, *args, **kwargs)
+        )
+    
+    def retrieve(self, request, *args, **kwargs):
+        post_id = kwargs[self.lookup_field]
+        validators = conditional.post_validators(post_id) if str(post_id).isdigit() else None
+        return conditional.conditional_response(
+            request, validators,
+            lambda: response_cache.cached_response(
+                request, 'post-detail', post_id,
+                lambda: super(PostViewSet, self).retrieve(request, *args, **kwargs)
+            )
+        )
 
 
 class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = CommentPagination
     
     def get_queryset(self):
         queryset = Comment.objects.all()
@@ -27,46 +99,369 @@ class CommentViewSet(viewsets.ModelViewSet):
         if post_id:
             queryset = queryset.filter(post_id=post_id)
         
+        query = self.request.query_params.get('q', None)
+        if query:
+            queryset = search.filter_comments(queryset, query)
+        
         return queryset
     
+    def list(self, request, *args, **kwargs):
+        # Per-post lists are cached under the post's version; unfiltered lists are not
+        post_id = request.query_params.get('post', '')
+        if post_id and not post_id.isdigit():
+            return super().list(request, *args, **kwargs)
+        post_id = int(post_id) if post_id else None
+        
+        def build():
+            if post_id is None:
+                return super(CommentViewSet, self).list(request, *args, **kwargs)
+            return response_cache.cached_response(
+                request, 'comment-list', post_id,
+                lambda: super(CommentViewSet, self).list(request, *args, **kwargs)
+            )
+        
+        return conditional.conditional_response(
+            request, conditional.comment_list_validators(self.filter_queryset(self.get_queryset()), post_id), build
+        )
+    
     def perform_create(self, serializer):
         # Check if comments are enabled
         settings = CommentSettings.load()
         if not settings.comments_enabled:
             raise PermissionDenied("Comments are currently disabled. Please try again later.")
         
-        comment = serializer.save()
-        
         # Classify the comment
         use_ml = self.request.query_params.get('use_ml', 'false').lower() == 'true'
         classifier_type = self.request.query_params.get('classifier_type', None)  # 'huggingface' or 'openai'
         
+        if is_async_mode():
+            # Save right away and let the background pool fill in the verdict
+            comment = serializer.save(
+                classification_status=Comment.CLASSIFICATION_PENDING,
+                classifier=resolve_classifier(use_ml, classifier_type)
+            )
+            enqueue_classification(comment.id)
+            return
+        
+        # Classify before saving so the verdict goes into the single INSERT and a
+        # failed classification leaves no row behind
         try:
             should_flag, reason = CommentClassifier.classify(
-                comment.content, 
+                serializer.validated_data['content'],
                 use_ml=use_ml,
                 classifier_type=classifier_type
             )
-            
-            if should_flag:
-                comment.flagged_for_review = True
-                comment.flag_reason = reason
-                comment.save()
         except (ValueError, ImportError, Exception) as e:
             # If classification fails (e.g., OpenAI not configured), raise a validation error
             raise ValidationError(f"Classification failed: {str(e)}")
+        
+        serializer.save(flagged_for_review=should_flag, flag_reason=reason)
+    
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create many comments in one request.
+        
+        Accepts a JSON array or NDJSON (application/x-ndjson) of comment
+        objects. Items are classified in one batch and inserted with
+        bulk_create. By default nothing is saved if any item is invalid;
+        with ?partial=true the valid items are saved and the rest reported.
+        Also accepts the use_ml and classifier_type query params.
+        """
+        settings = CommentSettings.load()
+        if not settings.comments_enabled:
+            raise PermissionDenied("Comments are currently disabled. Please try again later.")
+        
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of comments.']})
+        max_items = getattr(django_settings, 'BULK_COMMENTS_MAX_ITEMS', 5000)
+        if len(items) > max_items:
+            raise ValidationError({'non_field_errors': [f'At most {max_items} comments per request.']})
+        
+        partial = request.query_params.get('partial', 'false').lower() == 'true'
+        use_ml = request.query_params.get('use_ml', 'false').lower() == 'true'
+        classifier_type = request.query_params.get('classifier_type', None)
+        
+        # Resolve every referenced post with one query
+        post_ids = {
+            str(item.get('post')) for item in items
+            if isinstance(item, dict) and str(item.get('post')).isdigit()
+        }
+        context = self.get_serializer_context()
+        context['posts'] = Post.objects.in_bulk([int(pk) for pk in post_ids])
+        
+        serializer = BulkCommentSerializer(data=items, many=True, context=context)
+        results = [None] * len(items)
+        if serializer.is_valid():
+            valid_indexes = list(range(len(items)))
+            validated = serializer.validated_data
+        else:
+            errors = serializer.errors
+            # Recent DRF versions report only the failing items, keyed by index
+            if not isinstance(errors, dict):
+                errors = dict(enumerate(errors))
+            valid_indexes = [index for index in range(len(items)) if not errors.get(index)]
+            for index, item_errors in errors.items():
+                if item_errors:
+                    results[index] = {'index': index, 'status': 'error', 'errors': item_errors}
+            if not partial or not valid_indexes:
+                for index in valid_indexes:
+                    results[index] = {'index': index, 'status': 'skipped'}
+                return Response(
+                    {'created': 0, 'failed': len(items) - len(valid_indexes), 'results': results},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            serializer = BulkCommentSerializer(
+                data=[items[index] for index in valid_indexes], many=True, context=context
+            )
+            serializer.is_valid(raise_exception=True)
+            validated = serializer.validated_data
+        
+        try:
+            verdicts = CommentClassifier.classify_many(
+                [data['content'] for data in validated],
+                use_ml=use_ml,
+                classifier_type=classifier_type
+            )
+        except Exception as e:
+            raise ValidationError(f"Classification failed: {str(e)}")
+        
+        comments = [
+            Comment(**data, flagged_for_review=should_flag, flag_reason=reason)
+            for data, (should_flag, reason) in zip(validated, verdicts)
+        ]
+        with transaction.atomic():
+            Comment.objects.bulk_create(
+                comments,
+                batch_size=getattr(django_settings, 'BULK_CREATE_BATCH_SIZE', 500)
+            )
+            # bulk_create sends no post_save signals
+            counters.apply_deltas(counters.creation_deltas(comments))
+            events.publish_comments(events.CREATED, comments)
+            response_cache.bump_post_versions({comment.post_id for comment in comments})
+        
+        for index, comment in zip(valid_indexes, comments):
+            results[index] = {
+                'index': index,
+                'status': 'created',
+                'id': comment.id,
+                'flagged_for_review': comment.flagged_for_review,
+                'flag_reason': comment.flag_reason,
+            }
+        failed = len(items) - len(comments)
+        return Response(
+            {'created': len(comments), 'failed': failed, 'results': results},
+            status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED
+        )
     
     @action(detail=False, methods=['get'])
     def flagged(self, request):
-        """Get all flagged comments."""
-        flagged_comments = Comment.objects.filter(flagged_for_review=True)
-        serializer = self.get_serializer(flagged_comments, many=True)
-        return Response(serializer.data)
+        """
+        Get flagged comments, newest first, with cursor pagination.
+        
+        Query params: post, since (ISO date or datetime), reason (substring of
+        flag_reason), ordering (created_at or -created_at), page_size, cursor.
+        The total in 'count' is cached for FLAGGED_COUNT_CACHE_TTL seconds.
+        """
+        queryset = Comment.objects.filter(flagged_for_review=True)
+        params = request.query_params
+        
+        post_id = params.get('post')
+        if post_id:
+            if not post_id.isdigit():
+                raise ValidationError({'post': 'Must be a post id.'})
+            queryset = queryset.filter(post_id=post_id)
+        
+        since = params.get('since')
+        if since:
+            queryset = queryset.filter(created_at__gte=self.parse_since(since))
+        
+        reason = params.get('reason')
+        if reason:
+            queryset = queryset.filter(flag_reason__icontains=reason)
+        
+        paginator = FlaggedCommentPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['count'] = self.get_flagged_count(queryset, {
+            'post': post_id, 'since': since, 'reason': reason
+        })
+        return response
+    
+    @staticmethod
+    def parse_since(value, param='since', end_of_day=False):
+        since = parse_timestamp(value, end_of_day=end_of_day)
+        if since is None:
+            raise ValidationError({param: 'Must be an ISO 8601 date or datetime.'})
+        return since
+    
+    @staticmethod
+    def get_flagged_count(queryset, filters):
+        """Return the flagged total for these filters, recounting at most once per cache TTL."""
+        key = 'comments:flagged-count:' + hashlib.sha1(
+            json.dumps(filters, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, getattr(django_settings, 'FLAGGED_COUNT_CACHE_TTL', 30))
+        return count
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every matching comment with its verdict as NDJSON or CSV.
+        
+        Query params: output (ndjson or csv), post, since and until (ISO date
+        or datetime, inclusive), flagged (true or false). Rows are read in
+        chunks of EXPORT_CHUNK_SIZE, so memory use doesn't grow with the table.
+        """
+        params = request.query_params
+        export_format = params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'output': f"Must be one of: {', '.join(EXPORT_FORMATS)}"})
+        
+        post_id = params.get('post')
+        if post_id and not post_id.isdigit():
+            raise ValidationError({'post': 'Must be a post id.'})
+        since = params.get('since')
+        until = params.get('until')
+        flagged = params.get('flagged')
+        if flagged not in (None, 'true', 'false'):
+            raise ValidationError({'flagged': 'Must be true or false.'})
+        
+        queryset = filter_comments(
+            post=int(post_id) if post_id else None,
+            since=self.parse_since(since) if since else None,
+            until=self.parse_since(until, param='until', end_of_day=True) if until else None,
+            flagged=None if flagged is None else flagged == 'true',
+        )
+        response = StreamingHttpResponse(
+            iter_export(
+                queryset,
+                export_format,
+                chunk_size=getattr(django_settings, 'EXPORT_CHUNK_SIZE', 2000)
+            ),
+            content_type=CONTENT_TYPES[export_format]
+        )
+        filename = f"comments-{timezone.now():%Y%m%d-%H%M%S}.{export_format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    @action(detail=False, methods=['get'], url_path='classifier-stats')
+    def classifier_stats(self, request):
+        """Get classifier health metrics: OpenAI breaker state, verdict cache and micro-batcher stats."""
+        verdict_cache = CommentClassifier.get_verdict_cache()
+        batcher = CommentClassifier.get_hf_batcher()
+        return Response({
+            'openai': CommentClassifier.get_openai_stats(),
+            'verdict_cache': verdict_cache.stats() if verdict_cache is not None else None,
+            'hf_batcher': batcher.stats() if batcher is not None else None,
+        })
+    
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        """Get response cache hit, miss and bypass counts and the hit rate for this process."""
+        return Response(dict(response_cache.stats(), enabled=response_cache.is_enabled()))
     
     @action(detail=False, methods=['get'], url_path='settings')
     def comment_settings(self, request):
         """Get comment settings (whether comments are enabled)."""
         settings = CommentSettings.load()
-        return Response({
+        data = {
             'comments_enabled': settings.comments_enabled
-        })
+        }
+        
+        # Let clients and proxies revalidate cheaply; the max-age matches the server-side cache TTL
+        etag = quote_etag(hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()[:16])
+        response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, max_age=getattr(django_settings, 'COMMENT_SETTINGS_CACHE_TTL', 5))
+        return get_conditional_response(request, etag=etag, response=response)
+
+
+@csrf_exempt
+async def create_comment_async(request):
+    """
+    Create a comment without holding a thread while it is classified.
+    
+    Same request, query params and responses as POST /api/comments/, but the
+    classifier is awaited through CommentClassifier.aclassify(), so under
+    ASGI one worker can have many moderation calls in flight. Database work
+    goes through sync_to_async.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError as e:
+        return JsonResponse({'detail': f'JSON parse error - {e}'}, status=400)
+    
+    settings = await sync_to_async(CommentSettings.load)()
+    if not settings.comments_enabled:
+        return JsonResponse({'detail': "Comments are currently disabled. Please try again later."}, status=403)
+    
+    serializer = CommentSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+    
+    use_ml = request.GET.get('use_ml', 'false').lower() == 'true'
+    classifier_type = request.GET.get('classifier_type', None)
+    
+    if is_async_mode():
+        def save_pending():
+            comment = serializer.save(
+                classification_status=Comment.CLASSIFICATION_PENDING,
+                classifier=resolve_classifier(use_ml, classifier_type)
+            )
+            enqueue_classification(comment.id)
+        await sync_to_async(save_pending)()
+        return JsonResponse(serializer.data, status=201)
+    
+    try:
+        should_flag, reason = await CommentClassifier.aclassify(
+            serializer.validated_data['content'],
+            use_ml=use_ml,
+            classifier_type=classifier_type
+        )
+    except Exception as e:
+        return JsonResponse([f"Classification failed: {str(e)}"], status=400, safe=False)
+    
+    await sync_to_async(serializer.save)(flagged_for_review=should_flag, flag_reason=reason)
+    return JsonResponse(serializer.data, status=201)
+
+
+async def comment_stream(request):
+    """
+    Stream comment events as Server-Sent Events.
+    
+    Sends 'comment.created' and 'comment.flagged' events with the comment as
+    the data, starting from the moment of connection, or resuming after the
+    Last-Event-ID header (or ?last_event_id=) on reconnect. A 'reset' event
+    means the id couldn't be resumed and the client should refetch.
+    Query params: ?post={id}, ?flagged=true.
+    
+    Needs the ASGI server (smart_comments.asgi); under WSGI each open stream
+    would hold a worker thread, so it answers 501 there.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'The event stream is only served by the ASGI application.'}, status=501)
+    
+    post_id = request.GET.get('post')
+    if post_id is not None and not post_id.isdigit():
+        return JsonResponse({'post': ['Must be a post id.']}, status=400)
+    flagged_only = request.GET.get('flagged', 'false').lower() == 'true'
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    
+    response = StreamingHttpResponse(
+        events.stream(last_event_id, int(post_id) if post_id else None, flagged_only),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -2,6 +2,8 @@
 ASGI config for smart_comments project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with ``uvicorn smart_comments.asgi:application``; the comment event
+stream (GET /api/comments/stream/) and the async create view need it.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -9,8 +11,12 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.apps import apps
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_comments.settings')
 
 application = get_asgi_application()
+
+# Load the classifier model per CLASSIFIER_WARMUP; only server processes import this module
+apps.get_app_config('comments').start_classifier_warmup()
@@ -164,4 +164,72 @@ CORS_ALLOW_CREDENTIALS = True
 CLASSIFIER_TYPE = os.getenv('CLASSIFIER_TYPE', 'rules')  # Options: 'rules', 'huggingface', 'openai'
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')  # or 'gpt-4', 'gpt-4-turbo-preview'
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '')  # Empty for the default API endpoint
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '10'))  # Seconds per API call
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))  # Retries on timeouts, connection errors, 429 and 5xx
+OPENAI_RETRY_BUDGET = float(os.getenv('OPENAI_RETRY_BUDGET', '20'))  # Total seconds across attempts and backoff
+OPENAI_RETRY_BASE_DELAY = float(os.getenv('OPENAI_RETRY_BASE_DELAY', '0.5'))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv('OPENAI_RETRY_MAX_DELAY', '4'))
+OPENAI_BREAKER_FAILURE_THRESHOLD = int(os.getenv('OPENAI_BREAKER_FAILURE_THRESHOLD', '5'))  # Consecutive failures before the breaker opens
+OPENAI_BREAKER_RESET_TIMEOUT = float(os.getenv('OPENAI_BREAKER_RESET_TIMEOUT', '30'))  # Seconds before a trial call is let through
+OPENAI_FALLBACK_TO_RULES = os.getenv('OPENAI_FALLBACK_TO_RULES', 'True') == 'True'  # Use rules while OpenAI is unavailable
+OPENAI_BATCH_SIZE = int(os.getenv('OPENAI_BATCH_SIZE', '20'))  # Comments per request in classify_many; 1 sends one request per comment
+OPENAI_BATCH_MAX_ATTEMPTS = int(os.getenv('OPENAI_BATCH_MAX_ATTEMPTS', '2'))  # Requests per group before missing items go one by one
 HUGGINGFACE_MODEL = os.getenv('HUGGINGFACE_MODEL', 'j-hartmann/emotion-english-distilroberta-base')
+HUGGINGFACE_BACKEND = os.getenv('HUGGINGFACE_BACKEND', 'pytorch')  # Options: 'pytorch', 'pytorch-int8', 'onnx', 'onnx-int8' (ONNX needs optimum[onnxruntime])
+HUGGINGFACE_EXPORT_DIR = os.getenv('HUGGINGFACE_EXPORT_DIR', str(BASE_DIR / 'model_exports'))  # Where ONNX exports are saved and reused
+HUGGINGFACE_BATCH_SIZE = int(os.getenv('HUGGINGFACE_BATCH_SIZE', '32'))  # Comments per forward pass in classify_many
+HUGGINGFACE_MICROBATCH = os.getenv('HUGGINGFACE_MICROBATCH', 'False') == 'True'  # Group concurrent requests into one pipeline call
+HUGGINGFACE_MICROBATCH_MAX_SIZE = int(os.getenv('HUGGINGFACE_MICROBATCH_MAX_SIZE', '16'))
+HUGGINGFACE_MICROBATCH_MAX_WAIT_MS = float(os.getenv('HUGGINGFACE_MICROBATCH_MAX_WAIT_MS', '10'))
+HUGGINGFACE_MICROBATCH_TIMEOUT = float(os.getenv('HUGGINGFACE_MICROBATCH_TIMEOUT', '30'))  # Seconds to wait for a batched verdict before falling back to rules
+HUGGINGFACE_INFERENCE_WORKERS = int(os.getenv('HUGGINGFACE_INFERENCE_WORKERS', '4'))  # Threads running inference for async views
+CLASSIFIER_WARMUP = os.getenv('CLASSIFIER_WARMUP', 'off')  # Options: 'off', 'startup', 'background' - load the CLASSIFIER_TYPE model when the app starts
+CLASSIFIER_WARMUP_INFERENCE = os.getenv('CLASSIFIER_WARMUP_INFERENCE', 'True') == 'True'  # Run a dummy inference after loading
+
+# Background classification
+CLASSIFICATION_MODE = os.getenv('CLASSIFICATION_MODE', 'sync')  # Options: 'sync', 'async'
+CLASSIFICATION_WORKERS = int(os.getenv('CLASSIFICATION_WORKERS', '4'))  # Thread pool size for 'async' mode
+
+# Verdict cache for the ML classifiers
+VERDICT_CACHE_ENABLED = os.getenv('VERDICT_CACHE_ENABLED', 'True') == 'True'
+VERDICT_CACHE_SIZE = int(os.getenv('VERDICT_CACHE_SIZE', '10000'))  # Entries in the in-process LRU tier
+VERDICT_CACHE_TTL = int(os.getenv('VERDICT_CACHE_TTL', '3600'))  # Seconds
+VERDICT_CACHE_BACKEND = os.getenv('VERDICT_CACHE_BACKEND', '')  # Optional alias in CACHES for a shared tier
+VERDICT_CACHE_BACKEND_TTL = int(os.getenv('VERDICT_CACHE_BACKEND_TTL', '86400'))  # Seconds
+
+# Seconds the flagged-comments total is cached between moderator refreshes
+FLAGGED_COUNT_CACHE_TTL = int(os.getenv('FLAGGED_COUNT_CACHE_TTL', '30'))
+
+# Response cache for GET /api/posts/{id}/ and GET /api/comments/?post={id}, invalidated per post.
+# Unset, it is on only when RESPONSE_CACHE_ALIAS is shared between processes (not locmem), since
+# classify_pending_comments, reclassify_comments and repair_post_counters invalidate from their own
+RESPONSE_CACHE_ENABLED = {'True': True, 'False': False}.get(os.getenv('RESPONSE_CACHE_ENABLED', ''))
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', 'default')  # Alias in CACHES
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '300'))  # Seconds
+
+# Server-Sent Events stream (GET /api/comments/stream/, ASGI only)
+EVENTS_BROKER = os.getenv('EVENTS_BROKER', 'comments.events.InProcessBroker')  # Dotted path to an EventBroker
+EVENTS_BUFFER_SIZE = int(os.getenv('EVENTS_BUFFER_SIZE', '1000'))  # Recent events kept for Last-Event-ID resume
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', '15'))  # Seconds between keep-alive comments on an idle stream
+EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', '3000'))  # Reconnect delay sent to clients
+
+# LocMemCache is per process; to share cached responses between workers use
+# django.core.cache.backends.filebased.FileBasedCache (CACHE_LOCATION=/path/to/dir) or
+# django.core.cache.backends.db.DatabaseCache (CACHE_LOCATION=table name, then run createcachetable)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds each worker reuses its cached CommentSettings row (bounds how long a kill switch takes to apply)
+COMMENT_SETTINGS_CACHE_TTL = int(os.getenv('COMMENT_SETTINGS_CACHE_TTL', '5'))
+
+# Bulk comment ingestion (POST /api/comments/bulk/)
+BULK_COMMENTS_MAX_ITEMS = int(os.getenv('BULK_COMMENTS_MAX_ITEMS', '5000'))
+BULK_CREATE_BATCH_SIZE = int(os.getenv('BULK_CREATE_BATCH_SIZE', '500'))  # Rows per INSERT
+
+# Rows fetched per database round trip by the comment export
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
@@ -9,8 +9,12 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 
 import os
 
+from django.apps import apps
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smart_comments.settings')
 
 application = get_wsgi_application()
+
+# Load the classifier model per CLASSIFIER_WARMUP; only server processes import this module
+apps.get_app_config('comments').start_classifier_warmup()
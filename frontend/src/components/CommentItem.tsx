@@ -21,6 +21,11 @@ const CommentItem: React.FC<CommentItemProps> = ({ comment }) => {
             ⚠️ Flagged
           </span>
         )}
+        {comment.classification_status === 'pending' && (
+          <span className="pending-badge" title="Classification in progress">
+            ⏳ Pending review
+          </span>
+        )}
       </div>
       <div className="comment-content">{comment.content}</div>
       {comment.flag_reason && (
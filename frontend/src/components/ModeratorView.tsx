@@ -1,23 +1,80 @@
-import React, { useState, useEffect } from 'react';
-import { Comment } from '../types';
+import React, { useState, useEffect, useMemo, useRef } from 'react';
+import { useSearchParams } from 'react-router-dom';
+import { Comment, FlaggedFilters } from '../types';
 import { commentsApi } from '../services/api';
 import CommentItem from './CommentItem';
 import './ModeratorView.css';
 
+// Same checks as GET /comments/flagged/, so a live event only adds what a refetch would return
+const matchesFilters = (comment: Comment, filters: FlaggedFilters): boolean => {
+  if (!comment.flagged_for_review) return false;
+  if (filters.postId && comment.post !== filters.postId) return false;
+  if (filters.since && new Date(comment.created_at) < new Date(filters.since)) return false;
+  if (filters.reason && !(comment.flag_reason || '').toLowerCase().includes(filters.reason.toLowerCase())) {
+    return false;
+  }
+  return true;
+};
+
 const ModeratorView: React.FC = () => {
+  // Filters come from the URL, e.g. /moderator?post=3&reason=spam&since=2026-01-01&ordering=created_at
+  const [searchParams] = useSearchParams();
+  const filters = useMemo<FlaggedFilters>(() => {
+    const post = parseInt(searchParams.get('post') || '', 10);
+    return {
+      postId: Number.isNaN(post) ? undefined : post,
+      since: searchParams.get('since') || undefined,
+      reason: searchParams.get('reason') || undefined,
+      ordering: searchParams.get('ordering') === 'created_at' ? 'created_at' : '-created_at',
+    };
+  }, [searchParams]);
+
   const [flaggedComments, setFlaggedComments] = useState<Comment[]>([]);
+  const [totalCount, setTotalCount] = useState(0);
+  const [nextUrl, setNextUrl] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // Read by the stream handler, which would otherwise see the values from when it subscribed
+  const knownIds = useRef(new Set<number>());
+  const hasMore = useRef(false);
 
   useEffect(() => {
     loadFlaggedComments();
-  }, []);
+    // New flags arrive as deltas, so the list stays current without pressing Refresh
+    return commentsApi.subscribe(
+      { postId: filters.postId, flaggedOnly: true },
+      (_type, comment) => {
+        if (!matchesFilters(comment, filters) || knownIds.current.has(comment.id)) return;
+        knownIds.current.add(comment.id);
+        setTotalCount((count) => count + 1);
+        if (filters.ordering === 'created_at') {
+          // Oldest first: the newest comment belongs on the last page, which "Load more" fetches
+          if (!hasMore.current) {
+            setFlaggedComments((current) => [...current, comment]);
+          }
+        } else {
+          setFlaggedComments((current) => [comment, ...current]);
+        }
+      },
+      loadFlaggedComments
+    );
+  }, [filters]);
+
+  const setPage = (results: Comment[], next: string | null, append: boolean) => {
+    if (!append) knownIds.current = new Set();
+    results.forEach((comment) => knownIds.current.add(comment.id));
+    hasMore.current = next !== null;
+    setNextUrl(next);
+  };
 
   const loadFlaggedComments = async () => {
     try {
       setLoading(true);
-      const data = await commentsApi.getFlagged();
-      setFlaggedComments(data);
+      const page = await commentsApi.getFlagged(filters);
+      setPage(page.results, page.next, false);
+      setFlaggedComments(page.results);
+      setTotalCount(page.count ?? page.results.length);
       setError(null);
     } catch (err) {
       setError('Failed to load flagged comments');
@@ -27,6 +84,25 @@ const ModeratorView: React.FC = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextUrl) return;
+    try {
+      setLoadingMore(true);
+      const page = await commentsApi.getFlagged(filters, nextUrl);
+      setPage(page.results, page.next, true);
+      // Skip comments the stream already added
+      setFlaggedComments((current) => {
+        const listed = new Set(current.map((comment) => comment.id));
+        return [...current, ...page.results.filter((comment) => !listed.has(comment.id))];
+      });
+    } catch (err) {
+      setError('Failed to load flagged comments');
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (loading) {
     return <div className="loading">Loading flagged comments...</div>;
   }
@@ -44,7 +120,7 @@ const ModeratorView: React.FC = () => {
         </button>
       </div>
       <div className="flagged-count">
-        {flaggedComments.length} {flaggedComments.length === 1 ? 'comment' : 'comments'} flagged for review
+        {totalCount} {totalCount === 1 ? 'comment' : 'comments'} flagged for review
       </div>
       {flaggedComments.length === 0 ? (
         <div className="empty-state">
@@ -57,6 +133,11 @@ const ModeratorView: React.FC = () => {
               <CommentItem comment={comment} />
             </div>
           ))}
+          {nextUrl && (
+            <button onClick={loadMore} className="refresh-btn load-more-btn" disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          )}
         </div>
       )}
     </div>
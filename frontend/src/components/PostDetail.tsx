@@ -23,6 +23,32 @@ const PostDetail: React.FC = () => {
     }
   }, [id]);
 
+  useEffect(() => {
+    if (!id) return;
+    return commentsApi.subscribe({ postId: parseInt(id) }, (_type, comment) => {
+      setPost((current) => {
+        if (!current) return current;
+        const index = current.comments.findIndex((existing) => existing.id === comment.id);
+        if (index === -1) {
+          return {
+            ...current,
+            comments: [...current.comments, comment],
+            comment_count: current.comment_count + 1,
+            flagged_count: current.flagged_count + (comment.flagged_for_review ? 1 : 0),
+          };
+        }
+        const comments = [...current.comments];
+        const wasFlagged = comments[index].flagged_for_review;
+        comments[index] = comment;
+        return {
+          ...current,
+          comments,
+          flagged_count: current.flagged_count + (comment.flagged_for_review && !wasFlagged ? 1 : 0),
+        };
+      });
+    }, loadPost);
+  }, [id]);
+
   const loadPost = async () => {
     if (!id) return;
     
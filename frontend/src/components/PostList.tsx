@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useSearchParams } from 'react-router-dom';
-import { Post, PaginatedResponse } from '../types';
+import { PostSummary, PaginatedResponse } from '../types';
 import { postsApi } from '../services/api';
 import PostListItem from './PostListItem';
 import Pagination from './Pagination';
@@ -10,7 +10,7 @@ const POSTS_PER_PAGE = 10;
 
 const PostList: React.FC = () => {
   const [searchParams, setSearchParams] = useSearchParams();
-  const [posts, setPosts] = useState<Post[]>([]);
+  const [posts, setPosts] = useState<PostSummary[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [currentPage, setCurrentPage] = useState(1);
@@ -35,7 +35,7 @@ const PostList: React.FC = () => {
         setTotalCount(data.length);
       } else {
         // Paginated response
-        const paginatedData = data as PaginatedResponse<Post>;
+        const paginatedData = data as PaginatedResponse<PostSummary>;
         setPosts(paginatedData.results);
         setTotalCount(paginatedData.count);
         // Calculate total pages
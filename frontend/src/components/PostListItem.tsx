@@ -1,25 +1,23 @@
 import React from 'react';
 import { useNavigate } from 'react-router-dom';
-import { Post } from '../types';
+import { PostSummary } from '../types';
 import './PostListItem.css';
 
 interface PostListItemProps {
-  post: Post;
+  post: PostSummary;
 }
 
 const PostListItem: React.FC<PostListItemProps> = ({ post }) => {
   const navigate = useNavigate();
   
-  // Get preview of content (first 150 characters)
-  const contentPreview = post.content && post.content.length > 150 
-    ? post.content.substring(0, 150) + '...' 
-    : post.content || '';
+  // The list endpoint returns a server-side excerpt (first 150 characters)
+  const contentPreview = post.excerpt || '';
 
   const handleClick = () => {
     navigate(`/posts/${post.id}`);
   };
 
-  const commentCount = post.comment_count || (post.comments ? post.comments.length : 0);
+  const commentCount = post.comment_count || 0;
 
   return (
     <div className="post-list-item" onClick={handleClick}>
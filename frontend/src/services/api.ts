@@ -1,8 +1,8 @@
 import client from '../api/client';
-import { Post, Comment, PaginatedResponse } from '../types';
+import { Post, PostSummary, Comment, CommentEventType, FlaggedFilters, PaginatedResponse, CursorPage } from '../types';
 
 export const postsApi = {
-  getAll: async (page?: number, pageSize?: number): Promise<PaginatedResponse<Post> | Post[]> => {
+  getAll: async (page?: number, pageSize?: number): Promise<PaginatedResponse<PostSummary> | PostSummary[]> => {
     const params: any = {};
     if (page) params.page = page;
     if (pageSize) params.page_size = pageSize;
@@ -10,7 +10,7 @@ export const postsApi = {
     const response = await client.get('/posts/', { params });
     // Return paginated response if it has pagination structure, otherwise return array
     if (response.data.results !== undefined) {
-      return response.data as PaginatedResponse<Post>;
+      return response.data as PaginatedResponse<PostSummary>;
     }
     return Array.isArray(response.data) ? response.data : [];
   },
@@ -50,14 +50,52 @@ export const commentsApi = {
     return response.data;
   },
 
-  getFlagged: async (): Promise<Comment[]> => {
-    const response = await client.get('/comments/flagged/');
-    // Handle paginated response from Django REST Framework
-    return Array.isArray(response.data) ? response.data : response.data.results || [];
+  getFlagged: async (filters: FlaggedFilters = {}, nextUrl?: string | null): Promise<CursorPage<Comment>> => {
+    // Follow the cursor link from the previous page (it carries the filters), or start from the first page
+    if (nextUrl) {
+      const response = await client.get(nextUrl);
+      return response.data;
+    }
+    const params: any = {};
+    if (filters.postId) params.post = filters.postId;
+    if (filters.since) params.since = filters.since;
+    if (filters.reason) params.reason = filters.reason;
+    if (filters.ordering) params.ordering = filters.ordering;
+
+    const response = await client.get('/comments/flagged/', { params });
+    return response.data;
   },
 
   getSettings: async (): Promise<{ comments_enabled: boolean }> => {
     const response = await client.get('/comments/settings/');
     return response.data;
   },
+
+  // Push new and newly flagged comments over Server-Sent Events (served when the backend runs under ASGI).
+  // The browser reconnects with Last-Event-ID on its own; onReset means events were missed and the
+  // caller should refetch. Returns a function that closes the stream.
+  subscribe: (
+    filters: { postId?: number; flaggedOnly?: boolean },
+    onEvent: (type: CommentEventType, comment: Comment) => void,
+    onReset?: () => void
+  ): (() => void) => {
+    if (typeof EventSource === 'undefined') {
+      return () => {};
+    }
+    const params = new URLSearchParams();
+    if (filters.postId) params.set('post', String(filters.postId));
+    if (filters.flaggedOnly) params.set('flagged', 'true');
+
+    const source = new EventSource(`${client.defaults.baseURL}/comments/stream/?${params}`);
+    const types: CommentEventType[] = ['comment.created', 'comment.flagged'];
+    types.forEach((type) => {
+      source.addEventListener(type, (event) => {
+        onEvent(type, JSON.parse((event as MessageEvent).data));
+      });
+    });
+    if (onReset) {
+      source.addEventListener('reset', onReset);
+    }
+    return () => source.close();
+  },
 };
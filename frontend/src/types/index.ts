@@ -6,6 +6,7 @@ export interface Comment {
   created_at: string;
   flagged_for_review: boolean;
   flag_reason: string | null;
+  classification_status: 'pending' | 'classified' | 'failed';
 }
 
 export interface Post {
@@ -16,6 +17,17 @@ export interface Post {
   updated_at: string;
   comments: Comment[];
   comment_count: number;
+  flagged_count: number;
+}
+
+export interface PostSummary {
+  id: number;
+  title: string;
+  excerpt: string;
+  created_at: string;
+  updated_at: string;
+  comment_count: number;
+  flagged_count: number;
 }
 
 export interface PaginatedResponse<T> {
@@ -24,3 +36,20 @@ export interface PaginatedResponse<T> {
   previous: string | null;
   results: T[];
 }
+
+export type CommentEventType = 'comment.created' | 'comment.flagged';
+
+// Query params of GET /comments/flagged/
+export interface FlaggedFilters {
+  postId?: number;
+  since?: string;
+  reason?: string;
+  ordering?: 'created_at' | '-created_at';
+}
+
+export interface CursorPage<T> {
+  count?: number;
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}